@@ -0,0 +1,152 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Helpers for acting on many resources in one module run.
+
+run_parallel() fans calls out over a few threads, which is all the API
+concurrency a single task needs, and poll() waits for a whole set of
+resources with one listing per turn instead of one get per resource.
+"""
+
+import collections
+import threading
+import time
+
+DEFAULT_WORKERS = 10
+DEFAULT_INTERVAL = 5
+
+
+def run_parallel(func, items, workers=DEFAULT_WORKERS):
+    """Call func(item) for every item on a small pool of threads.
+
+    :returns: A list of (item, result, error) tuples in the order of items,
+              error being the exception func raised or None.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    todo = collections.deque(enumerate(items))
+
+    def worker():
+        while True:
+            try:
+                index, item = todo.popleft()
+            except IndexError:
+                return
+            try:
+                results[index] = (item, func(item), None)
+            except Exception as e:
+                results[index] = (item, None, e)
+
+    threads = [threading.Thread(target=worker)
+               for i in range(min(workers, len(items)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def _status(resource, attr='status'):
+    if isinstance(resource, dict):
+        return resource.get(attr)
+    return getattr(resource, attr)
+
+
+def status_check(ready, failed=('ERROR',), attr='status'):
+    """Build a poll() check waiting for a status in ready.
+
+    Resources not listed yet are taken to be still on their way.
+    """
+    def check(resource):
+        if resource is None:
+            return None
+        status = _status(resource, attr)
+        if status in ready:
+            return True
+        if status in failed:
+            return 'status is %s' % status
+        return None
+    return check
+
+
+def gone_check(failed=('error_deleting', 'ERROR'), before=None):
+    """Build a poll() check waiting for resources to drop off the list.
+
+    :param before: The status of each resource when it was deleted, by
+                   ID.  Resources deleted while in a failed status, such
+                   as servers in ERROR, only fail once they have left it
+                   and come back to one.
+    """
+    waiting = status_check((), failed)
+    moved = set()
+
+    def check(resource):
+        if resource is None:
+            return True
+        resource_id = _resource_id(resource)
+        if before and resource_id not in moved:
+            if _status(resource) == before.get(resource_id):
+                return None
+            moved.add(resource_id)
+        return waiting(resource)
+    return check
+
+
+def _resource_id(resource):
+    if isinstance(resource, dict):
+        return resource['id']
+    return resource.id
+
+
+def poll(list_func, ids, check, timeout, interval=DEFAULT_INTERVAL):
+    """Wait for a set of resources using one listing per turn.
+
+    :param list_func: Callable returning the current list of resources.
+    :param ids: IDs of the resources to wait for.
+    :param check: Callable given each resource, or None if it is not in
+                  the listing, returning None while it is still pending,
+                  True once it is done or an error message if it failed.
+    :param interval: Seconds to sleep between turns, or a callable given
+                     the seconds elapsed since the wait started and
+                     returning them.
+    :returns: A (done, errors) pair of dicts keyed by ID, done holding the
+              last listed version of each resource (None if not listed)
+              and errors the reason each failed resource failed.
+    """
+    pending = set(ids)
+    done = {}
+    errors = {}
+    started = time.time()
+    expires = started + timeout
+    while pending:
+        listed = dict((_resource_id(r), r) for r in list_func())
+        for resource_id in list(pending):
+            resource = listed.get(resource_id)
+            outcome = check(resource)
+            if outcome is None:
+                continue
+            pending.discard(resource_id)
+            if outcome is True:
+                done[resource_id] = resource
+            else:
+                errors[resource_id] = outcome
+        now = time.time()
+        if not pending or now >= expires:
+            break
+        if callable(interval):
+            time.sleep(min(interval(now - started), expires - now))
+        else:
+            time.sleep(interval)
+    for resource_id in pending:
+        errors[resource_id] = 'timed out'
+    return done, errors
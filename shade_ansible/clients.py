@@ -0,0 +1,103 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Hooks around the per-service clients that shade hands out.
+
+shade builds each python-*client lazily behind a property on the cloud
+object, and both shade itself and the modules go through those properties
+for every API call.  wrap_cloud() swaps in proxies so that a single
+callable sees each call as ``wrapper(service, name, func, args, kwargs)``.
+"""
+
+# Service type -> name of the shade property returning its client.
+SERVICE_CLIENTS = {
+    'baremetal': 'ironic_client',
+    'compute': 'nova_client',
+    'identity': 'keystone_client',
+    'image': 'glance_client',
+    'network': 'neutron_client',
+    'volume': 'cinder_client',
+}
+
+try:
+    _STRING_TYPES = (basestring,)
+except NameError:
+    _STRING_TYPES = (str, bytes)
+
+_PLAIN_TYPES = _STRING_TYPES + (
+    bool, dict, float, int, list, set, tuple, type(None))
+
+
+class ClientProxy(object):
+    """Stand-in for a client, or a manager hanging off one.
+
+    Public callables are routed through the wrapper, other public
+    attributes (the managers, the http client) are proxied in turn and
+    everything else is handed straight back.  Attribute assignment goes
+    through to the real client.
+    """
+
+    def __init__(self, client, service, wrapper, path=()):
+        self.__dict__.update(
+            _client=client, _service=service, _wrapper=wrapper, _path=path)
+
+    def __getattr__(self, name):
+        value = getattr(self._client, name)
+        if name.startswith('_') or isinstance(value, _PLAIN_TYPES):
+            return value
+        path = self._path + (name,)
+        if callable(value):
+            wrapper = self._wrapper
+            service = self._service
+            call_name = '.'.join(path)
+
+            def call(*args, **kwargs):
+                return wrapper(service, call_name, value, args, kwargs)
+            return call
+        return ClientProxy(value, self._service, self._wrapper, path)
+
+    def __setattr__(self, name, value):
+        setattr(self._client, name, value)
+
+    def __repr__(self):
+        return '<ClientProxy %s %r>' % (self._service, self._client)
+
+
+def _wrapped_property(prop, service, wrapper):
+    def fget(cloud):
+        return ClientProxy(prop.fget(cloud), service, wrapper)
+    return property(fget, doc=prop.__doc__)
+
+
+def wrap_cloud(cloud, wrapper, services=None):
+    """Route the API calls made through cloud's clients via wrapper.
+
+    Wrapping is done by giving this one cloud object a subclass of its own
+    class, so the lazy client construction in shade is left alone and
+    calls shade makes internally are seen as well.  Calling wrap_cloud more
+    than once stacks the wrappers, the latest one outermost.
+
+    :param services: Optional list of service types to restrict the
+                     wrapping to.
+    :returns: The same cloud object, for convenience.
+    """
+    cls = type(cloud)
+    overrides = {}
+    for service, attr in SERVICE_CLIENTS.items():
+        if services is not None and service not in services:
+            continue
+        prop = getattr(cls, attr, None)
+        if isinstance(prop, property):
+            overrides[attr] = _wrapped_property(prop, service, wrapper)
+    if overrides:
+        cloud.__class__ = type(cls.__name__, (cls,), overrides)
+    return cloud
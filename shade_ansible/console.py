@@ -0,0 +1,116 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Follow the console logs of servers until a line shows up.
+
+nova only hands out the last N lines of a console log, so a log is
+followed by asking for a small window and finding the last lines seen on
+the previous turn in it; whatever comes after them is new.  Only when
+the log moved on by more than the window is it asked for again with a
+bigger one.  A poll costs one small request per server however long the
+logs grow.
+"""
+
+import re
+
+from shade_ansible import batch
+
+# What cloud-init prints once it is through with the final stage
+CLOUD_INIT_DONE = r'Cloud-init v\. \S+ finished'
+
+WINDOW = 50
+MAX_WINDOW = 3200
+ANCHOR = 3
+
+
+class ConsoleTail(object):
+    """The lines a console log gained since the last read.
+
+    :param fetch: Callable taking a number of lines and returning the
+                  last that many lines of the log as text.
+    """
+
+    def __init__(self, fetch, window=WINDOW, max_window=MAX_WINDOW):
+        self.fetch = fetch
+        self.window = window
+        self.max_window = max_window
+        self.anchor = None
+        self.offset = 0
+
+    def _after_anchor(self, lines):
+        size = len(self.anchor)
+        for start in range(len(lines) - size, -1, -1):
+            if lines[start:start + size] == self.anchor:
+                return lines[start + size:]
+        return None
+
+    def read(self):
+        """Return the lines added to the log since the previous read."""
+        length = self.window
+        while True:
+            lines = (self.fetch(length) or '').splitlines()
+            if not self.anchor:
+                new = lines
+                break
+            new = self._after_anchor(lines)
+            if (new is not None or len(lines) < length or
+                    length >= self.max_window):
+                break
+            length *= 2
+        if new is None:
+            # The anchor scrolled out of even the largest window
+            new = lines
+        if lines:
+            self.anchor = lines[-ANCHOR:]
+        self.offset += len(new)
+        return new
+
+
+def wait_for_line(tails, pattern, timeout, interval=batch.DEFAULT_INTERVAL,
+                  workers=batch.DEFAULT_WORKERS):
+    """Read the tails until each of them showed a line matching pattern.
+
+    :param tails: A dict of ConsoleTails by any key.
+    :returns: A (done, errors) pair of dicts keyed like tails, done holding
+              the matching line of each log and errors why each other log
+              did not get one.
+    """
+    matcher = re.compile(pattern)
+    found = {}
+    read_errors = {}
+
+    def read(key):
+        for line in tails[key].read():
+            if matcher.search(line):
+                return line
+        return None
+
+    def listing():
+        pending = [key for key in tails if key not in found]
+        for key, line, error in batch.run_parallel(read, pending, workers):
+            # Consoles can be unavailable for a while around boot, so a
+            # failed read is only reported if nothing else turns up.
+            if error:
+                read_errors[key] = error
+            elif line is not None:
+                found[key] = line
+        return [dict(id=key) for key in tails]
+
+    def check(entry):
+        return True if entry['id'] in found else None
+
+    done, errors = batch.poll(listing, list(tails), check, timeout, interval)
+    for key in errors:
+        if key in read_errors:
+            errors[key] = 'timed out, console log unavailable: %s' % (
+                read_errors[key])
+    return (dict((key, found[key]) for key in done), errors)
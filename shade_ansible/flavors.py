@@ -0,0 +1,77 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Pick the smallest flavor satisfying a set of constraints.
+
+The flavor list of a cloud hardly ever changes, so it is fetched once and
+kept in a shared store for SHADE_ANSIBLE_FLAVOR_TTL seconds (default an
+hour).  Flavors are indexed in (ram, vcpus, disk) order, so a query
+bisects to the first flavor with enough RAM and walks forward from there.
+"""
+
+import bisect
+import os
+
+from shade_ansible import store
+
+DEFAULT_TTL = 3600
+
+
+class FlavorNotFound(Exception):
+    pass
+
+
+def _fetch(cloud):
+    return [dict(id=f.id, name=f.name, ram=f.ram, vcpus=f.vcpus, disk=f.disk)
+            for f in cloud.nova_client.flavors.list()]
+
+
+class FlavorIndex(object):
+
+    def __init__(self, flavors):
+        self.flavors = sorted(
+            flavors, key=lambda f: (f['ram'], f['vcpus'], f['disk']))
+        self._rams = [f['ram'] for f in self.flavors]
+
+    def smallest(self, ram=None, vcpus=None, disk=None,
+                 include=None, exclude=None):
+        """Return the smallest flavor meeting every given constraint.
+
+        ram, vcpus and disk are minimums.  include is text the flavor name
+        must contain and exclude text it must not.
+        """
+        start = bisect.bisect_left(self._rams, ram or 0)
+        for flavor in self.flavors[start:]:
+            if vcpus and flavor['vcpus'] < vcpus:
+                continue
+            if disk and flavor['disk'] < disk:
+                continue
+            if include and include not in flavor['name']:
+                continue
+            if exclude and exclude in flavor['name']:
+                continue
+            return flavor
+        raise FlavorNotFound(
+            "Could not find a flavor with ram >= {ram}, vcpus >= {vcpus},"
+            " disk >= {disk}, including '{include}' and excluding"
+            " '{exclude}'".format(
+                ram=ram, vcpus=vcpus, disk=disk,
+                include=include, exclude=exclude))
+
+
+def flavor_index(cloud, ttl=None, shared=None):
+    """Return the FlavorIndex of a cloud, from the shared cache if fresh."""
+    if ttl is None:
+        ttl = float(os.environ.get('SHADE_ANSIBLE_FLAVOR_TTL', DEFAULT_TTL))
+    shared = shared or store.Store('flavors')
+    flavors = shared.cached(store.scope(cloud), ttl, lambda: _fetch(cloud))
+    return FlavorIndex(flavors)
@@ -0,0 +1,85 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Bring the floating IPs of a server in line with a wanted set.
+
+The addresses to add and the ones to remove are worked out as a set
+difference and applied all at once on a few threads.  The server is then
+polled until its addresses show the whole change, rather than making one
+call and one wait per address.
+"""
+
+from shade_ansible import batch
+
+
+class FloatingIPError(Exception):
+    pass
+
+
+def floating_ips(server):
+    """The floating addresses of a server, as a set."""
+    return set(address['addr']
+               for addresses in server.addresses.values()
+               for address in addresses
+               if address.get('OS-EXT-IPS:type') == 'floating')
+
+
+def diff(server, wanted):
+    """The (missing, extra) floating IPs of server against wanted."""
+    current = floating_ips(server)
+    wanted = set(wanted)
+    return (wanted - current, current - wanted)
+
+
+def sync(nova, server, wanted, timeout, wait=True, interval=2,
+         workers=batch.DEFAULT_WORKERS):
+    """Add the missing floating IPs of server and remove the extra ones.
+
+    :returns: The server, once its addresses show the change if wait.
+    :raises: FloatingIPError if a change fails or does not show up in time.
+    """
+    (missing, extra) = diff(server, wanted)
+
+    def apply(change):
+        (action, ip) = change
+        if action == 'add':
+            nova.servers.add_floating_ip(server=server.id, address=ip)
+        else:
+            nova.servers.remove_floating_ip(server=server.id, address=ip)
+
+    changes = ([('add', ip) for ip in sorted(missing)] +
+               [('remove', ip) for ip in sorted(extra)])
+    errors = ["%s %s: %s" % (action, ip, error)
+              for ((action, ip), _, error) in batch.run_parallel(
+                  apply, changes, workers)
+              if error]
+    if errors:
+        raise FloatingIPError(
+            "Error updating floating IPs: %s" % '; '.join(errors))
+    if not wait:
+        return nova.servers.get(server.id)
+
+    wanted = set(wanted)
+
+    def check(current):
+        if current is not None and floating_ips(current) == wanted:
+            return True
+        return None
+
+    done, errors = batch.poll(
+        lambda: [nova.servers.get(server.id)], [server.id], check,
+        timeout, interval)
+    if errors:
+        raise FloatingIPError(
+            "Timed out waiting for floating IPs %s on instance %s" % (
+                ', '.join(sorted(wanted)), server.id))
+    return done[server.id]
@@ -0,0 +1,155 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Golden volumes to clone instead of writing out an image every time.
+
+Creating a volume from an image makes cinder download and convert the
+image, which for large images takes minutes.  Instead one golden volume
+per image and volume type is created from the image once, and tagged
+with the image ID in its metadata.  New volumes are then cloned from it,
+or from a snapshot of it, which backends with copy-on-write do almost
+instantly.  When the image behind a name is replaced, the golden volume
+no longer matches the image ID, so it is retired and built again.
+
+Golden volumes are created at the smallest size their image fits on, and
+clones are grown to the size asked for.  Forks take turns on each golden
+volume through a lock of its own, held only while it is looked up and
+asked for, so only one of them builds it and the others wait for it
+alongside without holding up forks working on other images.
+"""
+
+import math
+import re
+
+from shade_ansible import batch
+from shade_ansible import store
+
+GOLDEN_KEY = 'shade_ansible_golden'
+IMAGE_KEY = 'shade_ansible_image'
+
+VOLUME = 'volume'
+SNAPSHOT = 'snapshot'
+
+
+def golden_name(image, volume_type):
+    return 'golden-%s-%s' % (image, volume_type or 'default')
+
+
+def min_size(image):
+    """The size in GB of the smallest volume a glance image fits on."""
+    size = int(math.ceil(float(getattr(image, 'size', 0) or 0) / 2 ** 30))
+    return max(size, int(getattr(image, 'min_disk', 0) or 0), 1)
+
+
+def _find(manager, name):
+    for resource in manager.list(search_opts={'display_name': name}):
+        if resource.display_name == name:
+            return resource
+    return None
+
+
+class GoldenCache(object):
+    """The golden volumes of one cinder endpoint.
+
+    :param timeout: How long to wait for a golden volume or snapshot to
+                    become available.
+    :param path: Directory of the lock files, by default store.cache_dir().
+    """
+
+    def __init__(self, cinder, timeout, interval=batch.DEFAULT_INTERVAL,
+                 path=None):
+        self.cinder = cinder
+        self.timeout = timeout
+        self.interval = interval
+        self.path = path
+
+    def _lock(self, name):
+        return store.Store(
+            re.sub(r'[^\w.-]', '_', name), path=self.path).transaction()
+
+    def _wait(self, manager, resource):
+        done, errors = batch.poll(
+            lambda: [manager.get(resource.id)], [resource.id],
+            batch.status_check(('available',), ('error',)),
+            self.timeout, self.interval)
+        if errors:
+            raise Exception('golden %s %s: %s' % (
+                resource.display_name, resource.id, errors[resource.id]))
+        return done[resource.id]
+
+    def _retire(self, manager, resource):
+        try:
+            manager.delete(resource)
+        except Exception:
+            # Likely still in use by its clones; get it out of the way.
+            manager.update(
+                resource, display_name='%s-retired-%s' % (
+                    resource.display_name, resource.id))
+
+    def _golden_volume(self, name, image_id, volume_type, size):
+        volumes = self.cinder.volumes
+        golden = _find(volumes, name)
+        if golden is not None and (
+                golden.metadata.get(IMAGE_KEY) != image_id or
+                golden.status == 'error'):
+            snapshot = _find(self.cinder.volume_snapshots, name)
+            if snapshot is not None:
+                self._retire(self.cinder.volume_snapshots, snapshot)
+            self._retire(volumes, golden)
+            golden = None
+        if golden is None:
+            golden = volumes.create(
+                size, display_name=name, volume_type=volume_type,
+                imageRef=image_id,
+                metadata={GOLDEN_KEY: 'true', IMAGE_KEY: image_id})
+        return golden
+
+    def _golden_snapshot(self, name, golden):
+        snapshots = self.cinder.volume_snapshots
+        snapshot = _find(snapshots, name)
+        if snapshot is not None and (
+                snapshot.volume_id != golden.id or
+                snapshot.status == 'error'):
+            self._retire(snapshots, snapshot)
+            snapshot = None
+        if snapshot is None:
+            snapshot = snapshots.create(golden.id, display_name=name)
+        return snapshot
+
+    def source(self, image, image_id, volume_type, size, golden_size,
+               mode=VOLUME):
+        """Where to clone a volume of image from, building it if needed.
+
+        :param image: The name or ID the image was asked for by, naming
+                      the golden volume so it outlives image updates.
+        :param image_id: The ID of the image it currently stands for.
+        :param size: The size of the volume to clone.
+        :param golden_size: The size to build the golden volume at, the
+                            min_size() of the image.
+        :returns: The volumes.create arguments to clone with, or None if
+                  the golden volume is too large for size.
+        """
+        name = golden_name(image, volume_type)
+        with self._lock(name):
+            golden = self._golden_volume(
+                name, image_id, volume_type, golden_size)
+        if golden.size > size:
+            return None
+        if golden.status != 'available':
+            golden = self._wait(self.cinder.volumes, golden)
+        if mode != SNAPSHOT:
+            return dict(source_volid=golden.id)
+        with self._lock(name):
+            snapshot = self._golden_snapshot(name, golden)
+        if snapshot.status != 'available':
+            snapshot = self._wait(self.cinder.volume_snapshots, snapshot)
+        return dict(snapshot_id=snapshot.id)
@@ -0,0 +1,127 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Host variables of a server, at the depth a task asks for.
+
+shade's full hostvars look up the flavor name, the image name and the
+attached volumes of a server, which is three more API calls per server.
+Tasks that only need the ID or the addresses can skip them, and
+hostvars for many servers at once can be computed from one fetch of the
+flavors, images and volumes shared by all of them.
+"""
+
+import collections
+
+from shade_ansible import flavors
+from shade_ansible import images
+
+DEPTHS = ('id', 'addresses', 'full')
+
+
+def address_hostvars(cloud, server):
+    """The hostvars that can be read off the server itself."""
+    from shade import meta
+
+    hostvars = dict(
+        id=server.id, name=server.name, status=server.status,
+        addresses=server.addresses, metadata=server.metadata,
+        public_v4=meta.get_server_public_ip(server),
+        private_v4=meta.get_server_private_ip(server),
+        region=cloud.region, cloud=cloud.name,
+        volumes_attached=getattr(
+            server, 'os-extended-volumes:volumes_attached', []))
+    if cloud.private:
+        interface_ip = hostvars['private_v4']
+    else:
+        interface_ip = hostvars['public_v4']
+    if interface_ip:
+        hostvars['interface_ip'] = interface_ip
+    return hostvars
+
+
+def server_hostvars(cloud, server, depth='full'):
+    """Return the hostvars of server at depth, or None for 'id'."""
+    if depth == 'id':
+        return None
+    if depth == 'addresses':
+        return address_hostvars(cloud, server)
+    from shade import meta
+
+    return meta.get_hostvars_from_server(cloud, server)
+
+
+class ReferenceCloud(object):
+    """A cloud answering the lookups of get_hostvars_from_server from
+    data fetched beforehand, and passing everything else through.
+    """
+
+    def __init__(self, cloud, flavor_names, image_names, volumes):
+        self._cloud = cloud
+        self._flavor_names = flavor_names
+        self._image_names = image_names
+        self._volumes = collections.defaultdict(list)
+        for volume in volumes:
+            for attachment in volume.attachments:
+                self._volumes[attachment['server_id']].append(volume)
+
+    def __getattr__(self, name):
+        return getattr(self._cloud, name)
+
+    def get_flavor_name(self, flavor_id):
+        return self._flavor_names.get(flavor_id)
+
+    def get_image_name(self, image_id):
+        return self._image_names.get(image_id)
+
+    def get_volumes(self, server, cache=True):
+        return self._volumes.get(server.id, [])
+
+
+def reference_cloud(cloud):
+    """A ReferenceCloud of cloud for a fixed number of API calls.
+
+    Flavor and image names come from the shared flavor and image caches
+    and volumes from a single listing.
+    """
+    return ReferenceCloud(
+        cloud,
+        dict((f['id'], f['name'])
+             for f in flavors.flavor_index(cloud).flavors),
+        images.image_index(cloud).names,
+        cloud.cinder_client.volumes.list())
+
+
+def bulk_hostvars(cloud, servers, mounts=None):
+    """Full hostvars of many servers, looked up through reference_cloud.
+
+    :returns: A dict of hostvars keyed by server name.
+    """
+    from shade import meta
+
+    reference = reference_cloud(cloud)
+    return dict(
+        (server.name,
+         meta.get_hostvars_from_server(reference, server, mounts=mounts))
+        for server in servers)
+
+
+def batch_hostvars(cloud, servers, depth='full'):
+    """The hostvars of many servers at depth, keyed as servers is.
+
+    Full hostvars are looked up through a single reference_cloud.
+
+    :param servers: A dict of servers.
+    """
+    if depth == 'full':
+        cloud = reference_cloud(cloud)
+    return dict((key, server_hostvars(cloud, server, depth))
+                for key, server in servers.items())
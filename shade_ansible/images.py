@@ -0,0 +1,136 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Resolve image names against a cached copy of the image catalog.
+
+Public clouds carry thousands of images and listing them takes seconds,
+so the catalog is fetched once and kept in a shared store for
+SHADE_ANSIBLE_IMAGE_TTL seconds (default ten minutes) for every endpoint
+and project.  Lookups go through an index by ID and exact name, falling
+back to names containing the text asked for.  When several active images
+match, the most recently created one wins.
+
+A name the cached catalog misses may belong to an image uploaded since,
+so newest() and exact() fetch the catalog again once before giving up,
+and modules changing images forget() the cached catalog.
+"""
+
+import collections
+import os
+
+from shade_ansible import store
+
+DEFAULT_TTL = 600
+
+ACTIVE = ('active', 'ACTIVE')
+
+
+class ImageNotFound(Exception):
+    pass
+
+
+def _created(image):
+    return getattr(image, 'created_at', None) or getattr(image, 'created', '')
+
+
+def _fetch(cloud):
+    return [dict(id=i.id, name=i.name, status=i.status, created=_created(i))
+            for i in cloud.list_images().values()]
+
+
+def _newest(images):
+    return max(images, key=lambda image: image['created'] or '')
+
+
+class ImageIndex(object):
+
+    def __init__(self, images):
+        self.names = dict((i['id'], i['name']) for i in images)
+        self.images = [i for i in images if i['status'] in ACTIVE]
+        self.by_id = dict((i['id'], i) for i in self.images)
+        self.by_name = collections.defaultdict(list)
+        for image in self.images:
+            self.by_name[image['name']].append(image)
+
+    def matching(self, include=None, exclude=None):
+        """Images named with include and without exclude."""
+        return [image for image in self.images
+                if (not include or include in image['name']) and
+                (not exclude or exclude not in image['name'])]
+
+    def exact(self, name_or_id):
+        """Return the image with this ID or exact name, the newest if many.
+
+        For options that never matched names partially.
+        """
+        if name_or_id in self.by_id:
+            return self.by_id[name_or_id]
+        if not self.by_name.get(name_or_id):
+            raise ImageNotFound(
+                "Could not find an active image named '%s'" % name_or_id)
+        return _newest(self.by_name[name_or_id])
+
+    def newest(self, name_or_id, exclude=None):
+        """Return the image to use for a name or ID given to a module.
+
+        An ID or an exact name wins; otherwise any image whose name contains
+        name_or_id is a candidate.  Names containing exclude are skipped,
+        and of the remaining candidates the newest is returned.
+        """
+        if name_or_id in self.by_id:
+            return self.by_id[name_or_id]
+        candidates = [
+            image for image in self.by_name.get(name_or_id, [])
+            if not exclude or exclude not in image['name']]
+        if not candidates:
+            candidates = self.matching(name_or_id, exclude)
+        if not candidates:
+            raise ImageNotFound(
+                "Could not find an active image matching '%s'%s" % (
+                    name_or_id,
+                    " and excluding '%s'" % exclude if exclude else ''))
+        return _newest(candidates)
+
+
+def image_index(cloud, ttl=None, shared=None):
+    """Return the ImageIndex of a cloud, from the shared cache if fresh."""
+    if ttl is None:
+        ttl = float(os.environ.get('SHADE_ANSIBLE_IMAGE_TTL', DEFAULT_TTL))
+    shared = shared or store.Store('images')
+    images = shared.cached(store.scope(cloud), ttl, lambda: _fetch(cloud))
+    return ImageIndex(images)
+
+
+def forget(cloud, shared=None):
+    """Drop the cached catalog of a cloud, once its images changed."""
+    shared = shared or store.Store('images')
+    with shared.transaction() as data:
+        data.pop(store.scope(cloud), None)
+
+
+def _lookup(cloud, method, args, ttl, shared):
+    shared = shared or store.Store('images')
+    try:
+        return getattr(image_index(cloud, ttl, shared), method)(*args)
+    except ImageNotFound:
+        forget(cloud, shared)
+        return getattr(image_index(cloud, ttl, shared), method)(*args)
+
+
+def newest(cloud, name_or_id, exclude=None, ttl=None, shared=None):
+    """ImageIndex.newest() on the catalog of a cloud."""
+    return _lookup(cloud, 'newest', (name_or_id, exclude), ttl, shared)
+
+
+def exact(cloud, name_or_id, ttl=None, shared=None):
+    """ImageIndex.exact() on the catalog of a cloud."""
+    return _lookup(cloud, 'exact', (name_or_id,), ttl, shared)
@@ -147,7 +147,7 @@ def main():
     module = AnsibleModule(argument_spec, **module_kwargs)
 
     try:
-        cloud = shade.operator_cloud(**module.params)
+        cloud = spec.openstack_cloud(module, operator=True)
         server = cloud.get_machine_by_uuid(module.params['uuid'])
 
         if module.params['state'] == 'present':
@@ -18,23 +18,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this software.  If not, see <http://www.gnu.org/licenses/>.
 
-import operator
-import os
-import time
-
 try:
     import shade
-    from shade import meta
+    from shade_ansible import hostvars
     from shade_ansible import spec
 except ImportError:
     print("failed=True msg='shade is required for this module'")
 
-from novaclient.v1_1 import client as nova_client
-from novaclient.v1_1 import floating_ips
-from novaclient import exceptions
-from novaclient import utils
-
-
 DOCUMENTATION = '''
 ---
 module: os_compute
@@ -50,9 +40,56 @@ options:
      default: present
    name:
      description:
-        - Name that has to be given to the instance
-     required: true
+        - Name that has to be given to the instance. With count, the prefix
+          for the names of the instances. Mutually exclusive with names
+     required: false
+     default: None
+   count:
+     description:
+        - Number of instances to manage at once, named <name>-1 to
+          <name>-<count>. They are booted concurrently and waited for
+          together, and the result holds a servers dict keyed by name.
+          Needs name
+     required: false
+     default: None
+   names:
+     description:
+        - List of names of instances to manage at once, as with count.
+          Mutually exclusive with name
+     required: false
      default: None
+   batch_workers:
+     description:
+        - How many API calls to run concurrently when managing several
+          instances
+     required: false
+     default: 10
+   hostvars:
+     description:
+        - How much of the instance to return in the openstack result. C(id)
+          returns only the id, C(addresses) what can be read off the
+          instance itself, such as its addresses, metadata and
+          interface_ip, and C(full) also looks up the flavor and image
+          names and the attached volumes, which costs extra API calls
+     choices: ['id', 'addresses', 'full']
+     required: false
+     default: full
+   pool:
+     description:
+        - Name of a warm pool of standby servers. A new instance is made by
+          claiming an ACTIVE standby server of the pool booted from the same
+          image and flavor, renaming it and applying meta to it, and is only
+          booted when none is left. Without name or names, the task just
+          tops the pool up to pool_size
+     required: false
+     default: None
+   pool_size:
+     description:
+        - Number of standby servers to keep in the pool. Missing ones are
+          booted with the options of the task once instances have been
+          claimed, without waiting for them to become ACTIVE
+     required: false
+     default: 0
    image_id:
      description:
         - The id of the base image to boot. Mutually exclusive with image_name
@@ -65,7 +102,7 @@ options:
      default: None
    image_exclude:
      description:
-        - Text to use to filter image names, for the case, such as HP, where there are multiple image names matching the common identifying portions. image_exclude is a negative match filter - it is text that may not exist in the image name. Defaults to "(deprecated)"
+        - Text to use to filter image names, for the case, such as HP, where there are multiple image names matching the common identifying portions. image_exclude is a negative match filter - it is text that may not exist in the image name. Defaults to "(deprecated)". If several active images still match image_name, the newest one is used. The image catalog is cached between tasks for ten minutes.
    flavor_id:
      description:
         - The id of the flavor in which the new instance has to be created. Mutually exclusive with flavor_ram
@@ -76,9 +113,24 @@ options:
         - The minimum amount of ram in MB that the flavor in which the new instance has to be created must have. Mutually exclusive with flavor_id
      required: false
      default: 1
+   flavor_vcpus:
+     description:
+        - The minimum number of vcpus the flavor must have. Mutually exclusive with flavor_id
+     required: false
+     default: None
+   flavor_disk:
+     description:
+        - The minimum root disk size in GB the flavor must have. Mutually exclusive with flavor_id
+     required: false
+     default: None
    flavor_include:
      description:
         - Text to use to filter flavor names, for the case, such as Rackspace, where there are multiple flavors that have the same ram count. flavor_include is a positive match filter - it must exist in the flavor name.
+   flavor_exclude:
+     description:
+        - Text that may not exist in the flavor name. The smallest flavor meeting flavor_ram, flavor_vcpus, flavor_disk, flavor_include and flavor_exclude is used, and the flavor list is cached between tasks for an hour.
+     required: false
+     default: None
    key_name:
      description:
         - The key pair name to be used when creating a instance
@@ -106,14 +158,63 @@ options:
      default: None
    floating_ip_pools:
      description:
-        - list of floating IP pools from which to choose a floating IP
+        - list of floating IP pools from which to choose a floating IP. A
+          new one is allocated from the first pool that has one to give
+     required: false
+     default: None
+   rebuild:
+     description:
+        - Rebuild existing instances in place when they run another image
+          than image_id or image_name. They keep their ports, floating IPs
+          and volumes, and only the rebuild is waited for. Instances booted
+          from a volume cannot be rebuilt and are reported as not_rebuilt
+     required: false
+     default: 'no'
+   resize:
+     description:
+        - Resize existing instances in place when their flavor is not the
+          one flavor_id or flavor_ram and friends pick. Each resize is
+          confirmed as soon as it reaches VERIFY_RESIZE
+     required: false
+     default: 'no'
+   volumes:
+     description:
+        - List of volumes to attach to a new instance, each with a
+          display_name and, for volumes to create, a size and optionally
+          an image id, plus an optional device. They are created while the
+          instance builds and attached once it is ACTIVE, and the ones
+          created are deleted again if that fails. Needs wait, unless
+          boot_volumes is set, and a single instance
+     required: false
+     default: None
+   boot_volumes:
+     description:
+        - Attach volumes in the boot request through a block device
+          mapping instead, so the instance comes up with them. Volumes
+          that do not exist yet are created by nova, blank or from their
+          image, and need a device and wait. They are deleted with the
+          instance if their delete_on_termination is set
+     required: false
+     default: 'no'
+   ports:
+     description:
+        - List of network ids to plug an extra port of a new instance into.
+          The ports are created while the instance builds and attached once
+          it is ACTIVE, and deleted again if that fails. Needs wait and a
+          single instance
      required: false
      default: None
    meta:
      description:
-        - A list of key value pairs that should be provided as a metadata to the new instance
+        - A list of key value pairs that should be provided as a metadata to the new instance. The keys of an existing instance that differ are set to it as well, and with purge_meta the keys it does not list are deleted
      required: false
      default: None
+   purge_meta:
+     description:
+        - Delete the metadata keys of an existing instance that meta does
+          not list
+     required: false
+     default: 'no'
    wait:
      description:
         - If the module should wait for the instance to be created.
@@ -124,6 +225,22 @@ options:
         - The amount of time the module should wait for the instance to get into active state
      required: false
      default: 180
+   wait_for_port:
+     description:
+        - A TCP port, such as 22, that new instances must accept
+          connections on at their interface_ip before the task returns.
+          All the instances of a batch are probed at once, within timeout
+     required: false
+     default: None
+   wait_for_console:
+     description:
+        - A regular expression that a line of the console log of new
+          instances must match before the task returns, or C(cloud-init)
+          to wait for cloud-init to finish. Logs are followed
+          incrementally, fetching only the lines added since the last poll,
+          and all the instances of a batch are followed at once
+     required: false
+     default: None
    config_drive:
      description:
         - Whether to boot the server with config drive enabled
@@ -230,12 +347,119 @@ EXAMPLES = '''
       image_name: Ubuntu 14.04 LTS (Trusty Tahr) (PVHVM)
       flavor_ram: 4096
       flavor_include: Performance
+
+# Boots ten workers at once, named worker-1 to worker-10
+- name: launch a batch of compute instances
+  hosts: localhost
+  tasks:
+  - name: launch instances
+    os_compute:
+      cloud: mordred
+      name: worker
+      count: 10
+      image_name: Ubuntu Server 14.04
+      flavor_ram: 4096
+    register: workers
+  - debug: var=workers.servers['worker-1'].openstack.interface_ip
+
+# Keeps five web servers standing by, then claims one in seconds
+- name: fill the pool
+  os_compute:
+    cloud: mordred
+    pool: web
+    pool_size: 5
+    image_name: Ubuntu Server 14.04
+    flavor_ram: 4096
+- name: scale out
+  os_compute:
+    cloud: mordred
+    name: web-42
+    pool: web
+    pool_size: 5
+    image_name: Ubuntu Server 14.04
+    flavor_ram: 4096
+    meta:
+      group: web
 '''
 
 
-def _exit_hostvars(module, cloud, server, changed=True):
-    hostvars = meta.get_hostvars_from_server(cloud, server)
-    module.exit_json(changed=changed, id=server.id, openstack=hostvars)
+def _result(module, cloud, server, **result):
+    result['id'] = server.id
+    server_vars = hostvars.server_hostvars(
+        cloud, server, module.params['hostvars'])
+    if server_vars is not None:
+        result['openstack'] = server_vars
+    return result
+
+
+def _wait_for_ports(module, cloud, servers):
+    """Probe wait_for_port on the interface_ip of the servers.
+
+    :param servers: A dict of servers keyed by name.
+    :returns: A dict of why each unreachable server is unreachable.
+    """
+    from shade_ansible import probe
+
+    addresses = {}
+    errors = {}
+    for name, server in servers.items():
+        address = hostvars.address_hostvars(cloud, server).get('interface_ip')
+        if address:
+            addresses[name] = address
+        else:
+            errors[name] = "Instance has no interface_ip to probe"
+    (_, unreachable) = probe.wait_for_ports(
+        addresses, module.params['wait_for_port'], module.params['timeout'])
+    for name, reason in unreachable.items():
+        errors[name] = "Port %s of %s not reachable: %s" % (
+            module.params['wait_for_port'], addresses[name], reason)
+    return errors
+
+
+def _wait_for_console(module, cloud, servers):
+    """Follow the console logs of the servers until wait_for_console.
+
+    :param servers: A dict of servers keyed by name.
+    :returns: A dict of why each server did not get there.
+    """
+    from shade_ansible import console
+
+    nova = cloud.nova_client
+    pattern = module.params['wait_for_console']
+    if pattern == 'cloud-init':
+        pattern = console.CLOUD_INIT_DONE
+
+    def tail(server):
+        return console.ConsoleTail(
+            lambda length: nova.servers.get_console_output(server, length))
+
+    (_, errors) = console.wait_for_line(
+        dict((name, tail(server)) for name, server in servers.items()),
+        pattern, module.params['timeout'],
+        workers=module.params['batch_workers'])
+    return dict((name, "Console of instance never matched %s: %s" % (
+        module.params['wait_for_console'], reason))
+        for name, reason in errors.items())
+
+
+def _wait_ready(module, cloud, servers):
+    """Wait for wait_for_console and then wait_for_port, if set.
+
+    :returns: A dict of why each server that did not get ready did not.
+    """
+    errors = {}
+    if module.params['wait_for_console']:
+        errors.update(_wait_for_console(module, cloud, servers))
+    servers = dict((name, server) for name, server in servers.items()
+                   if name not in errors)
+    if module.params['wait_for_port'] and servers:
+        errors.update(_wait_for_ports(module, cloud, servers))
+    return errors
+
+
+def _exit_hostvars(module, cloud, server, changed=True, **extra):
+    module.exit_json(
+        **_result(module, cloud, server, changed=changed, **extra))
 
 
 def _delete_server(module, cloud):
@@ -251,22 +475,33 @@ def _delete_server(module, cloud):
 def _get_image_id(module, cloud):
     if module.params['image_id']:
         return module.params['image_id']
-    return cloud.get_image_by_name(
-        module.params['image_name'], module.params['image_exclude']).id
+    from shade_ansible import images
+
+    try:
+        return images.newest(
+            cloud, module.params['image_name'],
+            module.params['image_exclude'])['id']
+    except images.ImageNotFound as e:
+        module.fail_json(msg=str(e))
 
 
 def _get_flavor_id(module, cloud):
     if module.params['flavor_id']:
         return module.params['flavor_id']
-    return cloud.get_flavor_by_ram(
-        module.params['flavor_ram'], module.params['flavor_include']).id
+    from shade_ansible import flavors
 
+    try:
+        return flavors.flavor_index(cloud).smallest(
+            ram=module.params['flavor_ram'],
+            vcpus=module.params['flavor_vcpus'],
+            disk=module.params['flavor_disk'],
+            include=module.params['flavor_include'],
+            exclude=module.params['flavor_exclude'])['id']
+    except flavors.FlavorNotFound as e:
+        module.fail_json(msg=str(e))
 
-def _create_server(module, cloud):
-    image_id = _get_image_id(module, cloud)
-    flavor_id = _get_flavor_id(module, cloud)
 
-    bootargs = [module.params['name'], image_id, flavor_id]
+def _boot_kwargs(module):
     bootkwargs = {
         'nics': module.params['nics'],
         'meta': module.params['meta'],
@@ -275,24 +510,134 @@ def _create_server(module, cloud):
         'config_drive': module.params['config_drive'],
     }
 
-    for optional_param in ('region_name', 'key_name', 'availability_zone'):
+    for optional_param in ('key_name', 'availability_zone'):
         if module.params[optional_param]:
             bootkwargs[optional_param] = module.params[optional_param]
+    return bootkwargs
+
 
-    server = cloud.create_server(
-        bootargs, bootkwargs,
-        ip_pool=module.params['floating_ip_pools'],
-        ips=module.params['floating_ips'],
-        auto_ip=module.params['auto_floating_ip'],
-        wait=module.params['wait'], timeout=module.params['timeout'])
+def _claim_servers(module, cloud, names, image_id, flavor_id):
+    """Claim standby servers for names, then top the pool up again.
 
-    _exit_hostvars(module, cloud, server)
+    :returns: A (claimed, errors) pair of dicts keyed by name, as
+              pool.claim returns them.
+    """
+    from shade_ansible import pool
 
+    nova = cloud.nova_client
+    servers = nova.servers.list()
+    (claimed, errors) = pool.claim(
+        nova, servers, module.params['pool'], image_id, flavor_id, names,
+        meta=module.params['meta'], workers=module.params['batch_workers'])
+    if module.params['pool_size']:
+        pool.top_up(
+            nova, servers, module.params['pool'], module.params['pool_size'],
+            image_id, flavor_id, _boot_kwargs(module),
+            exclude=[server.id for server in claimed.values()],
+            workers=module.params['batch_workers'])
+    return (claimed, errors)
 
-def _delete_floating_ip_list(cloud, server, extra_ips):
-    for ip in extra_ips:
-        cloud.nova_client.servers.remove_floating_ip(
-            server=server.id, address=ip)
+
+def _top_up_pool(module, cloud):
+    from shade_ansible import pool
+    from shade_ansible import snapshot
+
+    image_id = _get_image_id(module, cloud)
+    flavor_id = _get_flavor_id(module, cloud)
+    if module.check_mode:
+        standby = pool.standby_servers(
+            snapshot.Snapshot(cloud).list('servers'), module.params['pool'],
+            image_id, flavor_id, ready=False)
+        missing = max(module.params['pool_size'] - len(standby), 0)
+        module.exit_json(changed=bool(missing), booted=missing)
+    booted = pool.top_up(
+        cloud.nova_client, cloud.nova_client.servers.list(),
+        module.params['pool'], module.params['pool_size'], image_id,
+        flavor_id, _boot_kwargs(module),
+        workers=module.params['batch_workers'])
+    module.exit_json(changed=bool(booted), booted=booted)
+
+
+def _create_server(module, cloud):
+    from shade_ansible import provision
+
+    image_id = _get_image_id(module, cloud)
+    flavor_id = _get_flavor_id(module, cloud)
+
+    extra = {}
+    if module.params['pool']:
+        (claimed, claim_errors) = _claim_servers(
+            module, cloud, [module.params['name']], image_id, flavor_id)
+        if claim_errors:
+            # The server gets booted instead, and the result says why
+            extra['claim_error'] = claim_errors[module.params['name']]
+        if claimed:
+            server = claimed[module.params['name']]
+            (ip_changed, server) = _check_floating_ips(module, cloud, server)
+            _exit_ready(module, cloud, server)
+
+    nova = cloud.nova_client
+    bootkwargs = _boot_kwargs(module)
+    volumes = module.params['volumes'] or []
+    boot_volumes = []
+    if volumes and module.params['boot_volumes']:
+        try:
+            (bootkwargs['block_device_mapping_v2'], boot_volumes) = (
+                provision.block_device_mapping(
+                    cloud.cinder_client, volumes,
+                    workers=module.params['batch_workers']))
+        except provision.ProvisionError as e:
+            module.fail_json(msg="Error in creating instance: %s" % e)
+        if boot_volumes and not module.params['wait']:
+            # They are only named once the instance is up
+            module.fail_json(msg="Volumes %s do not exist yet, creating"
+                                 " them at boot needs wait"
+                                 % ', '.join(boot_volumes))
+        volumes = []
+    try:
+        server = nova.servers.create(
+            module.params['name'], image_id, flavor_id, **bootkwargs)
+    except Exception as e:
+        module.fail_json(msg="Error in creating instance: %s" % e)
+    if not module.params['wait']:
+        _exit_hostvars(module, cloud, server, **extra)
+
+    # Floating IPs, volumes and ports are made ready while the instance
+    # builds, and attached together once it is ACTIVE.
+    ports = module.params['ports'] or []
+    try:
+        server = provision.provision(
+            nova,
+            cloud.cinder_client if volumes else None,
+            cloud.neutron_client if ports else None,
+            server,
+            ip_pools=module.params['floating_ip_pools'] or [],
+            floating_ips=module.params['floating_ips'] or [],
+            volumes=volumes, networks=ports,
+            timeout=module.params['timeout'],
+            workers=module.params['batch_workers'])
+        if boot_volumes:
+            provision.name_volumes(
+                nova, cloud.cinder_client, server.id,
+                bootkwargs['block_device_mapping_v2'], boot_volumes,
+                workers=module.params['batch_workers'])
+    except provision.ProvisionError as e:
+        module.fail_json(
+            msg="Error in creating instance: %s" % e, id=server.id)
+
+    if (module.params['auto_floating_ip'] and
+            not module.params['floating_ip_pools'] and
+            not module.params['floating_ips']):
+        # Whether the instance needs one is only known once it is up
+        server = cloud.add_ips_to_server(server, auto_ip=True)
+    _exit_ready(module, cloud, server, **extra)
+
+
+def _exit_ready(module, cloud, server, **extra):
+    errors = _wait_ready(module, cloud, {server.name: server})
+    if errors:
+        module.fail_json(msg=errors[server.name], id=server.id, **extra)
+    _exit_hostvars(module, cloud, server, **extra)
 
 
 def _check_floating_ips(module, cloud, server):
@@ -313,24 +658,149 @@ def _check_floating_ips(module, cloud, server):
             changed = True
         elif module.params['floating_ips']:
             # we were configured to have specific ips, let's make sure we have
-            # those
-            missing_ips = []
-            for ip in module.params['floating_ips']:
-                if ip not in ips:
-                    missing_ips.append(ip)
-            if missing_ips:
-                server = cloud.add_ip_list(server, missing_ips)
-                changed = True
-            extra_ips = []
-            for ip in ips:
-                if ip not in module.params['floating_ips']:
-                    extra_ips.append(ip)
-            if extra_ips:
-                _delete_floating_ip_list(cloud, server, extra_ips)
+            # exactly those, adding and removing them all in one go
+            from shade_ansible import floating
+
+            if any(floating.diff(server, module.params['floating_ips'])):
+                try:
+                    server = floating.sync(
+                        cloud.nova_client, server,
+                        module.params['floating_ips'],
+                        module.params['timeout'],
+                        wait=module.params['wait'],
+                        workers=module.params['batch_workers'])
+                except floating.FloatingIPError as e:
+                    module.fail_json(msg=str(e), id=server.id)
                 changed = True
     return (changed, server)
 
 
+def _rebuild_servers(module, cloud, servers):
+    """Rebuild the servers running another image than the task's.
+
+    :param servers: A dict of servers keyed by name.
+    :returns: A (rebuilt, errors, notes) triple of dicts keyed by name, as
+              described in shade_ansible.updates.
+    """
+    from shade_ansible import updates
+
+    return updates.rebuild(
+        cloud.nova_client, servers, _get_image_id(module, cloud),
+        module.params['timeout'], wait=module.params['wait'],
+        workers=module.params['batch_workers'])
+
+
+def _resize_servers(module, cloud, servers):
+    """Resize the servers of another flavor than the task's.
+
+    :param servers: A dict of servers keyed by name.
+    :returns: A (resized, errors, notes) triple of dicts keyed by name, as
+              described in shade_ansible.updates.
+    """
+    from shade_ansible import updates
+
+    return updates.resize(
+        cloud.nova_client, servers, _get_flavor_id(module, cloud),
+        module.params['timeout'], wait=module.params['wait'],
+        workers=module.params['batch_workers'])
+
+
+def _update_metadata(module, cloud, servers):
+    """Bring the metadata of the servers in line with meta.
+
+    :param servers: A dict of servers keyed by name.
+    :returns: A (updated, errors, notes) triple of dicts keyed by name, as
+              described in shade_ansible.updates.
+    """
+    from shade_ansible import updates
+
+    return updates.update_metadata(
+        cloud.nova_client, servers, module.params['meta'],
+        purge=module.params['purge_meta'],
+        workers=module.params['batch_workers'])
+
+
+# In-place updates of existing servers, by the option turning them on
+UPDATES = (
+    ('resize', _resize_servers),
+    ('rebuild', _rebuild_servers),
+    ('meta', _update_metadata),
+)
+
+
+def _would_update(module, cloud, server):
+    """Whether the task would change a listed ACTIVE server."""
+    from shade_ansible import updates
+
+    ips = openstack_find_nova_addresses(server['addresses'], 'floating')
+    if module.params['floating_ips']:
+        changed = set(ips) != set(module.params['floating_ips'])
+    else:
+        changed = not ips and bool(
+            module.params['floating_ip_pools'] or
+            module.params['auto_floating_ip'])
+    if module.params['resize']:
+        changed = changed or (
+            str(server['flavor']['id']) != str(_get_flavor_id(module, cloud)))
+    if module.params['rebuild'] and updates.image_id(server['image']):
+        changed = changed or (
+            server['image']['id'] != _get_image_id(module, cloud))
+    if module.params['meta']:
+        wanted = updates.wanted_metadata(module.params['meta'])
+        changed = changed or any(updates.metadata_diff(
+            server['metadata'], wanted, module.params['purge_meta']))
+    return changed
+
+
+def _check_plan(module, cloud, server):
+    """The result the task would have for one server.
+
+    :param server: The listed server, or None.
+    """
+    from shade_ansible import updates
+
+    if module.params['state'] == 'absent':
+        if server:
+            return dict(changed=True, id=server['id'], result='would delete')
+        return dict(changed=False, result='not present')
+    if not server:
+        return dict(changed=True, result='would create')
+    if server['status'] != 'ACTIVE':
+        return dict(
+            failed=True, id=server['id'],
+            msg="The instance is available but not Active"
+                " state:" + server['status'])
+    if _would_update(module, cloud, server):
+        plan = dict(changed=True, id=server['id'], result='would update')
+    else:
+        plan = dict(changed=False, id=server['id'], result='present')
+    if module.params['rebuild'] and not updates.image_id(server['image']):
+        plan['not_rebuilt'] = updates.VOLUME_BACKED
+    return plan
+
+
+def _check_servers(module, cloud, names):
+    from shade_ansible import snapshot
+
+    resources = snapshot.Snapshot(cloud)
+    results = dict(
+        (name, _check_plan(
+            module, cloud, resources.find('servers', name=name)))
+        for name in names)
+    _exit_batch(module, results, any(
+        result.get('changed') for result in results.values()))
+
+
+def _check_server(module, cloud):
+    from shade_ansible import snapshot
+
+    result = _check_plan(module, cloud, snapshot.Snapshot(cloud).find(
+        'servers', name=module.params['name']))
+    if result.pop('failed', False):
+        module.fail_json(**result)
+    module.exit_json(**result)
+
+
 def _get_server_state(module, cloud):
     server = cloud.get_server_by_name(module.params['name'])
     if server and module.params['state'] == 'present':
@@ -338,8 +808,22 @@ def _get_server_state(module, cloud):
             module.fail_json(
                 msg="The instance is available but not Active"
                     " state:" + server.status)
+        updated = False
+        extra = {}
+        for (option, update) in UPDATES:
+            if not module.params[option]:
+                continue
+            (done, errors, notes) = update(
+                module, cloud, {server.name: server})
+            if errors:
+                module.fail_json(msg=errors[server.name], id=server.id)
+            if done:
+                (updated, server) = (True, done[server.name])
+            extra.update(notes.get(server.name, {}))
         (ip_changed, server) = _check_floating_ips(module, cloud, server)
-        _exit_hostvars(module, cloud, server, ip_changed)
+        if updated:
+            _exit_ready(module, cloud, server, **extra)
+        _exit_hostvars(module, cloud, server, ip_changed, **extra)
     if server and module.params['state'] == 'absent':
         return True
     if module.params['state'] == 'absent':
@@ -347,25 +831,200 @@ def _get_server_state(module, cloud):
     return True
 
 
+def _server_names(module):
+    if module.params['names']:
+        return module.params['names']
+    if module.params['count']:
+        return ['%s-%d' % (module.params['name'], i)
+                for i in range(1, module.params['count'] + 1)]
+    return None
+
+
+def _exit_batch(module, results, changed):
+    failed = sorted(
+        name for name, result in results.items() if result.get('failed'))
+    if failed and len(failed) == len(results):
+        module.fail_json(msg="All instances failed", servers=results)
+    module.exit_json(changed=changed, servers=results, failed_servers=failed)
+
+
+def _present_servers(module, cloud, names):
+    from shade_ansible import batch
+
+    nova = cloud.nova_client
+    workers = module.params['batch_workers']
+    servers = dict(
+        (s.name, s) for s in nova.servers.list() if s.name in names)
+    results = {}
+    created = set()
+    updated = set()
+    claim_errors = {}
+    notes = {}
+
+    for (option, update) in UPDATES:
+        if not module.params[option] or not servers:
+            continue
+        (done, errors, update_notes) = update(module, cloud, servers)
+        for name, msg in errors.items():
+            results[name] = dict(failed=True, id=servers.pop(name).id, msg=msg)
+        servers.update(done)
+        updated.update(done)
+        for name, note in update_notes.items():
+            notes.setdefault(name, {}).update(note)
+
+    missing = [name for name in names
+               if name not in servers and name not in results]
+    if missing:
+        image_id = _get_image_id(module, cloud)
+        flavor_id = _get_flavor_id(module, cloud)
+        if module.params['pool']:
+            (claimed, claim_errors) = _claim_servers(
+                module, cloud, missing, image_id, flavor_id)
+            servers.update(claimed)
+            created.update(claimed)
+            missing = [name for name in missing if name not in claimed]
+        bootkwargs = _boot_kwargs(module)
+
+        def boot(name):
+            return nova.servers.create(name, image_id, flavor_id, **bootkwargs)
+
+        booted = {}
+        for name, server, error in batch.run_parallel(boot, missing, workers):
+            if error:
+                results[name] = dict(
+                    failed=True, msg="Error in creating instance: %s" % error)
+            else:
+                booted[server.id] = name
+                servers[name] = server
+                created.add(name)
+
+        if booted and module.params['wait']:
+            done, errors = batch.poll(
+                nova.servers.list, booted, batch.status_check(('ACTIVE',)),
+                module.params['timeout'])
+            for server_id, error in errors.items():
+                name = booted[server_id]
+                del servers[name]
+                results[name] = dict(
+                    failed=True, id=server_id,
+                    msg="Error in creating instance: %s" % error)
+            for server_id, server in done.items():
+                servers[booted[server_id]] = server
+
+    def converge(name):
+        server = servers[name]
+        if server.status != 'ACTIVE':
+            if ((name in created or name in updated) and
+                    not module.params['wait']):
+                return (False, server)
+            raise Exception(
+                "The instance is available but not Active"
+                " state:" + server.status)
+        return _check_floating_ips(module, cloud, server)
+
+    fresh = {}
+    converged = {}
+    for name, outcome, error in batch.run_parallel(
+            converge, sorted(servers), workers):
+        if error:
+            results[name] = dict(
+                failed=True, id=servers[name].id, msg=str(error))
+            continue
+        (ip_changed, server) = outcome
+        converged[name] = server
+        results[name] = dict(
+            id=server.id,
+            changed=ip_changed or name in created or name in updated)
+        if server.status == 'ACTIVE' and (
+                name in created or name in updated):
+            fresh[name] = server
+    # Flavors, images and volumes are looked up once for all of them
+    for name, server_vars in hostvars.batch_hostvars(
+            cloud, converged, module.params['hostvars']).items():
+        if server_vars is not None:
+            results[name]['openstack'] = server_vars
+
+    if fresh:
+        for name, msg in _wait_ready(module, cloud, fresh).items():
+            results[name].update(failed=True, msg=msg)
+    for name, msg in claim_errors.items():
+        results[name]['claim_error'] = msg
+    for name, note in notes.items():
+        results[name].update(note)
+
+    _exit_batch(module, results, any(
+        result.get('changed') for result in results.values()))
+
+
+def _absent_servers(module, cloud, names):
+    from shade_ansible import batch
+
+    nova = cloud.nova_client
+    servers = [s for s in nova.servers.list() if s.name in names]
+    results = dict((name, dict(changed=False, result='not present'))
+                   for name in names)
+
+    deleted = {}
+    statuses = dict((server.id, server.status) for server in servers)
+    for server, _, error in batch.run_parallel(
+            nova.servers.delete, servers, module.params['batch_workers']):
+        if error:
+            results[server.name] = dict(
+                failed=True, id=server.id,
+                msg="Error in deleting vm: %s" % error)
+        else:
+            deleted[server.id] = server.name
+            results[server.name] = dict(
+                changed=True, id=server.id, result='deleted')
+
+    if deleted and module.params['wait']:
+        done, errors = batch.poll(
+            nova.servers.list, deleted, batch.gone_check(before=statuses),
+            module.params['timeout'])
+        for server_id, error in errors.items():
+            results[deleted[server_id]] = dict(
+                failed=True, id=server_id,
+                msg="Error in deleting vm: %s" % error)
+
+    _exit_batch(module, results, bool(deleted))
+
+
 def main():
 
     argument_spec = spec.openstack_argument_spec(
-        name=dict(required=True),
+        name=dict(default=None),
+        count=dict(default=None, type='int'),
+        names=dict(default=None, type='list'),
+        batch_workers=dict(default=10, type='int'),
+        hostvars=dict(default='full', choices=list(hostvars.DEPTHS)),
+        pool=dict(default=None),
+        pool_size=dict(default=0, type='int'),
         image_id=dict(default=None),
         image_name=dict(default=None),
         image_exclude=dict(default='(deprecated)'),
         flavor_id=dict(default=None),
         flavor_ram=dict(default=None, type='int'),
+        flavor_vcpus=dict(default=None, type='int'),
+        flavor_disk=dict(default=None, type='int'),
         flavor_include=dict(default=None),
+        flavor_exclude=dict(default=None),
         key_name=dict(default=None),
         security_groups=dict(default='default'),
         nics=dict(default=None),
-        meta=dict(default=None),
+        meta=dict(default=None, type='dict'),
+        purge_meta=dict(default=False, type='bool'),
         userdata=dict(default=None),
         config_drive=dict(default=False, type='bool'),
+        wait_for_port=dict(default=None, type='int'),
+        wait_for_console=dict(default=None),
+        rebuild=dict(default=False, type='bool'),
+        resize=dict(default=False, type='bool'),
         auto_floating_ip=dict(default=True, type='bool'),
-        floating_ips=dict(default=None),
-        floating_ip_pools=dict(default=None),
+        floating_ips=dict(default=None, type='list'),
+        floating_ip_pools=dict(default=None, type='list'),
+        volumes=dict(default=None, type='list'),
+        boot_volumes=dict(default=False, type='bool'),
+        ports=dict(default=None, type='list'),
     )
     module_kwargs = spec.openstack_module_kwargs(
         mutually_exclusive=[
@@ -374,21 +1033,70 @@ def main():
             ['floating_ips', 'floating_ip_pools'],
             ['image_id', 'image_name'],
             ['flavor_id', 'flavor_ram'],
+            ['flavor_id', 'flavor_vcpus'],
+            ['flavor_id', 'flavor_disk'],
+            ['name', 'names'],
+            ['count', 'names'],
+            ['count', 'floating_ips'],
+            ['names', 'floating_ips'],
+            ['count', 'volumes'],
+            ['names', 'volumes'],
+            ['count', 'ports'],
+            ['names', 'ports'],
+        ],
+        required_one_of=[
+            ['name', 'names', 'pool'],
         ],
     )
-    module = AnsibleModule(argument_spec, **module_kwargs)
+    module = AnsibleModule(
+        argument_spec, supports_check_mode=True, **module_kwargs)
+
+    if module.params['state'] == 'present':
+        if (not module.params['image_id'] and
+                not module.params['image_name']):
+            module.fail_json(msg="Parameter 'image_id' or `image_name`"
+                                 " is required if state == 'present'")
+        if module.params['resize'] and not any(
+                module.params[p] for p in (
+                    'flavor_id', 'flavor_ram', 'flavor_vcpus',
+                    'flavor_disk')):
+            module.fail_json(msg="Parameter 'flavor_id' or 'flavor_ram'"
+                                 " is required if resize is set")
+        if not module.params['wait'] and (
+                module.params['ports'] or (
+                    module.params['volumes'] and
+                    not module.params['boot_volumes'])):
+            module.fail_json(msg="Parameters 'volumes' and 'ports' need"
+                                 " wait, unless volumes are boot_volumes")
+
+    if module.params['count'] and not module.params['name']:
+        module.fail_json(msg="Parameter 'name' is required with 'count'")
+
+    names = _server_names(module)
+    if (not module.params['name'] and not names and
+            module.params['state'] == 'absent'):
+        module.fail_json(msg="Parameter 'name' or 'names' is required"
+                             " if state == 'absent'")
 
     try:
-        cloud = shade.openstack_cloud(**module.params)
+        cloud = spec.openstack_cloud(module)
+
+        if not module.params['name'] and not names:
+            _top_up_pool(module, cloud)
+
+        if module.check_mode:
+            if names:
+                _check_servers(module, cloud, names)
+            _check_server(module, cloud)
+
+        if names:
+            if module.params['state'] == 'present':
+                _present_servers(module, cloud, names)
+            _absent_servers(module, cloud, names)
 
         if module.params['state'] == 'present':
-            if (not module.params['image_id'] and
-                    not module.params['image_name']):
-                module.fail_json(msg="Parameter 'image_id' or `image_name`"
-                                     " is required if state == 'present'")
-            else:
-                _get_server_state(module, cloud)
-                _create_server(module, cloud)
+            _get_server_state(module, cloud)
+            _create_server(module, cloud)
         if module.params['state'] == 'absent':
             _get_server_state(module, cloud)
             _delete_server(module, cloud)
@@ -18,6 +18,7 @@
 try:
     import shade
     from shade import meta
+    from shade_ansible import hostvars
     from shade_ansible import spec
 except ImportError:
     print("failed=True msg='shade is required for this module'")
@@ -28,7 +29,12 @@ module: os_compute_facts
 short_description: Retrieve facts about a compute instance
 extends_documentation_fragment: openstack
 description:
-   - Retrieve facts about a compute instance from OpenStack
+   - Retrieve facts about a compute instance from OpenStack, or about many
+     of them at once. With names, ids or metadata the instances are found
+     in a single listing and their facts are set as openstack_servers, a
+     dict keyed by instance name. Flavor and image names are then taken from
+     the shared flavor and image caches and volumes from one listing, so the
+     number of API calls does not grow with the number of instances.
 options:
    name:
      description:
@@ -38,6 +44,18 @@ options:
      description:
         - Id of the instance
      default: None
+   names:
+     description:
+        - List of names of instances
+     default: None
+   ids:
+     description:
+        - List of ids of instances
+     default: None
+   metadata:
+     description:
+        - Dict of metadata that instances must all carry
+     default: None
    mounts:
      description:
         - Optional list of dicts tying volumes to mount points
@@ -52,28 +70,68 @@ EXAMPLES = '''
     cloud: rax-dfw
     name: vm1
 - debug: openstack
+
+# Fetch facts about every instance of the web group
+- os_compute_facts:
+    cloud: rax-dfw
+    metadata:
+      group: web
+- debug: var=openstack_servers
 '''
 
 
+def _matches(module, server):
+    if module.params['names'] and server.name not in module.params['names']:
+        return False
+    if module.params['ids'] and server.id not in module.params['ids']:
+        return False
+    for key, value in (module.params['metadata'] or {}).items():
+        if server.metadata.get(key) != value:
+            return False
+    return True
+
+
+def _bulk_facts(module, cloud):
+    servers = [server for server in cloud.nova_client.servers.list()
+               if _matches(module, server)]
+    facts = hostvars.bulk_hostvars(
+        cloud, servers, mounts=module.params['mounts'])
+    module.exit_json(
+        changed=False, ansible_facts=dict(openstack_servers=facts))
+
+
 def main():
 
     argument_spec = spec.openstack_argument_spec(
         name=dict(default=None),
         id=dict(default=None),
+        names=dict(default=None, type='list'),
+        ids=dict(default=None, type='list'),
+        metadata=dict(default=None, type='dict'),
         mounts=dict(default={}),
     )
     module_kwargs = spec.openstack_module_kwargs(
         mutually_exclusive=[
             ['name', 'id'],
+            ['name', 'names'],
+            ['name', 'ids'],
+            ['name', 'metadata'],
+            ['id', 'names'],
+            ['id', 'ids'],
+            ['id', 'metadata'],
         ],
         required_one_of=[
-            ['name', 'id'],
+            ['name', 'id', 'names', 'ids', 'metadata'],
         ],
     )
-    module = AnsibleModule(argument_spec, **module_kwargs)
+    module = AnsibleModule(
+        argument_spec, supports_check_mode=True, **module_kwargs)
 
     try:
-        cloud = shade.openstack_cloud(**module.params)
+        cloud = spec.openstack_cloud(module)
+        if (module.params['names'] or module.params['ids'] or
+                module.params['metadata']):
+            _bulk_facts(module, cloud)
         if module.params['id']:
             server = cloud.get_server_by_id(module.params['id'])
         else:
@@ -21,6 +21,8 @@ import time
 try:
     import shade
     from shade import meta
+    from shade_ansible import batch
+    from shade_ansible import snapshot
     from shade_ansible import spec
 except ImportError:
     print("failed=True msg='shade is required for this module'")
@@ -64,6 +66,27 @@ options:
       - Device you want to attach
      required: false
      default: None
+   volumes:
+     description:
+      - List of volumes to attach to or detach from the server at once,
+        each a dict with a volume_name or volume_id and optionally a
+        device. The server's attachments are read once, and the attaches
+        and detaches needed run concurrently and are waited for together
+     required: false
+     default: None
+   exclusive:
+     description:
+      - With volumes and state present, also detach the volumes attached
+        to the server that volumes does not list, other than the volume
+        a server booted from a volume runs on
+     required: false
+     default: 'no'
+   batch_workers:
+     description:
+      - How many API calls to run concurrently when handling several
+        volumes
+     required: false
+     default: 10
 requirements: ["shade"]
 '''
 
@@ -83,6 +106,17 @@ EXAMPLES = '''
       server_name: Mysql-server
       volume_name: mysql-data
       device: /dev/vdb
+
+# Attaches two volumes and detaches any other
+- os_compute_volume:
+    cloud: mordred
+    server_name: Mysql-server
+    exclusive: yes
+    volumes:
+      - volume_name: mysql-data
+        device: /dev/vdb
+      - volume_name: mysql-logs
+        device: /dev/vdc
 '''
 
 
@@ -120,7 +154,7 @@ def _present_volume(cloud, nova, cinder, module):
             # Attached. Now, do we care about device?
             if (module.params['device'] and
                 not _check_device_attachment(
-                    volume, modules.params['device'],
+                    volume, module.params['device'],
                     module.params['server_id'])):
                 nova.volumes.delete_server_volume(
                     module.params['server_id'],
@@ -143,19 +177,21 @@ def _present_volume(cloud, nova, cinder, module):
                                           module.params['volume_id'],
                                           module.params['device'])
     except Exception as e:
-        module.fail_json(msg='Cannot add volume to server:%s' % str(n))
+        module.fail_json(msg='Cannot add volume to server:%s' % str(e))
 
+    attachment = None
     if module.params['wait']:
         expires = float(module.params['timeout']) + time.time()
-        attachment = None
-        while time.time() < expires:
+        while attachment is None and time.time() < expires:
             volume = cinder.volumes.get(module.params['volume_id'])
             for attach in volume.attachments:
                 if attach['server_id'] == module.params['server_id']:
                     attachment = attach
                     break
+            else:
+                time.sleep(2)
 
-    if attachment:
+    if attachment or not module.params['wait']:
         server = cloud.get_server_by_id(module.params['server_id'])
         hostvars = meta.get_hostvars_from_server(cloud, server)
         module.exit_json(
@@ -186,6 +222,149 @@ def _absent_volume(nova, cinder, module):
     module.exit_json(changed=True, result='Detached volume from server')
 
 
+def _find_server(nova, module):
+    if module.params['server_id']:
+        return nova.servers.get(module.params['server_id'])
+    for server in nova.servers.list(
+            search_opts={'name': module.params['server_name']}):
+        if server.name == module.params['server_name']:
+            return server
+    module.fail_json(
+        msg='Cannot find server %s' % module.params['server_name'])
+
+
+def _wanted_volumes(module, listing):
+    from shade_ansible import volumes
+
+    try:
+        return volumes.wanted_attachments(module.params['volumes'], listing)
+    except volumes.VolumeNotFound as e:
+        module.fail_json(msg=str(e))
+
+
+def _volume_changes(module, server, wanted, attached):
+    from shade_ansible import volumes
+
+    return volumes.attachment_changes(
+        wanted, attached, module.params['state'], module.params['exclusive'],
+        root=volumes.root_volume(server, attached))
+
+
+def _run_changes(module, cinder, func, volume_ids, ready, what, wait):
+    """Run func on the volumes concurrently, then wait for all of them."""
+    if not volume_ids:
+        return
+    errors = ['%s: %s' % (volume_id, error)
+              for volume_id, _, error in batch.run_parallel(
+                  func, volume_ids, module.params['batch_workers'])
+              if error]
+    if errors:
+        module.fail_json(msg='Error %s volumes:%s' % (what, '; '.join(errors)))
+    if not wait:
+        return
+    done, failed = batch.poll(
+        cinder.volumes.list, volume_ids, ready,
+        float(module.params['timeout']))
+    if failed:
+        module.fail_json(msg='Error %s volumes:%s' % (what, '; '.join(
+            '%s: %s' % item for item in sorted(failed.items()))))
+
+
+def _sync_volumes(cloud, nova, cinder, module):
+    server = _find_server(nova, module)
+    wanted = _wanted_volumes(module, lambda: [
+        (v.id, v.display_name) for v in cinder.volumes.list()])
+    attached = dict((a.volumeId, a.device)
+                    for a in nova.volumes.get_server_volumes(server.id))
+    (to_detach, to_attach) = _volume_changes(
+        module, server, wanted, attached)
+
+    def attached_to_server(volume):
+        if volume is None:
+            return None
+        if any(a['server_id'] == server.id for a in volume.attachments):
+            return True
+        if volume.status == 'error':
+            return 'status is error'
+        return None
+
+    _run_changes(
+        module, cinder,
+        lambda volume_id: nova.volumes.delete_server_volume(
+            server.id, volume_id),
+        to_detach, batch.status_check(('available',), ('error',)),
+        'detaching',
+        # A moved volume must be free before it can be attached again
+        module.params['wait'] or set(to_detach) & set(to_attach))
+    _run_changes(
+        module, cinder,
+        lambda volume_id: nova.volumes.create_server_volume(
+            server.id, volume_id, wanted[volume_id]),
+        to_attach, attached_to_server, 'attaching', module.params['wait'])
+
+    changed = bool(to_detach or to_attach)
+    attachments = [dict(volume_id=a.volumeId, device=a.device)
+                   for a in nova.volumes.get_server_volumes(server.id)]
+    if changed:
+        server = nova.servers.get(server.id)
+    module.exit_json(
+        changed=changed, id=server.id, attachments=attachments,
+        openstack=meta.get_hostvars_from_server(cloud, server))
+
+
+def _find_check_server(module, resources):
+    if module.params['server_id']:
+        server = resources.find('servers', id=module.params['server_id'])
+    else:
+        server = resources.find('servers', name=module.params['server_name'])
+    if not server:
+        module.fail_json(msg='Cannot find the volume or the server')
+    return server
+
+
+def _check_volumes(module, resources, server):
+    wanted = _wanted_volumes(module, lambda: [
+        (v['id'], v['display_name']) for v in resources.list('volumes')])
+    attached = {}
+    for volume in resources.list('volumes'):
+        for attach in volume['attachments']:
+            if attach['server_id'] == server['id']:
+                attached[volume['id']] = attach['device']
+    (to_detach, to_attach) = _volume_changes(
+        module, server, wanted, attached)
+    module.exit_json(
+        changed=bool(to_detach or to_attach),
+        would_detach=to_detach, would_attach=to_attach)
+
+
+def _check_volume(cloud, module):
+    resources = snapshot.Snapshot(cloud)
+    if module.params['volumes']:
+        server = _find_check_server(module, resources)
+        _check_volumes(module, resources, server)
+    if module.params['volume_id']:
+        volume = resources.find('volumes', id=module.params['volume_id'])
+    else:
+        volume = resources.find(
+            'volumes', display_name=module.params['volume_name'])
+    server = _find_check_server(module, resources)
+    if not volume:
+        module.fail_json(msg='Cannot find the volume or the server')
+
+    devices = [attach['device'] for attach in volume['attachments']
+               if attach['server_id'] == server['id']]
+    if module.params['state'] == 'present':
+        if devices and (not module.params['device'] or
+                        module.params['device'] in devices):
+            module.exit_json(
+                changed=False, result='Volume already attached',
+                attachments=volume['attachments'])
+        module.exit_json(changed=True, result='would attach')
+    if devices:
+        module.exit_json(changed=True, result='would detach')
+    module.exit_json(changed=False, msg='Volume is not attached to server')
+
+
 def main():
     argument_spec = spec.openstack_argument_spec(
         server_id=dict(default=None),
@@ -193,25 +372,37 @@ def main():
         volume_id=dict(default=None),
         volume_name=dict(default=None),
         device=dict(default=None),
+        volumes=dict(default=None, type='list'),
+        exclusive=dict(default=False, type='bool'),
+        batch_workers=dict(default=10, type='int'),
     )
     module_kwargs = spec.openstack_module_kwargs(
         mutually_exclusive=[
             ['server_id', 'server_name'],
             ['volume_id', 'volume_name'],
+            ['volume_id', 'volumes'],
+            ['volume_name', 'volumes'],
+            ['device', 'volumes'],
         ],
         required_one_of=[
             ['server_id', 'server_name'],
-            ['volume_id', 'volume_name'],
+            ['volume_id', 'volume_name', 'volumes'],
         ],
     )
 
-    module = AnsibleModule(argument_spec, **module_kwargs)
+    module = AnsibleModule(
+        argument_spec, supports_check_mode=True, **module_kwargs)
 
     try:
-        cloud = shade.openstack_cloud(**module.params)
+        cloud = spec.openstack_cloud(module)
+        if module.check_mode:
+            _check_volume(cloud, module)
         cinder = cloud.cinder_client
         nova = cloud.nova_client
 
+        if module.params['volumes']:
+            _sync_volumes(cloud, nova, cinder, module)
+
         if module.params['volume_name'] is not None:
             module.params['volume_id'] = cloud.get_volume_id(
                 module.params['volume_name'])
@@ -17,8 +17,6 @@
 # You should have received a copy of the GNU General Public License
 # along with this software.  If not, see <http://www.gnu.org/licenses/>.
 
-import time
-
 try:
     import shade
     from shade_ansible import spec
@@ -190,7 +188,7 @@ def main():
     module = AnsibleModule(argument_spec, **module_kwargs)
 
     try:
-        cloud = shade.openstack_cloud(**module.params)
+        cloud = spec.openstack_cloud(module)
         nova = cloud.nova_client
         neutron = cloud.neutron_client
 
@@ -18,7 +18,12 @@
 
 try:
     import shade
+    from shade_ansible import batch
+    from shade_ansible import images
+    from shade_ansible import readiness
+    from shade_ansible import snapshot
     from shade_ansible import spec
+    from shade_ansible import store
 except ImportError:
     print("failed=True msg='shade is required for this module'")
 
@@ -101,10 +106,22 @@ EXAMPLES = '''
                 copy_from=http:launchpad.net/cirros/trunk/0.3.0/+download/cirros-0.3.0-x86_64-disk.img
 '''
 
+import os
 import time
 
 
-def _glance_image_create(module, params, client):
+def _predictor(cloud, params):
+    size = None
+    if params['file']:
+        size = os.path.getsize(params['file']) // 2 ** 20
+    return readiness.Predictor((
+        store.scope(cloud), 'image', params['disk_format'],
+        'copy' if params['copy_from'] else 'upload',
+        readiness.size_bucket(size)))
+
+
+def _glance_image_create(module, params, cloud):
+    client = cloud.glance_client
     kwargs = {
         'name':             params.get('name'),
         'disk_format':      params.get('disk_format'),
@@ -114,18 +131,25 @@ def _glance_image_create(module, params, client):
         'copy_from':        params.get('copy_from'),
     }
     try:
+        predictor = _predictor(cloud, params)
         timeout = params.get('timeout')
-        expire = time.time() + timeout
+        started = time.time()
         image = client.images.create(**kwargs)
         if not params['copy_from']:
             image.update(data=open(params['file'], 'rb'))
-        while time.time() < expire:
+        done, errors = batch.poll(
+            lambda: [client.images.get(image.id)], [image.id],
+            batch.status_check(('active',), ('killed',)),
+            max(started + timeout - time.time(), 0),
+            interval=predictor.schedule())
+        if image.id in done:
+            image = done[image.id]
+            predictor.record_ready(image, time.time() - started)
+        else:
             image = client.images.get(image.id)
-            if image.status == 'active':
-                break
-            time.sleep(5)
     except Exception, e:
-        module.fail_json(msg="Error in creating image: %s" % e.message)
+        module.fail_json(msg="Error in creating image: %s" % str(e))
+    images.forget(cloud)
     if image.status == 'active':
         module.exit_json(changed=True, result=image.status, id=image.id)
     else:
@@ -133,16 +157,29 @@ def _glance_image_create(module, params, client):
                              "manually " + image.status)
 
 
-def _glance_delete_image(module, params, client):
+def _glance_delete_image(module, params, cloud):
+    client = cloud.glance_client
     try:
         for image in client.images.list():
             if image.name == params['name']:
                 client.images.delete(image)
     except Exception, e:
         module.fail_json(msg="Error in deleting image: %s" % e.message)
+    images.forget(cloud)
     module.exit_json(changed=True, result="Deleted")
 
 
+def _check_image(module, cloud):
+    image = snapshot.Snapshot(cloud).find('images', name=module.params['name'])
+    if module.params['state'] == 'present':
+        if image:
+            module.exit_json(changed=False, id=image['id'], result="success")
+        module.exit_json(changed=True, result="would create")
+    if image:
+        module.exit_json(changed=True, result="would delete")
+    module.exit_json(changed=False, result="Success")
+
+
 def main():
 
     argument_spec = spec.openstack_argument_spec(
@@ -165,7 +202,8 @@ def main():
     module_kwargs = spec.openstack_module_kwargs(
         mutually_exclusive=[['file', 'copy_from']],
     )
-    module = AnsibleModule(argument_spec, **module_kwargs)
+    module = AnsibleModule(
+        argument_spec, supports_check_mode=True, **module_kwargs)
 
     if module.params['state'] == 'present':
         if not module.params['file'] and not module.params['copy_from']:
@@ -173,17 +211,15 @@ def main():
                                  "be set to create the image")
 
     try:
-        cloud = shade.openstack_cloud(**module.params)
+        cloud = spec.openstack_cloud(module)
+        if module.check_mode:
+            _check_image(module, cloud)
 
         id = cloud.get_image_id(module.params['name'])
 
         if module.params['state'] == 'present':
             if not id:
-                _glance_image_create(
-                    module,
-                    module.params,
-                    cloud.glance_client
-                )
+                _glance_image_create(module, module.params, cloud)
             module.exit_json(changed=False, id=id, result="success")
 
         if module.params['state'] == 'absent':
@@ -193,7 +229,7 @@ def main():
                 _glance_delete_image(
                     module,
                     module.params,
-                    cloud.glance_client
+                    cloud
                 )
     except shade.OpenStackCloudException as e:
         module.fail_json(msg=e.message)
@@ -17,10 +17,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this software.  If not, see <http://www.gnu.org/licenses/>.
 
-import time
-
 try:
     import shade
+    from shade_ansible import snapshot
     from shade_ansible import spec
 except ImportError:
     print("failed=True msg='shade is required for this module'")
@@ -65,16 +64,37 @@ EXAMPLES = '''
 '''
 
 
+def _check_keypair(module, cloud):
+    key = snapshot.Snapshot(cloud).find(
+        'keypairs', name=module.params['name'])
+    if module.params['state'] == 'present':
+        if key:
+            if (module.params['public_key'] and
+                    module.params['public_key'] != key['public_key']):
+                module.fail_json(
+                    msg="name {} present but key hash not "
+                        "the same as offered. "
+                        "Delete key first.".format(key['name']))
+            module.exit_json(changed=False, result="Key present")
+        module.exit_json(changed=True, result="would create")
+    if key:
+        module.exit_json(changed=True, result="would delete")
+    module.exit_json(changed=False, result="not present")
+
+
 def main():
     argument_spec = spec.openstack_argument_spec(
         name=dict(required=True),
         public_key=dict(default=None),
     )
     module_kwargs = spec.openstack_module_kwargs()
-    module = AnsibleModule(argument_spec, **module_kwargs)
+    module = AnsibleModule(
+        argument_spec, supports_check_mode=True, **module_kwargs)
 
     try:
-        nova = shade.openstack_cloud(**module.params)
+        nova = spec.openstack_cloud(module)
+        if module.check_mode:
+            _check_keypair(module, nova)
 
         if module.params['state'] == 'present':
             for key in nova.list_keypairs():
@@ -18,6 +18,7 @@
 
 try:
     import shade
+    from shade_ansible import snapshot
     from shade_ansible import spec
 except ImportError:
     print("failed=True msg='shade is required for this module'")
@@ -177,6 +178,19 @@ def _delete_network(module, net_id, neutron):
     return True
 
 
+def _check_network(module, cloud):
+    network = snapshot.Snapshot(cloud).find(
+        'networks', name=module.params['name'])
+    if module.params['state'] == 'present':
+        if network:
+            module.exit_json(changed=False, result="Success",
+                             id=network['id'])
+        module.exit_json(changed=True, result="would create")
+    if network:
+        module.exit_json(changed=True, result="would delete")
+    module.exit_json(changed=False, result="Success")
+
+
 def main():
 
     argument_spec = spec.openstack_argument_spec(
@@ -193,7 +207,8 @@ def main():
         admin_state_up=dict(default=True, type='bool'),
     )
     module_kwargs = spec.openstack_module_kwargs()
-    module = AnsibleModule(argument_spec, **module_kwargs)
+    module = AnsibleModule(
+        argument_spec, supports_check_mode=True, **module_kwargs)
 
     if module.params['provider_network_type'] in ['vlan', 'flat']:
         if not module.params['provider_physical_network']:
@@ -207,8 +222,10 @@ def main():
                                      "be set.")
 
     try:
-        cloud = shade.openstack_cloud(**module.params)
+        cloud = spec.openstack_cloud(module)
         neutron = cloud.neutron_client
+        if module.check_mode:
+            _check_network(module, cloud)
 
         _set_tenant_id(module)
 
@@ -18,6 +18,7 @@
 
 try:
     import shade
+    from shade_ansible import snapshot
     from shade_ansible import spec
 except ImportError:
     print("failed=True msg='shade is required for this module'")
@@ -92,18 +93,34 @@ def _delete_router(module, neutron, router_id):
     return True
 
 
+def _check_router(module, cloud):
+    router = snapshot.Snapshot(cloud).find(
+        'routers', name=module.params['name'])
+    if module.params['state'] == 'present':
+        if router:
+            module.exit_json(changed=False, result="success",
+                             id=router['id'])
+        module.exit_json(changed=True, result="would create")
+    if router:
+        module.exit_json(changed=True, result="would delete")
+    module.exit_json(changed=False, result="success")
+
+
 def main():
-    argument_spec = openstack_argument_spec(
+    argument_spec = spec.openstack_argument_spec(
         name=dict(required=True),
         state=dict(default='present', choices=['absent', 'present']),
         admin_state_up=dict(type='bool', default=True),
     )
     module_kwargs = spec.openstack_module_kwargs()
-    module = AnsibleModule(argument_spec, **module_kwargs)
+    module = AnsibleModule(
+        argument_spec, supports_check_mode=True, **module_kwargs)
 
     try:
-        cloud = shade.openstack_cloud(**module.params)
+        cloud = spec.openstack_cloud(module)
         neutron = cloud.neutron_client
+        if module.check_mode:
+            _check_router(module, cloud)
 
         if module.params['state'] == 'present':
             router_id = _get_router_id(module, neutron)
@@ -18,6 +18,7 @@
 
 try:
     import shade
+    from shade_ansible import snapshot
     from shade_ansible import spec
 except ImportError:
     print("failed=True msg='shade is required for this module'")
@@ -121,18 +122,44 @@ def _remove_gateway_router(neutron, module, router_id):
     return True
 
 
+def _check_gateway(module, cloud):
+    resources = snapshot.Snapshot(cloud)
+    router = resources.find('routers', name=module.params['router_name'])
+    if not router:
+        module.fail_json(msg="failed to get the router id, please check "
+                             "the router name")
+    network = resources.find(
+        'networks', name=module.params['network_name'], external=True)
+    if not network:
+        module.fail_json(msg="failed to get the network id, please check "
+                             "the network name and make sure it is "
+                             "external")
+    gateway = router['external_gateway_info'] or {}
+    attached = gateway.get('network_id') == network['id']
+    if module.params['state'] == 'present':
+        if attached:
+            module.exit_json(changed=False, result="success")
+        module.exit_json(changed=True, result="would create")
+    if attached:
+        module.exit_json(changed=True, result="would delete")
+    module.exit_json(changed=False, result="Success")
+
+
 def main():
 
-    argument_spec = openstack_argument_spec(
+    argument_spec = spec.openstack_argument_spec(
         router_name=dict(required=True),
         network_name=dict(required=True),
     )
     module_kwargs = spec.openstack_module_kwargs()
-    module = AnsibleModule(argument_spec, **module_kwargs)
+    module = AnsibleModule(
+        argument_spec, supports_check_mode=True, **module_kwargs)
 
     try:
-        cloud = shade.openstack_cloud(**module.params)
+        cloud = spec.openstack_cloud(module)
         neutron = cloud.neutron_client
+        if module.check_mode:
+            _check_gateway(module, cloud)
 
         router_id = _get_router_id(module, neutron)
 
@@ -129,7 +129,7 @@ def _remove_interface_router(neutron, module, router_id, subnet_id):
 
 
 def main():
-    argument_spec = openstack_argument_spec(
+    argument_spec = spec.openstack_argument_spec(
         router_name=dict(required=True),
         subnet_name=dict(required=True),
     )
@@ -137,7 +137,7 @@ def main():
     module = AnsibleModule(argument_spec, **module_kwargs)
 
     try:
-        cloud = shade.openstack_cloud(**module.params)
+        cloud = spec.openstack_cloud(module)
         neutron = cloud.neutron_client
 
         router_id = _get_router_id(module, neutron)
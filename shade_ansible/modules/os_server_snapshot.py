@@ -0,0 +1,186 @@
+#!/usr/bin/python
+
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+try:
+    from shade_ansible import readiness
+    from shade_ansible import server_snapshots
+    from shade_ansible import snapshot
+    from shade_ansible import spec
+    from shade_ansible import store
+    import shade
+except ImportError:
+    print("failed=True msg='shade is required for this module'")
+
+
+DOCUMENTATION = '''
+---
+module: os_server_snapshot
+short_description: Snapshot Nova Compute instances into Glance images
+extends_documentation_fragment: openstack
+description:
+   - Create images of running instances, several at a time, and optionally
+     delete their older snapshots
+options:
+   state:
+     description:
+        - With C(present) the servers are snapshotted. With C(absent) no
+          snapshot is taken, and the snapshots this module took of the
+          servers are deleted down to keep, which is then required
+     choices: ['present', 'absent']
+     default: present
+   servers:
+     description:
+        - List of names or IDs of the servers to snapshot. The snapshots are
+          requested concurrently and waited for together, and the result
+          holds a snapshots dict keyed by server
+     required: true
+   name_format:
+     description:
+        - Name of the images, with C(%(server)s) standing for the server name
+          and C(%(timestamp)s) for the UTC time the run started
+     required: false
+     default: '%(server)s-%(timestamp)s'
+   metadata:
+     description:
+        - Dict of properties to set on the images
+     required: false
+     default: None
+   keep:
+     description:
+        - Once the new snapshots are active, delete all but the newest keep
+          snapshots of each server taken by this module. Servers whose
+          snapshot failed are left alone, and nothing is deleted when
+          unset or, with state present, without wait. Required with state
+          absent, where C(0) deletes them all
+     required: false
+     default: None
+   batch_workers:
+     description:
+        - How many API calls to run concurrently
+     required: false
+     default: 10
+requirements: ["shade"]
+'''
+
+EXAMPLES = '''
+# Nightly snapshots of the web servers, keeping a week of them
+- os_server_snapshot:
+    cloud: mordred
+    servers: "{{ groups['web'] }}"
+    keep: 7
+    timeout: 3600
+'''
+
+
+def _predictor(cloud, count):
+    # The images come out of one compute host each, but share glance,
+    # so how long a batch takes depends on how many there are.
+    return readiness.Predictor((
+        store.scope(cloud), 'server_snapshot',
+        readiness.size_bucket(count)))
+
+
+def _snapshot_servers(module, cloud):
+    nova = cloud.nova_client
+    glance = cloud.glance_client
+    workers = module.params['batch_workers']
+    (servers, missing) = server_snapshots.find_servers(
+        nova, module.params['servers'])
+    results = dict(
+        (name, dict(failed=True, msg='Cannot find server'))
+        for name in missing)
+
+    keep = module.params['keep']
+    if module.params['state'] == 'present':
+        names = server_snapshots.create(
+            nova, glance, servers, module.params['name_format'],
+            module.params['metadata'], results, module.params['timeout'],
+            wait=module.params['wait'],
+            predictor=_predictor(cloud, len(servers)), workers=workers)
+    else:
+        names = list(servers)
+    # Without waiting, the new snapshots are not known to be good yet
+    if keep is not None and (
+            module.params['state'] == 'absent' or module.params['wait']):
+        server_snapshots.prune(
+            glance, servers, names, keep, results, workers=workers)
+    for name in names:
+        results.setdefault(name, dict(changed=False))
+
+    failed = sorted(
+        name for name, result in results.items() if result.get('failed'))
+    if failed and len(failed) == len(results):
+        module.fail_json(msg='All snapshots failed', snapshots=results)
+    module.exit_json(
+        changed=any(r.get('changed') for r in results.values()),
+        snapshots=results, failed_servers=failed)
+
+
+def _check_snapshots(module, cloud):
+    resources = snapshot.Snapshot(cloud)
+    found = []
+    missing = []
+    for name_or_id in module.params['servers']:
+        if (resources.find('servers', id=name_or_id) or
+                resources.find('servers', name=name_or_id)):
+            found.append(name_or_id)
+        else:
+            missing.append(name_or_id)
+    if module.params['state'] == 'present':
+        module.exit_json(
+            changed=bool(found), result='would snapshot',
+            would_snapshot=found, failed_servers=missing)
+    # Which older snapshots would go is not in the snapshot listing
+    module.exit_json(
+        changed=bool(found), result='would prune', failed_servers=missing)
+
+
+def main():
+    argument_spec = spec.openstack_argument_spec(
+        servers=dict(required=True, type='list'),
+        name_format=dict(default='%(server)s-%(timestamp)s'),
+        metadata=dict(default=None, type='dict'),
+        keep=dict(default=None, type='int'),
+        batch_workers=dict(default=10, type='int'),
+    )
+    module_kwargs = spec.openstack_module_kwargs()
+    module = AnsibleModule(
+        argument_spec, supports_check_mode=True, **module_kwargs)
+
+    if module.params['keep'] is not None and module.params['keep'] < 0:
+        module.fail_json(msg='keep must not be negative')
+    if module.params['keep'] is None and module.params['state'] == 'absent':
+        module.fail_json(msg="Parameter 'keep' is required"
+                             " if state == 'absent'")
+    try:
+        server_snapshots.image_name(
+            module.params['name_format'], 'server', 'timestamp')
+    except server_snapshots.NameFormatError as e:
+        module.fail_json(msg=str(e))
+
+    try:
+        cloud = spec.openstack_cloud(module)
+        if module.check_mode:
+            _check_snapshots(module, cloud)
+        _snapshot_servers(module, cloud)
+    except shade.OpenStackCloudException as e:
+        module.fail_json(msg=e.message)
+
+# this is magic, see lib/ansible/module_utils/common.py
+from ansible.module_utils.basic import *
+from ansible.module_utils.openstack import *
+main()
@@ -18,6 +18,7 @@
 
 try:
     import shade
+    from shade_ansible import snapshot
     from shade_ansible import spec
 except ImportError:
     print("failed=True msg='shade is required for this module'")
@@ -171,9 +172,26 @@ def _delete_subnet(module, neutron, subnet_id):
     return True
 
 
+def _check_subnet(module, cloud):
+    resources = snapshot.Snapshot(cloud)
+    network = resources.find(
+        'networks', name=module.params['network_name'])
+    if not network:
+        module.fail_json(msg="network id of network not found.")
+    subnet = resources.find('subnets', name=module.params['name'])
+    if module.params['state'] == 'present':
+        if subnet:
+            module.exit_json(changed=False, result="success",
+                             id=subnet['id'])
+        module.exit_json(changed=True, result="would create")
+    if subnet:
+        module.exit_json(changed=True, result="would delete")
+    module.exit_json(changed=False, result="success")
+
+
 def main():
 
-    argument_spec = openstack_argument_spec(
+    argument_spec = spec.openstack_argument_spec(
         name=dict(required=True),
         network_name=dict(required=True),
         cidr=dict(required=True),
@@ -185,11 +203,14 @@ def main():
         allocation_pool_end=dict(default=None),
     )
     module_kwargs = spec.openstack_module_kwargs()
-    module = AnsibleModule(argument_spec, **module_kwargs)
+    module = AnsibleModule(
+        argument_spec, supports_check_mode=True, **module_kwargs)
 
     try:
-        cloud = shade.openstack_cloud(**module.params)
+        cloud = spec.openstack_cloud(module)
         neutron = cloud.neutron_client
+        if module.check_mode:
+            _check_subnet(module, cloud)
         if module.params['state'] == 'present':
             subnet_id = _get_subnet_id(module, neutron)
             if not subnet_id:
@@ -18,13 +18,17 @@
 import time
 
 try:
+    from shade_ansible import batch
+    from shade_ansible import images
+    from shade_ansible import readiness
+    from shade_ansible import snapshot
     from shade_ansible import spec
+    from shade_ansible import store
+    from shade_ansible import volumes
     import shade
 except ImportError:
     print("failed=True msg='shade is required for this module'")
 
-from cinderclient import exceptions as cinder_exc
-
 
 DOCUMENTATION = '''
 ---
@@ -41,14 +45,62 @@ options:
      default: present
    size:
      description:
-        - Size of volume in GB
-     requried: true
+        - Size of volume in GB. Required with display_name when state is
+          present
+     required: false
      default: None
    display_name:
      description:
-        - Name of volume
-     required: true
+        - Name of volume. Required unless volumes is given
+     required: false
+     default: None
+   clone_cache:
+     description:
+        - Create volumes from images by cloning a golden volume kept per
+          image and volume type, C(volume) cloning it directly and
+          C(snapshot) going through a snapshot of it, instead of having
+          cinder write out the image every time. The golden volume is built
+          on first use, at the smallest size the image fits on, and rebuilt
+          when the image behind image_name changes
+     choices: ['none', 'volume', 'snapshot']
+     required: false
+     default: none
+   volumes:
+     description:
+        - List of volumes to manage at once, each a dict with a
+          display_name and any of size, display_description, volume_type,
+          image_id, image_name and snapshot_id, defaulting to the options of
+          the task. Missing volumes are created concurrently and waited for
+          together, and the result holds a volumes dict keyed by name. With
+          state absent the volumes of these names are deleted, and the
+          result holds a volumes dict keyed by ID and lists the names that
+          were not found in missing_volumes
+     required: false
      default: None
+   name_prefix:
+     description:
+        - With state absent, delete every volume whose name starts with
+          this prefix
+     required: false
+     default: None
+   metadata:
+     description:
+        - With state absent, delete every volume carrying all of these
+          metadata items, the values compared as strings
+     required: false
+     default: None
+   detach:
+     description:
+        - With state absent and several volumes, detach volumes that are
+          still attached before deleting them
+     required: false
+     default: 'no'
+   batch_workers:
+     description:
+        - How many API calls to run concurrently when managing several
+          volumes
+     required: false
+     default: 10
    display_description:
      description:
        - String describing the volume
@@ -93,43 +145,156 @@ EXAMPLES = '''
       availability_zone: az2
       size: 40
       display_name: test_volume
+
+# Creates three volumes at once
+- os_volume:
+    cloud: mordred
+    size: 10
+    volumes:
+      - display_name: data
+      - display_name: logs
+      - display_name: scratch
+        size: 100
+
+# Tears down every volume of a test environment
+- os_volume:
+    cloud: mordred
+    state: absent
+    name_prefix: ci-1234-
+    detach: yes
 '''
 
 
-def _present_volume(module, cinder, cloud):
-    for v in cinder.volumes.list():
-        if v.display_name == module.params['display_name']:
-            module.exit_json(changed=False, id=v.id, info=v._info)
-    image_id = module.params['image_id']
-    if module.params['image_name']:
-        image_id = cloud.get_image_id(module.params['image_name'])
+def _volume_args(module, cloud, params):
+    image_id = params['image_id']
+    if params['image_name']:
+        image_id = images.exact(cloud, params['image_name'])['id']
     volume_args = dict(
-        size=module.params['size'],
-        volume_type=module.params['volume_type'],
-        display_name=module.params['display_name'],
-        display_description=module.params['display_description'],
+        size=params['size'],
+        volume_type=params['volume_type'],
+        display_name=params['display_name'],
+        display_description=params['display_description'],
         imageRef=image_id,
-        snapshot_id=module.params['snapshot_id'],
+        snapshot_id=params['snapshot_id'],
         availability_zone=module.params['availability_zone'],
     )
+    if image_id and module.params['clone_cache'] != 'none':
+        from shade_ansible import golden
+
+        source = golden.GoldenCache(
+            cloud.cinder_client, module.params['timeout']).source(
+                params['image_name'] or image_id, image_id,
+                params['volume_type'], int(params['size']),
+                golden.min_size(cloud.glance_client.images.get(image_id)),
+                module.params['clone_cache'])
+        if source:
+            volume_args['imageRef'] = None
+            volume_args.update(source)
+    return volume_args
+
+
+def _present_volume(module, cinder, cloud):
+    v = volumes.find(cinder, module.params['display_name'])
+    if v:
+        module.exit_json(changed=False, id=v.id, info=v._info)
+    try:
+        volume_args = _volume_args(
+            module, cloud, volumes.spec(module.params))
+    except images.ImageNotFound as e:
+        module.fail_json(msg=str(e))
+    except Exception as e:
+        module.fail_json(msg='Error creating volume:%s' % str(e))
+    started = time.time()
     try:
         vol = cinder.volumes.create(**volume_args)
     except Exception as e:
         module.fail_json(msg='Error creating volume:%s' % str(e))
 
     if module.params['wait']:
-        expires = module.params['timeout'] + time.time()
-        while time.time() < expires:
-            volume = cinder.volumes.get(vol.id)
-            if volume.status == 'available':
-                break
-            if volume.status == 'error':
-                module.fail_json(msg='Error creating volume')
-            time.sleep(5)
+        done, errors = _wait_for_volumes(
+            module, cloud, cinder, {vol.id: volume_args}, started)
+        if vol.id in errors and errors[vol.id] != 'timed out':
+            module.fail_json(msg='Error creating volume')
+        vol = done.get(vol.id) or vol
     module.exit_json(changed=True, id=vol.id, info=vol._info)
 
 
+def _predictor(cloud, volume_args):
+    if volume_args['imageRef']:
+        source = 'image'
+    elif volume_args['snapshot_id']:
+        source = 'snapshot'
+    elif volume_args.get('source_volid'):
+        source = 'clone'
+    else:
+        source = 'blank'
+    return readiness.Predictor((
+        store.scope(cloud), 'volume',
+        volume_args['volume_type'] or 'default', source,
+        readiness.size_bucket(volume_args['size'])))
+
+
+def _wait_for_volumes(module, cloud, cinder, created, started):
+    """Wait for new volumes, polling around when they should be ready.
+
+    :param created: The arguments each volume was created with, by ID.
+    :param started: When the volumes were asked for.
+    :returns: A (done, errors) pair of dicts keyed by volume ID.
+    """
+    predictors = dict((volume_id, _predictor(cloud, volume_args))
+                      for volume_id, volume_args in created.items())
+    schedules = [p.schedule() for p in predictors.values()]
+    ready = batch.status_check(('available',), ('error',))
+
+    def check(volume):
+        outcome = ready(volume)
+        if outcome is True:
+            predictors[volume.id].record_ready(volume, time.time() - started)
+        return outcome
+
+    def list_volumes():
+        if len(created) == 1:
+            return [cinder.volumes.get(volume_id) for volume_id in created]
+        return cinder.volumes.list()
+
+    return batch.poll(
+        list_volumes, created, check, module.params['timeout'],
+        interval=lambda elapsed: min(s(elapsed) for s in schedules))
+
+
+def _present_volumes(module, cinder, cloud):
+    started = time.time()
+    (results, created) = volumes.ensure(
+        cinder,
+        [volumes.spec(module.params, volume)
+         for volume in module.params['volumes']],
+        lambda params: _volume_args(module, cloud, params),
+        module.params['batch_workers'])
+
+    if created and module.params['wait']:
+        done, errors = _wait_for_volumes(
+            module, cloud, cinder,
+            dict((volume_id, volume_args)
+                 for volume_id, (_, volume_args) in created.items()),
+            started)
+        for volume_id, error in errors.items():
+            results[created[volume_id][0]] = dict(
+                failed=True, id=volume_id,
+                msg='Error creating volume:%s' % error)
+        for volume_id, v in done.items():
+            results[created[volume_id][0]]['info'] = v._info
+
+    failed = sorted(
+        name for name, result in results.items() if result.get('failed'))
+    if failed and len(failed) == len(results):
+        module.fail_json(msg='All volumes failed', volumes=results)
+    module.exit_json(
+        changed=bool(created), volumes=results, failed_volumes=failed)
+
+
 def _wait_for_delete(cinder, vol_id, timeout):
+    from cinderclient import exceptions as cinder_exc
+
     expires = timeout + time.time()
     while time.time() < expires:
         try:
@@ -142,24 +307,95 @@ def _wait_for_delete(cinder, vol_id, timeout):
 
 def _absent_volume(module, cinder, cloud):
 
-    volume_id = cloud.get_volume_id(module.params['display_name'])
-    if not volume_id:
+    volume = volumes.find(cinder, module.params['display_name'])
+    if not volume:
         module.exit_json(changed=False, result="Volume not Found")
+    volume_id = volume.id
     try:
-        cinder.volumes.delete(v.id)
-    except cinder_exc, e:
+        cinder.volumes.delete(volume_id)
+    except Exception as e:
         module.fail_json(msg='Cannot delete volume:%s' % str(e))
     if module.params['wait']:
-        if not _wait_for_delete(cinder, v.id, module.params['timeout']):
+        if not _wait_for_delete(cinder, volume_id, module.params['timeout']):
             module.exit_json(changed=False, result="Volume deletion timed-out")
     module.exit_json(changed=True, result='Volume Deleted')
 
 
+def _select(module, listed):
+    names = None
+    if module.params['volumes']:
+        names = set(v['display_name'] for v in module.params['volumes'])
+    return volumes.select(
+        listed, names, module.params['name_prefix'],
+        module.params['metadata'])
+
+
+def _missing(module, listed):
+    return volumes.missing(
+        [v['display_name'] for v in module.params['volumes'] or []], listed)
+
+
+def _absent_volumes(module, cinder, cloud):
+    listed = cinder.volumes.list()
+    results = volumes.delete(
+        cinder, cloud.nova_client, _select(module, listed),
+        module.params['timeout'], detach=module.params['detach'],
+        wait=module.params['wait'], workers=module.params['batch_workers'])
+
+    failed = sorted(
+        volume_id for volume_id, result in results.items()
+        if result.get('failed'))
+    if failed and len(failed) == len(results):
+        module.fail_json(msg='All volumes failed', volumes=results)
+    module.exit_json(
+        changed=len(failed) < len(results), volumes=results,
+        failed_volumes=failed, missing_volumes=_missing(module, listed))
+
+
+def _check_volumes(module, cloud):
+    resources = snapshot.Snapshot(cloud)
+    plan = {}
+    for volume in module.params['volumes']:
+        found = resources.find(
+            'volumes', display_name=volume['display_name'])
+        plan[volume['display_name']] = (
+            'present' if found else 'would create')
+    changed = any(result.startswith('would') for result in plan.values())
+    module.exit_json(changed=changed, volumes=plan)
+
+
+def _check_absent_volumes(module, cloud):
+    listed = snapshot.Snapshot(cloud).list('volumes')
+    plan = dict((volume['id'], 'would delete')
+                for volume in _select(module, listed))
+    module.exit_json(changed=bool(plan), volumes=plan,
+                     missing_volumes=_missing(module, listed))
+
+
+def _check_volume(module, cloud):
+    volume = snapshot.Snapshot(cloud).find(
+        'volumes', display_name=module.params['display_name'])
+    if module.params['state'] == 'present':
+        if volume:
+            module.exit_json(changed=False, id=volume['id'])
+        module.exit_json(changed=True, result='would create')
+    if volume:
+        module.exit_json(changed=True, result='would delete')
+    module.exit_json(changed=False, result="Volume not Found")
+
+
 def main():
     argument_spec = spec.openstack_argument_spec(
-        size=dict(required=True),
+        size=dict(default=None),
         volume_type=dict(default=None),
-        display_name=dict(required=True),
+        display_name=dict(default=None),
+        volumes=dict(default=None, type='list'),
+        batch_workers=dict(default=10, type='int'),
+        name_prefix=dict(default=None),
+        metadata=dict(default=None, type='dict'),
+        detach=dict(default=False, type='bool'),
+        clone_cache=dict(default='none',
+                         choices=['none', 'volume', 'snapshot']),
         display_description=dict(default=None),
         image_id=dict(default=None),
         image_name=dict(default=None),
@@ -169,14 +405,44 @@ def main():
         mutually_exclusive=[
             ['image_id', 'snapshot_id'],
             ['image_name', 'snapshot_id'],
-            ['image_id', 'image_name']
+            ['image_id', 'image_name'],
+            ['display_name', 'volumes'],
+            ['display_name', 'name_prefix'],
+            ['display_name', 'metadata'],
+        ],
+        required_one_of=[
+            ['display_name', 'volumes', 'name_prefix', 'metadata'],
         ],
     )
-    module = AnsibleModule(argument_spec=argument_spec, **module_kwargs)
+    module = AnsibleModule(
+        argument_spec=argument_spec, supports_check_mode=True,
+        **module_kwargs)
+
+    bulk_absent = (module.params['state'] == 'absent' and (
+        module.params['volumes'] or module.params['name_prefix'] or
+        module.params['metadata']))
+    if ((module.params['name_prefix'] or module.params['metadata']) and
+            not bulk_absent):
+        module.fail_json(msg="Parameters 'name_prefix' and 'metadata' are"
+                             " only supported if state == 'absent'")
+    if (module.params['display_name'] and not module.params['size'] and
+            module.params['state'] == 'present'):
+        module.fail_json(msg="Parameter 'size' is required"
+                             " if state == 'present'")
 
     try:
-        cloud = shade.openstack_cloud(**module.params)
+        cloud = spec.openstack_cloud(module)
+        if module.check_mode:
+            if bulk_absent:
+                _check_absent_volumes(module, cloud)
+            if module.params['volumes']:
+                _check_volumes(module, cloud)
+            _check_volume(module, cloud)
         cinder = cloud.cinder_client
+        if bulk_absent:
+            _absent_volumes(module, cinder, cloud)
+        if module.params['volumes']:
+            _present_volumes(module, cinder, cloud)
         if module.params['state'] == 'present':
             _present_volume(module, cinder, cloud)
         if module.params['state'] == 'absent':
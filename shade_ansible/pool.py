@@ -0,0 +1,178 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""A warm pool of standby servers that can be claimed instead of booted.
+
+Standby servers are ordinary servers carrying pool, image and flavor keys
+in their metadata.  Claiming one renames it, drops those keys and applies
+the metadata the task asked for, which takes a couple of API calls rather
+than a full boot.  Forks claiming from the same pool at once take turns
+through a Store, so each standby server goes to a single task.
+
+Topping the pool up only issues the boots and returns; the new servers
+become claimable once they reach ACTIVE.
+"""
+
+import time
+import uuid
+
+from shade_ansible import batch
+from shade_ansible import store
+
+POOL_KEY = 'shade_ansible_pool'
+IMAGE_KEY = 'shade_ansible_image'
+FLAVOR_KEY = 'shade_ansible_flavor'
+
+# How long a claimed server is kept off-limits to other forks; by then
+# its rename has long shown up in the listings.
+CLAIM_TTL = 600
+
+
+def _get(resource, attr):
+    if isinstance(resource, dict):
+        return resource.get(attr)
+    return getattr(resource, attr)
+
+
+def _ref_id(ref):
+    # Servers refer to their image and flavor as {'id': ..., 'links': ...}
+    if isinstance(ref, dict):
+        return ref.get('id')
+    return ref
+
+
+def standby_meta(pool, image_id, flavor_id):
+    """Metadata marking a server as a standby member of pool."""
+    return {POOL_KEY: pool, IMAGE_KEY: str(image_id),
+            FLAVOR_KEY: str(flavor_id)}
+
+
+def standby_servers(servers, pool, image_id, flavor_id, ready=True):
+    """The servers of a listing standing by in pool for image and flavor.
+
+    With ready, only ACTIVE servers are returned; otherwise servers still
+    building count as well.
+    """
+    wanted = standby_meta(pool, image_id, flavor_id)
+    found = []
+    for server in servers:
+        metadata = _get(server, 'metadata') or {}
+        if any(metadata.get(k) != v for k, v in wanted.items()):
+            continue
+        status = _get(server, 'status')
+        if status == 'ACTIVE' or (not ready and status == 'BUILD'):
+            found.append(server)
+    return found
+
+
+def _restore(nova, server, name, pool, image_id, flavor_id, meta):
+    """Put a server whose claim failed half way back into the pool."""
+    if meta:
+        nova.servers.delete_meta(server, list(meta))
+    nova.servers.set_meta(server, standby_meta(pool, image_id, flavor_id))
+    nova.servers.update(server, name=name)
+
+
+def claim(nova, servers, pool, image_id, flavor_id, names, meta=None,
+          workers=batch.DEFAULT_WORKERS, shared=None):
+    """Turn standby servers into the servers called names.
+
+    A claim failing half way is rolled back, and the server goes back to
+    the pool for other tasks to claim.  If even that fails, the server
+    stays off-limits until CLAIM_TTL runs out.
+
+    :param servers: A current listing of the project's servers.
+    :returns: A (claimed, errors) pair of dicts, the first holding the
+              renamed server each claimed name got and the second why
+              each failed claim failed.  Names in neither have to be
+              booted, and so do the names of failed claims.
+    """
+    shared = shared or store.Store('pool')
+    with shared.transaction() as claimed:
+        now = time.time()
+        for server_id, stamp in list(claimed.items()):
+            if now - stamp > CLAIM_TTL:
+                del claimed[server_id]
+        candidates = [
+            server for server in standby_servers(
+                servers, pool, image_id, flavor_id)
+            if _get(server, 'id') not in claimed]
+        pairs = list(zip(names, candidates))
+        for name, server in pairs:
+            claimed[_get(server, 'id')] = now
+
+    released = []
+
+    def take(pair):
+        (name, server) = pair
+        standby_name = _get(server, 'name')
+        try:
+            nova.servers.update(server, name=name)
+            nova.servers.delete_meta(
+                server, [POOL_KEY, IMAGE_KEY, FLAVOR_KEY])
+            if meta:
+                nova.servers.set_meta(server, meta)
+            return nova.servers.get(_get(server, 'id'))
+        except Exception as e:
+            msg = "Cannot claim standby server %s: %s" % (
+                _get(server, 'id'), e)
+            try:
+                _restore(nova, server, standby_name, pool, image_id,
+                         flavor_id, meta)
+            except Exception as restore_error:
+                raise Exception("%s; putting it back failed too: %s" % (
+                    msg, restore_error))
+            released.append(_get(server, 'id'))
+            raise Exception(msg)
+
+    results = batch.run_parallel(take, pairs, workers)
+    if released:
+        with shared.transaction() as claimed:
+            for server_id in released:
+                claimed.pop(server_id, None)
+    return (dict((name, server)
+                 for (name, _), server, error in results if not error),
+            dict((name, str(error))
+                 for (name, _), _, error in results if error))
+
+
+def top_up(nova, servers, pool, size, image_id, flavor_id, bootkwargs,
+           exclude=(), workers=batch.DEFAULT_WORKERS):
+    """Boot enough standby servers for pool to hold size of them.
+
+    Servers still building count towards size.  The boots are not waited
+    for.
+
+    :param exclude: IDs of servers the listing shows standing by that no
+                    longer are, such as those claim() just took; nova
+                    does not change servers already listed.
+    :returns: The IDs of the servers booted.
+    """
+    exclude = set(exclude)
+    missing = size - len([
+        server for server in standby_servers(
+            servers, pool, image_id, flavor_id, ready=False)
+        if _get(server, 'id') not in exclude])
+    if missing <= 0:
+        return []
+    bootkwargs = dict(bootkwargs)
+    bootkwargs['meta'] = standby_meta(pool, image_id, flavor_id)
+    names = ['%s-standby-%s' % (pool, uuid.uuid4().hex[:8])
+             for i in range(missing)]
+
+    def boot(name):
+        return nova.servers.create(name, image_id, flavor_id, **bootkwargs)
+
+    return [server.id
+            for name, server, error in batch.run_parallel(
+                boot, names, workers)
+            if not error]
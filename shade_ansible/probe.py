@@ -0,0 +1,110 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Wait for a TCP port to accept connections on many hosts at once.
+
+An ACTIVE server is not yet a reachable one: sshd comes up a while after
+nova is done.  Rather than a wait_for task per host, every host is probed
+from one loop with non-blocking connects multiplexed through select, and
+a host that refuses or drops a connection is tried again after a delay
+that doubles up to a ceiling.
+"""
+
+import errno
+import select
+import socket
+import time
+
+IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY)
+
+
+def _connect(host, port):
+    """Start a non-blocking connect, returning the socket and its errno."""
+    (family, socktype, proto, _, address) = socket.getaddrinfo(
+        host, port, 0, socket.SOCK_STREAM)[0]
+    sock = socket.socket(family, socktype, proto)
+    sock.setblocking(0)
+    return (sock, sock.connect_ex(address))
+
+
+def wait_for_ports(hosts, port, timeout, delay=1.0, max_delay=10.0,
+                   connect_timeout=5.0):
+    """Wait until port accepts connections on every host.
+
+    :param hosts: A dict of the addresses to probe, by any key.
+    :returns: A (ready, errors) pair, the keys of the hosts that accepted
+              a connection and a dict of why each other host did not.
+    """
+    expires = time.time() + timeout
+    pending = dict(hosts)
+    retry_at = dict((key, 0) for key in hosts)
+    attempts = dict((key, 0) for key in hosts)
+    errors = {}
+    ready = []
+    in_flight = {}
+
+    def failed(key, reason):
+        errors[key] = reason
+        attempts[key] += 1
+        retry_at[key] = time.time() + min(
+            delay * 2 ** (attempts[key] - 1), max_delay)
+
+    def done(key):
+        del pending[key]
+        errors.pop(key, None)
+        ready.append(key)
+
+    while pending:
+        now = time.time()
+        if now >= expires:
+            break
+        for key, host in list(pending.items()):
+            if key in in_flight.values() or retry_at[key] > now:
+                continue
+            try:
+                (sock, error) = _connect(host, port)
+            except (socket.error, socket.gaierror) as e:
+                failed(key, str(e))
+                continue
+            if error == 0:
+                sock.close()
+                done(key)
+            elif error in IN_PROGRESS:
+                in_flight[sock] = key
+                retry_at[key] = now + connect_timeout
+            else:
+                sock.close()
+                failed(key, errno.errorcode.get(error, str(error)))
+
+        wake = min([expires] + [retry_at[key] for key in pending])
+        wait = max(min(wake - time.time(), 0.5), 0)
+        (_, writable, _) = select.select([], list(in_flight), [], wait)
+        for sock in writable:
+            key = in_flight.pop(sock)
+            error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            sock.close()
+            if error == 0:
+                done(key)
+            else:
+                failed(key, errno.errorcode.get(error, str(error)))
+        now = time.time()
+        for sock, key in list(in_flight.items()):
+            if retry_at[key] <= now:
+                del in_flight[sock]
+                sock.close()
+                failed(key, 'connect timed out')
+
+    for sock in in_flight:
+        sock.close()
+    for key in pending:
+        errors[key] = 'timed out (%s)' % errors.get(key, 'no answer')
+    return (ready, errors)
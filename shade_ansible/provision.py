@@ -0,0 +1,290 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Boot a server and get what it needs ready while it builds.
+
+Floating IPs, ports and volumes do not depend on the server, only
+attaching them does.  So once the boot request is in, they are allocated
+and created next to the wait for ACTIVE, and attached together as soon
+as the server is up.  Getting a server with all its parts ready takes
+about as long as the slowest of them rather than their sum.
+
+Volumes can also be handed to nova in the boot request as a block device
+mapping, so the server comes up with them already attached.
+"""
+
+from shade_ansible import batch
+
+SERVER = 'server'
+FLOATING_IP = 'floating_ip'
+VOLUME = 'volume'
+PORT = 'port'
+
+
+class ProvisionError(Exception):
+    pass
+
+
+def _wait(get, resource_id, check, timeout, interval):
+    done, errors = batch.poll(
+        lambda: [get()], [resource_id], check, timeout, interval)
+    if errors:
+        raise ProvisionError(errors[resource_id])
+    return done[resource_id]
+
+
+def allocate_floating_ip(nova, pools):
+    """A new floating IP from the first of pools that has one to give.
+
+    An IP is allocated for every server rather than picking one that is
+    lying around unattached, which another task could pick as well.
+    """
+    errors = []
+    for pool in pools:
+        try:
+            return nova.floating_ips.create(pool)
+        except Exception as e:
+            errors.append('%s: %s' % (pool, e))
+    raise ProvisionError(
+        'no floating IP from any pool (%s)' % '; '.join(errors))
+
+
+def ensure_volume(cinder, spec, timeout, interval, created=None):
+    """The available volume called spec['display_name'], creating it
+    from spec's size and image when it does not exist yet.
+
+    :param created: A list the volume is added to if it gets created.
+    """
+    found = cinder.volumes.list(
+        search_opts={'display_name': spec['display_name']})
+    if found:
+        volume = found[0]
+    else:
+        volume = cinder.volumes.create(
+            spec['size'], display_name=spec['display_name'],
+            imageRef=spec.get('image'))
+        if created is not None:
+            created.append((VOLUME, volume))
+    return _wait(
+        lambda: cinder.volumes.get(volume.id), volume.id,
+        batch.status_check(('available', 'in-use'), ('error',)),
+        timeout, interval)
+
+
+def create_port(neutron, network_id):
+    return neutron.create_port(
+        {'port': {'network_id': network_id}})['port']
+
+
+def _clean_up(nova, cinder, neutron, server_id, created, timeout, interval,
+              workers):
+    """Delete what provision created for a server it could not finish.
+
+    :returns: Why each resource that is left behind could not be deleted.
+    """
+    def delete(job):
+        (kind, resource) = job
+        if kind == FLOATING_IP:
+            nova.floating_ips.delete(resource)
+        elif kind == PORT:
+            neutron.delete_port(resource['id'])
+        else:
+            try:
+                nova.volumes.delete_server_volume(server_id, resource.id)
+            except Exception:
+                # Most likely it never got attached
+                pass
+            _wait(lambda: cinder.volumes.get(resource.id), resource.id,
+                  batch.status_check(('available', 'error')), timeout,
+                  interval)
+            cinder.volumes.delete(resource.id)
+
+    def label(resource):
+        if isinstance(resource, dict):
+            return resource['id']
+        return getattr(resource, 'ip', None) or resource.id
+
+    return ['deleting %s %s: %s' % (kind, label(resource), error)
+            for (kind, resource), _, error in batch.run_parallel(
+                delete, created, workers)
+            if error]
+
+
+def block_device_mapping(cinder, volumes, workers=batch.DEFAULT_WORKERS):
+    """Turn volume specs into a block_device_mapping_v2 for a boot.
+
+    Volumes that exist are looked up by display_name, concurrently, and
+    mapped as they are; the others are created by nova at boot, blank or
+    from spec's image.  nova does not name the volumes it creates, so their
+    names are returned, to be given with name_volumes once the server is up.
+
+    :returns: A (mapping, names) pair, names listing the display_name of
+              each new volume in the order it was mapped.
+    """
+    def lookup(spec):
+        return cinder.volumes.list(
+            search_opts={'display_name': spec['display_name']})
+
+    mapping = []
+    names = []
+    for (spec, found) in _run_specs(lookup, volumes, workers):
+        entry = dict(
+            boot_index=-1, destination_type='volume',
+            delete_on_termination=spec.get('delete_on_termination', False))
+        if spec.get('device'):
+            entry['device_name'] = spec['device']
+        if found:
+            entry.update(source_type='volume', uuid=found[0].id)
+        elif not spec.get('size') or not spec.get('device'):
+            raise ProvisionError(
+                "volume %s does not exist, and needs a size and a device"
+                " to be created at boot" % spec['display_name'])
+        else:
+            entry['volume_size'] = spec['size']
+            if spec.get('image'):
+                entry.update(source_type='image', uuid=spec['image'])
+            else:
+                entry['source_type'] = 'blank'
+            names.append(spec['display_name'])
+        mapping.append(entry)
+    return (mapping, names)
+
+
+def _device_order(attachment):
+    # /dev/vdz comes before /dev/vdaa
+    return (len(attachment.device), attachment.device)
+
+
+def name_volumes(nova, cinder, server_id, mapping, names,
+                 workers=batch.DEFAULT_WORKERS):
+    """Give the volumes nova created at boot their display_names.
+
+    The new volumes are those attached that the mapping did not name by
+    ID.  Hypervisors do not honour the devices asked for, but hand them
+    out in the order of the mapping, so the new volumes are named in the
+    order of their devices.
+
+    :param mapping: The mapping and names block_device_mapping returned.
+    """
+    existing = set(entry['uuid'] for entry in mapping
+                   if entry['source_type'] == 'volume')
+    attachments = sorted(
+        (a for a in nova.volumes.get_server_volumes(server_id)
+         if a.volumeId not in existing), key=_device_order)
+    _run_specs(
+        lambda pair: cinder.volumes.update(
+            pair[0].volumeId, display_name=pair[1]),
+        list(zip(attachments, names)), workers)
+
+
+def _run_specs(func, specs, workers):
+    results = batch.run_parallel(func, specs, workers)
+    errors = ['%s: %s' % (spec, error) for spec, _, error in results if error]
+    if errors:
+        raise ProvisionError('; '.join(errors))
+    return [(spec, result) for spec, result, _ in results]
+
+
+def _run(func, jobs, workers):
+    results = batch.run_parallel(func, jobs, workers)
+    errors = ['%s %s: %s' % (kind, arg, error)
+              for (kind, arg), _, error in results if error]
+    if errors:
+        raise ProvisionError('; '.join(errors))
+    return [(job, result) for job, result, _ in results]
+
+
+def provision(nova, cinder, neutron, server, ip_pools=(), floating_ips=(),
+              volumes=(), networks=(), timeout=180, interval=2,
+              workers=batch.DEFAULT_WORKERS):
+    """Wait for a freshly booted server while preparing its resources.
+
+    If anything fails, the floating IP, volumes and ports created so far
+    are deleted again, while volumes that existed before are left alone.
+
+    :param ip_pools: Pools to allocate a floating IP from, the first one
+                     that has one to give.
+    :param floating_ips: Existing floating IPs to attach.
+    :param volumes: Specs of the volumes to attach, each a dict with a
+                    display_name and, for volumes to create, a size and
+                    optionally an image ID.  A device may be given too.
+    :param networks: IDs of networks to plug an extra port into.
+    :returns: The server once it is ACTIVE and everything is attached.
+    :raises: ProvisionError naming every step that failed.
+    """
+    created = []
+    try:
+        return _provision(
+            nova, cinder, neutron, server, ip_pools, floating_ips, volumes,
+            networks, timeout, interval, workers, created)
+    except ProvisionError as e:
+        errors = _clean_up(nova, cinder, neutron, server.id, created,
+                           timeout, interval, workers)
+        if errors:
+            raise ProvisionError('%s; %s' % (e, '; '.join(errors)))
+        raise
+
+
+def _provision(nova, cinder, neutron, server, ip_pools, floating_ips,
+               volumes, networks, timeout, interval, workers, created):
+    def prepare(job):
+        (kind, arg) = job
+        if kind == SERVER:
+            return _wait(
+                lambda: nova.servers.get(server.id), server.id,
+                batch.status_check(('ACTIVE',)), timeout, interval)
+        if kind == FLOATING_IP:
+            ip = allocate_floating_ip(nova, arg)
+            created.append((FLOATING_IP, ip))
+            return ip.ip
+        if kind == VOLUME:
+            return ensure_volume(cinder, arg, timeout, interval, created)
+        port = create_port(neutron, arg)
+        created.append((PORT, port))
+        return port
+
+    jobs = ([(SERVER, None)] +
+            [(FLOATING_IP, list(ip_pools))] * bool(ip_pools) +
+            [(VOLUME, spec) for spec in volumes] +
+            [(PORT, network) for network in networks])
+    prepared = _run(prepare, jobs, workers)
+
+    active = prepared.pop(0)[1]
+    attachments = [(FLOATING_IP, ip) for ip in floating_ips]
+    for (kind, arg), resource in prepared:
+        if kind == VOLUME:
+            resource = (resource, arg.get('device'))
+        attachments.append((kind, resource))
+
+    def attach(job):
+        (kind, resource) = job
+        if kind == FLOATING_IP:
+            nova.servers.add_floating_ip(active, resource)
+        elif kind == VOLUME:
+            (volume, device) = resource
+            nova.volumes.create_server_volume(active.id, volume.id, device)
+        else:
+            nova.servers.interface_attach(active, resource['id'], None, None)
+
+    _run(attach, attachments, workers)
+
+    attached = [resource[0].id for kind, resource in attachments
+                if kind == VOLUME]
+    if attached:
+        done, errors = batch.poll(
+            cinder.volumes.list, attached,
+            batch.status_check(('in-use',), ('error',)), timeout, interval)
+        if errors:
+            raise ProvisionError('; '.join(
+                'attaching volume %s: %s' % item
+                for item in sorted(errors.items())))
+    return nova.servers.get(active.id)
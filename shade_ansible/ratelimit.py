@@ -0,0 +1,122 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Controller-wide API rate governor.
+
+With a high fork count every task talks to the same cloud at once, and
+bursts past the provider's limits come back as 413/429 responses.  A token
+bucket per cloud and service, kept in a shared store, lets all forks pace
+themselves to just under the limit instead.
+
+Limits are given as requests per second, either as one number for every
+service or as a dict keyed by service type::
+
+    rate_limit:
+      compute: 5
+      volume:
+        rate: 2
+        burst: 6
+      default: 10
+
+``burst`` defaults to one second worth of requests.
+"""
+
+import time
+
+from shade_ansible import store
+
+
+def parse_limits(value):
+    """Normalise a rate_limit setting to {service: (rate, burst)}."""
+    if not value:
+        return {}
+    if not isinstance(value, dict):
+        value = dict(default=value)
+    limits = {}
+    for service, limit in value.items():
+        if isinstance(limit, dict):
+            rate = float(limit['rate'])
+            burst = float(limit.get('burst', rate))
+        else:
+            rate = burst = float(limit)
+        if rate <= 0:
+            raise ValueError(
+                "rate_limit for %s must be positive, got %s" % (service, rate))
+        limits[service] = (rate, max(burst, 1.0))
+    return limits
+
+
+class TokenBucket(object):
+    """A token bucket whose level lives in a Store.
+
+    Taking a token never fails: the bucket is allowed to go into debt and
+    the caller sleeps until its reservation falls due.  Since the debt is
+    recorded under the lock, concurrent callers queue up behind each other
+    in arrival order rather than all retrying at once.
+    """
+
+    def __init__(self, shared, key, rate, burst):
+        self.store = shared
+        self.key = key
+        self.rate = rate
+        self.burst = burst
+
+    def reserve(self, tokens=1):
+        """Take tokens and return how many seconds to wait before use."""
+        with self.store.transaction() as data:
+            now = time.time()
+            level, stamp = data.get(self.key, (self.burst, now))
+            level = min(self.burst, level + (now - stamp) * self.rate)
+            level -= tokens
+            data[self.key] = (level, now)
+        if level >= 0:
+            return 0.0
+        return -level / self.rate
+
+    def acquire(self, tokens=1):
+        delay = self.reserve(tokens)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+class Governor(object):
+    """Pace API calls per service for one cloud.
+
+    Instances are suitable as a wrapper for clients.wrap_cloud.
+    """
+
+    def __init__(self, limits, scope, shared=None):
+        self.limits = parse_limits(limits)
+        self.scope = scope
+        self.store = shared or store.Store('ratelimit')
+        self.waited = 0.0
+        self._buckets = {}
+
+    def bucket(self, service):
+        if service not in self._buckets:
+            limit = self.limits.get(service, self.limits.get('default'))
+            if limit is None:
+                self._buckets[service] = None
+            else:
+                self._buckets[service] = TokenBucket(
+                    self.store, '%s:%s' % (self.scope, service), *limit)
+        return self._buckets[service]
+
+    def acquire(self, service):
+        bucket = self.bucket(service)
+        if bucket is not None:
+            self.waited += bucket.acquire()
+
+    def __call__(self, service, name, func, args, kwargs):
+        self.acquire(service)
+        return func(*args, **kwargs)
@@ -0,0 +1,124 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Poll for new resources around when they are expected to be ready.
+
+How long a volume or an image takes to become usable depends mostly on
+the cloud, the volume type or image format, and the size.  Every
+observed duration is recorded in a shared store, under a key made of
+those with the size rounded up to a power of two, as a moving average.
+Waits then sleep until shortly before the expected time and poll
+briskly around it, backing off if the resource runs late.  Without any
+history, polls start at a second and back off to the old fixed five.
+"""
+
+import calendar
+import math
+import re
+import time
+
+from shade_ansible import store
+
+# Weight of the newest observation in the moving average
+ALPHA = 0.3
+MIN_INTERVAL = 1.0
+DEFAULT_INTERVAL = 5.0
+# Share of the expected duration to sleep before the first poll
+LEAD = 0.8
+
+
+_TIMESTAMP = re.compile(r'^(\d{4}-\d\d-\d\d)[T ](\d\d:\d\d:\d\d)')
+
+
+def _timestamp(value):
+    match = _TIMESTAMP.match(value or '')
+    if not match:
+        return None
+    return calendar.timegm(
+        time.strptime('%s %s' % match.groups(), '%Y-%m-%d %H:%M:%S'))
+
+
+def ready_after(resource):
+    """Seconds between the creation of resource and its last update.
+
+    For a resource that just became ready this is how long it took, as
+    the cloud saw it, rather than how long a wait happened to take.
+
+    :returns: The duration, or None if resource lacks either timestamp.
+    """
+    created = _timestamp(getattr(resource, 'created_at', None))
+    updated = _timestamp(getattr(resource, 'updated_at', None))
+    if created is None or updated is None or updated < created:
+        return None
+    return updated - created
+
+
+def size_bucket(size):
+    """Round size up to a power of two, so similar sizes share history."""
+    if not size:
+        return 'unknown'
+    return str(2 ** int(math.ceil(math.log(max(float(size), 1), 2))))
+
+
+class Predictor(object):
+    """Expected durations for one kind of resource on one cloud.
+
+    :param key: A tuple such as (store.scope(cloud), 'volume',
+                volume_type, size_bucket(size)).
+    """
+
+    def __init__(self, key, shared=None):
+        self.key = ':'.join(str(part) for part in key)
+        self.shared = shared or store.Store('readiness')
+
+    def expected(self):
+        """The expected duration in seconds, or None without history."""
+        with self.shared.transaction() as stats:
+            entry = stats.get(self.key)
+        return entry and entry['mean']
+
+    def record(self, duration):
+        with self.shared.transaction() as stats:
+            entry = stats.get(self.key)
+            if entry is None:
+                entry = dict(count=0, mean=duration)
+            entry['mean'] += ALPHA * (duration - entry['mean'])
+            entry['count'] += 1
+            stats[self.key] = entry
+
+    def record_ready(self, resource, waited):
+        """Record how long resource took to become ready.
+
+        :param waited: Seconds the wait for resource took, recorded
+                       instead when resource has no timestamps to go by.
+        """
+        duration = ready_after(resource)
+        self.record(waited if duration is None else duration)
+
+    def schedule(self, max_interval=DEFAULT_INTERVAL * 6):
+        """Return an interval callable for batch.poll.
+
+        It is given the time elapsed since the wait started and returns
+        how long to sleep before the next poll.
+        """
+        expected = self.expected()
+
+        def interval(elapsed):
+            if expected is None:
+                # Double from a second up to the old fixed cadence
+                return min(max(elapsed, MIN_INTERVAL), DEFAULT_INTERVAL)
+            if elapsed < expected * LEAD:
+                return expected * LEAD - elapsed
+            late = elapsed - expected * LEAD
+            step = max(expected * 0.05, MIN_INTERVAL)
+            return min(step + late / 2, max(max_interval, step))
+        return interval
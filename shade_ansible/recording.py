@@ -0,0 +1,222 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Record and replay the HTTP conversation of a module run.
+
+Every python-*client shade uses, and keystone auth itself, sends its
+requests through requests.Session.send, so patching that one method is
+enough to capture a whole module run into a JSON fixture, or to answer it
+from one without a cloud.
+
+Modules pick this up from the environment::
+
+    SHADE_ANSIBLE_RECORD=os_compute.json   record to a fixture
+    SHADE_ANSIBLE_REPLAY=os_compute.json   replay a fixture
+    SHADE_ANSIBLE_REPLAY_LATENCY=0.2       replay latency: 'recorded'
+                                           (default), 'none' or seconds
+    SHADE_ANSIBLE_STATS=stats.json         write call count and timings
+
+Fixtures hold whatever the cloud sent back, auth tokens included, so treat
+recordings of real clouds accordingly.
+"""
+
+import atexit
+import base64
+import collections
+import datetime
+import io
+import json
+import os
+import time
+
+RECORDED = 'recorded'
+
+
+class ReplayError(Exception):
+    """A request was made that the fixture has no answer for."""
+
+
+def _encode_body(content):
+    try:
+        return dict(body=content.decode('utf-8'))
+    except UnicodeDecodeError:
+        return dict(body_b64=base64.b64encode(content).decode('ascii'))
+
+
+def _decode_body(interaction):
+    if 'body_b64' in interaction:
+        return base64.b64decode(interaction['body_b64'])
+    return interaction.get('body', '').encode('utf-8')
+
+
+class _SessionPatch(object):
+    """Common plumbing for swapping out requests.Session.send."""
+
+    def __init__(self):
+        self.calls = []
+        self.started = None
+        self._original = None
+
+    def install(self):
+        import requests
+        self._original = requests.Session.send
+        patch = self
+
+        def send(session, request, **kwargs):
+            return patch.send(session, request, **kwargs)
+        requests.Session.send = send
+        self.started = time.time()
+        return self
+
+    def uninstall(self):
+        if self._original is not None:
+            import requests
+            requests.Session.send = self._original
+            self._original = None
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *exc_info):
+        self.uninstall()
+
+    def stats(self):
+        """Call count and timings of the requests seen so far."""
+        return dict(
+            calls=len(self.calls),
+            api_time=sum(elapsed for (method, url, elapsed) in self.calls),
+            wall_time=time.time() - (self.started or time.time()),
+            requests=['%s %s' % (method, url)
+                      for (method, url, elapsed) in self.calls],
+        )
+
+
+class Recorder(_SessionPatch):
+    """Capture every request and response into a fixture file."""
+
+    def __init__(self, path):
+        super(Recorder, self).__init__()
+        self.path = path
+        self.interactions = []
+
+    def send(self, session, request, **kwargs):
+        start = time.time()
+        response = self._original(session, request, **kwargs)
+        elapsed = time.time() - start
+        interaction = dict(
+            method=request.method,
+            url=request.url,
+            status=response.status_code,
+            headers=dict(response.headers),
+            elapsed=elapsed,
+        )
+        interaction.update(_encode_body(response.content))
+        self.interactions.append(interaction)
+        self.calls.append((request.method, request.url, elapsed))
+        return response
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump(self.interactions, f, indent=2, sort_keys=True)
+
+    def uninstall(self):
+        super(Recorder, self).uninstall()
+        self.save()
+
+
+class Player(_SessionPatch):
+    """Answer requests from a fixture file instead of the network.
+
+    Requests are matched on method and URL, in the order they were
+    recorded.  Once the recorded answers for a request run out the last
+    one keeps being returned, so a status poll that takes a few more turns
+    than it did when recording still ends.
+
+    :param latency: 'recorded' to sleep as long as each call originally
+                    took, 'none' for no delay, or a fixed number of seconds
+                    per call.
+    """
+
+    def __init__(self, path, latency=RECORDED):
+        super(Player, self).__init__()
+        with open(path) as f:
+            interactions = json.load(f)
+        self.latency = latency
+        self._answers = collections.defaultdict(collections.deque)
+        for interaction in interactions:
+            key = (interaction['method'], interaction['url'])
+            self._answers[key].append(interaction)
+
+    def delay(self, interaction):
+        if self.latency in (None, RECORDED):
+            return interaction.get('elapsed', 0.0)
+        if self.latency == 'none':
+            return 0.0
+        return float(self.latency)
+
+    def send(self, session, request, **kwargs):
+        import requests
+        answers = self._answers.get((request.method, request.url))
+        if not answers:
+            raise ReplayError(
+                "No recorded response for %s %s" % (
+                    request.method, request.url))
+        if len(answers) > 1:
+            interaction = answers.popleft()
+        else:
+            interaction = answers[0]
+
+        elapsed = self.delay(interaction)
+        if elapsed:
+            time.sleep(elapsed)
+
+        content = _decode_body(interaction)
+        response = requests.Response()
+        response.status_code = interaction['status']
+        response.headers = requests.structures.CaseInsensitiveDict(
+            interaction['headers'])
+        response._content = content
+        response._content_consumed = True
+        response.raw = io.BytesIO(content)
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.elapsed = datetime.timedelta(seconds=elapsed)
+        self.calls.append((request.method, request.url, elapsed))
+        return response
+
+
+def _write_stats(patch, path):
+    with open(path, 'w') as f:
+        json.dump(patch.stats(), f, indent=2, sort_keys=True)
+
+
+def install_from_environ(environ=None):
+    """Start recording or replaying if the environment asks for it.
+
+    The recording is saved, and any stats written, when the process exits.
+    Returns the installed Recorder or Player, or None.
+    """
+    environ = os.environ if environ is None else environ
+    if environ.get('SHADE_ANSIBLE_REPLAY'):
+        patch = Player(
+            environ['SHADE_ANSIBLE_REPLAY'],
+            latency=environ.get('SHADE_ANSIBLE_REPLAY_LATENCY', RECORDED))
+    elif environ.get('SHADE_ANSIBLE_RECORD'):
+        patch = Recorder(environ['SHADE_ANSIBLE_RECORD'])
+    else:
+        return None
+    patch.install()
+    atexit.register(patch.uninstall)
+    if environ.get('SHADE_ANSIBLE_STATS'):
+        atexit.register(_write_stats, patch, environ['SHADE_ANSIBLE_STATS'])
+    return patch
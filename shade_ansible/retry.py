@@ -0,0 +1,152 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Retrying of API calls that fail for transient reasons.
+
+A single 503 or reset connection should not abort a long provisioning run.
+How eagerly a call is retried depends on what repeating it could do:
+
+* reads (get, list, find, ...) are retried on any transient error;
+* updates are idempotent and retried the same way;
+* deletes and removes are retried the same way too, and a 404 on a
+  retry after an error the call may have gone through counts as done;
+* anything else, creates in particular, is only retried when the error
+  shows the request was never acted upon - the cloud refused it because
+  of rate limits or unavailability, or the connection was never made.
+  Retrying a create after a timeout could leave a duplicate behind.
+
+Waits between attempts grow exponentially up to a ceiling, and a
+Retry-After hint from the cloud is honoured when it is longer.
+"""
+
+import errno
+import random
+import time
+
+READ = 'read'
+IDEMPOTENT = 'idempotent'
+DELETE = 'delete'
+CREATE = 'create'
+
+_READ_PREFIXES = ('get', 'list', 'find', 'show', 'head', 'exists')
+_DELETE_PREFIXES = ('delete', 'remove')
+_IDEMPOTENT_PREFIXES = ('update', 'put', 'set', 'unset', 'patch')
+
+# Responses meaning the request was turned away before it was processed.
+_REJECTED_STATUSES = (413, 429, 503)
+# Responses that may have been sent after the request took effect.
+_TRANSIENT_STATUSES = _REJECTED_STATUSES + (408, 500, 502, 504)
+
+# Exception class names from requests, keystoneclient and the
+# python-*clients, matched by name so none of them has to be imported.
+_REFUSED_ERRORS = ('ConnectionRefused', 'ConnectionRefusedError')
+_TRANSIENT_ERRORS = _REFUSED_ERRORS + (
+    'ConnectionError', 'ConnectionResetError', 'ConnectTimeout',
+    'ReadTimeout', 'RequestTimeout', 'Timeout', 'TimeoutError')
+_REFUSED_ERRNOS = (errno.ECONNREFUSED,)
+_TRANSIENT_ERRNOS = _REFUSED_ERRNOS + (
+    errno.ECONNABORTED, errno.ECONNRESET, errno.EPIPE, errno.ETIMEDOUT)
+
+
+def call_kind(name):
+    """Classify a dotted call name such as ``servers.create``."""
+    verb = name.rsplit('.', 1)[-1].lower()
+    if verb.startswith(_READ_PREFIXES):
+        return READ
+    if verb.startswith(_DELETE_PREFIXES):
+        return DELETE
+    if verb.startswith(_IDEMPOTENT_PREFIXES):
+        return IDEMPOTENT
+    return CREATE
+
+
+def status_code(error):
+    for attr in ('http_status', 'status_code', 'code'):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def _class_names(error):
+    return set(cls.__name__ for cls in type(error).__mro__)
+
+
+def is_transient(error, kind=READ):
+    """Whether a call of the given kind may be repeated after error."""
+    status = status_code(error)
+    names = _class_names(error)
+    err = getattr(error, 'errno', None)
+    if kind == CREATE:
+        return (status in _REJECTED_STATUSES or
+                err in _REFUSED_ERRNOS or
+                bool(names.intersection(_REFUSED_ERRORS)))
+    return (status in _TRANSIENT_STATUSES or
+            err in _TRANSIENT_ERRNOS or
+            bool(names.intersection(_TRANSIENT_ERRORS)))
+
+
+def is_not_found(error):
+    return status_code(error) == 404 or 'NotFound' in _class_names(error)
+
+
+def retry_after(error):
+    value = getattr(error, 'retry_after', None)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class Retrier(object):
+    """Repeat failed API calls with bounded exponential backoff.
+
+    Instances are suitable as a wrapper for clients.wrap_cloud, and keep a
+    running count of the retries they made.
+
+    :param attempts: Retries allowed per call on top of the first try.
+    :param delay: Wait before the first retry, in seconds.
+    :param max_delay: Ceiling for the wait between attempts.
+    """
+
+    def __init__(self, attempts=3, delay=0.5, max_delay=10.0):
+        self.attempts = attempts
+        self.delay = delay
+        self.max_delay = max_delay
+        self.retries = 0
+
+    def backoff(self, attempt, error):
+        wait = min(self.max_delay, self.delay * (2 ** attempt))
+        # Up to 10% of jitter keeps concurrent forks from moving in step.
+        wait += random.uniform(0, wait / 10)
+        return max(wait, retry_after(error))
+
+    def call(self, func, args=(), kwargs=None, kind=READ):
+        kwargs = kwargs or {}
+        attempt = 0
+        # Whether an attempt so far may have gone through before failing
+        acted = False
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if kind == DELETE and acted and is_not_found(e):
+                    return None
+                if attempt >= self.attempts or not is_transient(e, kind):
+                    raise
+                acted = acted or not is_transient(e, CREATE)
+                time.sleep(self.backoff(attempt, e))
+                attempt += 1
+                self.retries += 1
+
+    def __call__(self, service, name, func, args, kwargs):
+        return self.call(func, args, kwargs, kind=call_kind(name))
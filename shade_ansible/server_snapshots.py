@@ -0,0 +1,164 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Snapshot many servers into glance images at once, and prune old ones.
+
+Snapshots are tagged with the ID of the server they were taken of, so
+the older snapshots of a server are found with a property filter rather
+than by listing the whole image catalog.  They are also tagged with the
+run that took them, and the new snapshots are waited for with one
+listing of that run's images per turn.  Every function returns or fills
+in a dict of results keyed by the name or ID the server was asked for
+by.
+"""
+
+import time
+import uuid
+
+from shade_ansible import batch
+
+# Image property tying a snapshot to the server it was taken of
+SNAPSHOT_KEY = 'shade_ansible_snapshot_of'
+# Image property telling the snapshots taken together apart
+RUN_KEY = 'shade_ansible_snapshot_run'
+
+
+class NameFormatError(Exception):
+    pass
+
+
+def image_name(name_format, server_name, timestamp):
+    """The name of a snapshot of server_name.
+
+    :raises: NameFormatError if name_format is not a valid format using
+             only the server and timestamp keys.
+    """
+    try:
+        return name_format % dict(server=server_name, timestamp=timestamp)
+    except (KeyError, TypeError, ValueError) as e:
+        raise NameFormatError(
+            "Invalid name_format '%s': %s" % (name_format, e))
+
+
+def find_servers(nova, names_or_ids):
+    """The servers asked for, from a single listing.
+
+    :returns: A (servers, missing) pair of a dict of the servers found,
+              keyed by the name or ID each was asked for by, and a list
+              of those that were not found.
+    """
+    servers = {}
+    missing = []
+    listed = nova.servers.list()
+    for name_or_id in names_or_ids:
+        for server in listed:
+            if name_or_id in (server.id, server.name):
+                servers[name_or_id] = server
+                break
+        else:
+            missing.append(name_or_id)
+    return (servers, missing)
+
+
+def _properties(image):
+    return getattr(image, 'properties', None) or {}
+
+
+def _created(image):
+    return getattr(image, 'created_at', None) or ''
+
+
+def create(nova, glance, servers, name_format, metadata, results,
+           timeout, wait=True, predictor=None,
+           interval=batch.DEFAULT_INTERVAL, workers=batch.DEFAULT_WORKERS):
+    """Snapshot the servers and wait, returning the names that made it.
+
+    :param servers: A dict of servers as from find_servers().
+    :param predictor: A readiness.Predictor scheduling the wait and
+                      learning from it, or None to poll every interval.
+    """
+    timestamp = time.strftime('%Y%m%d%H%M%S', time.gmtime())
+    run = uuid.uuid4().hex
+
+    def snapshot(name):
+        server = servers[name]
+        properties = dict(metadata or {})
+        properties[SNAPSHOT_KEY] = server.id
+        properties[RUN_KEY] = run
+        snapshot_name = image_name(name_format, server.name, timestamp)
+        return (snapshot_name, nova.servers.create_image(
+            server, snapshot_name, properties))
+
+    started = time.time()
+    images = {}
+    for name, created, error in batch.run_parallel(
+            snapshot, sorted(servers), workers):
+        if error:
+            results[name] = dict(
+                failed=True, msg='Cannot snapshot server:%s' % str(error))
+            continue
+        (snapshot_name, image_id) = created
+        images[image_id] = name
+        results[name] = dict(changed=True, id=image_id, name=snapshot_name)
+
+    if not images or not wait:
+        return list(images.values())
+
+    ready = batch.status_check(('active',), ('killed', 'deleted'))
+
+    def check(image):
+        outcome = ready(image)
+        if outcome is True and predictor is not None:
+            predictor.record_ready(image, time.time() - started)
+        return outcome
+
+    def listing():
+        return glance.images.list(filters={'properties': {RUN_KEY: run}})
+
+    if predictor is not None:
+        interval = predictor.schedule()
+    done, errors = batch.poll(listing, images, check, timeout, interval)
+    for image_id, error in errors.items():
+        results[images[image_id]].update(
+            failed=True, msg='Snapshot failed:%s' % error)
+    return [images[image_id] for image_id in done]
+
+
+def prune(glance, servers, names, keep, results,
+          workers=batch.DEFAULT_WORKERS):
+    """Delete all but the newest keep snapshots of the servers in names."""
+    def snapshots_of(name):
+        server_id = servers[name].id
+        return sorted(
+            (image for image in glance.images.list(
+                filters={'properties': {SNAPSHOT_KEY: server_id}})
+             if _properties(image).get(SNAPSHOT_KEY) == server_id and
+             image.status == 'active'),
+            key=_created, reverse=True)
+
+    doomed = []
+    for name, images, error in batch.run_parallel(
+            snapshots_of, sorted(names), workers):
+        if error:
+            results.setdefault(name, dict(changed=False)).setdefault(
+                'prune_errors', []).append(str(error))
+            continue
+        doomed.extend((name, image) for image in images[keep:])
+    for (name, image), _, error in batch.run_parallel(
+            lambda item: glance.images.delete(item[1]), doomed, workers):
+        result = results.setdefault(name, dict(changed=False))
+        if error:
+            result.setdefault('prune_errors', []).append(
+                '%s: %s' % (image.id, str(error)))
+        else:
+            result['changed'] = True
+            result.setdefault('pruned', []).append(image.id)
@@ -0,0 +1,113 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Bulk snapshot of a cloud's resources for check mode.
+
+In check mode a module only has to say whether it would change anything,
+and for that a recent listing is as good as a fresh lookup.  Each kind of
+resource is listed once per cloud and shared through a Store by every
+task of the dry run, so planning a large play costs a handful of list
+calls instead of a round of lookups per task.
+
+Listings are kept for SHADE_ANSIBLE_SNAPSHOT_TTL seconds (default 60).
+"""
+
+import os
+
+from shade_ansible import store
+
+DEFAULT_TTL = 60
+
+
+def _servers(cloud):
+    return [dict(id=s.id, name=s.name, status=s.status,
+                 addresses=s.addresses, metadata=s.metadata,
+                 flavor=s.flavor, image=s.image)
+            for s in cloud.nova_client.servers.list()]
+
+
+def _volumes(cloud):
+    return [dict(id=v.id, display_name=v.display_name, status=v.status,
+                 size=v.size, attachments=v.attachments,
+                 metadata=v.metadata)
+            for v in cloud.cinder_client.volumes.list()]
+
+
+def _images(cloud):
+    return [dict(id=i.id, name=i.name, status=i.status)
+            for i in cloud.list_images().values()]
+
+
+def _keypairs(cloud):
+    return [dict(name=k.name, public_key=k.public_key)
+            for k in cloud.list_keypairs()]
+
+
+def _networks(cloud):
+    return [dict(id=n['id'], name=n['name'],
+                 external=n.get('router:external', False))
+            for n in cloud.neutron_client.list_networks()['networks']]
+
+
+def _subnets(cloud):
+    return [dict(id=s['id'], name=s['name'], network_id=s['network_id'],
+                 cidr=s['cidr'])
+            for s in cloud.neutron_client.list_subnets()['subnets']]
+
+
+def _routers(cloud):
+    return [dict(id=r['id'], name=r['name'],
+                 external_gateway_info=r.get('external_gateway_info'))
+            for r in cloud.neutron_client.list_routers()['routers']]
+
+
+FETCHERS = {
+    'images': _images,
+    'keypairs': _keypairs,
+    'networks': _networks,
+    'routers': _routers,
+    'servers': _servers,
+    'subnets': _subnets,
+    'volumes': _volumes,
+}
+
+
+class Snapshot(object):
+    """Shared, lazily fetched listings of one cloud's resources."""
+
+    def __init__(self, cloud, ttl=None, shared=None):
+        self.cloud = cloud
+        self.scope = store.scope(cloud)
+        if ttl is None:
+            ttl = float(os.environ.get(
+                'SHADE_ANSIBLE_SNAPSHOT_TTL', DEFAULT_TTL))
+        self.ttl = ttl
+        self._shared = shared
+        self._lists = {}
+
+    def _store(self, kind):
+        # One file per kind, so a slow listing only holds up its own kind.
+        return self._shared or store.Store('snapshot-%s' % kind)
+
+    def list(self, kind):
+        if kind not in self._lists:
+            self._lists[kind] = self._store(kind).cached(
+                '%s:%s' % (self.scope, kind), self.ttl,
+                lambda: FETCHERS[kind](self.cloud))
+        return self._lists[kind]
+
+    def find(self, kind, **attrs):
+        """Return the first resource of kind matching all attrs, or None."""
+        for resource in self.list(kind):
+            if all(resource.get(k) == v for k, v in attrs.items()):
+                return resource
+        return None
@@ -10,8 +10,15 @@
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 # GNU General Public License for more details.
 
+import os_client_config
 import shade
 
+from shade_ansible import clients
+from shade_ansible import ratelimit
+from shade_ansible import recording
+from shade_ansible import retry
+from shade_ansible import store
+
 
 def openstack_argument_spec(**kwargs):
     spec = dict(
@@ -29,7 +36,9 @@ def openstack_argument_spec(**kwargs):
         timeout=dict(default=180, type='int'),
         endpoint_type=dict(
             default='publicURL', choices=['publicURL', 'internalURL']
-        )
+        ),
+        rate_limit=dict(default=None),
+        api_retries=dict(default=3, type='int'),
     )
     spec.update(kwargs)
     return spec
@@ -51,4 +60,59 @@ def openstack_module_kwargs(**kwargs):
             else:
                 ret[key] = kwargs[key]
 
-    return ret        
+    return ret
+
+
+def _cloud_settings(params):
+    if not params.get('cloud'):
+        return {}
+    try:
+        return os_client_config.OpenStackConfig().get_one_cloud(
+            **params).config
+    except Exception:
+        # shade will complain about a broken config in a moment anyway
+        return {}
+
+
+def _report_retries(module, retrier):
+    # Every way out of the module reports how often it had to retry.
+    for method in ('exit_json', 'fail_json'):
+        def report(original=getattr(module, method), **kwargs):
+            kwargs.setdefault('api_retries', retrier.retries)
+            return original(**kwargs)
+        setattr(module, method, report)
+
+
+def openstack_cloud(module, operator=False):
+    """Return the shade cloud for a module's parameters.
+
+    Any rate_limit given to the module, or else set for the cloud in
+    clouds.yaml, is applied to every API call made through the cloud.
+    Calls failing for transient reasons are retried up to api_retries
+    times, and the number of retries is added to the module result.
+    HTTP traffic is recorded or replayed when the environment asks for it,
+    see shade_ansible.recording.
+    """
+    recording.install_from_environ()
+    if operator:
+        cloud = shade.operator_cloud(**module.params)
+    else:
+        cloud = shade.openstack_cloud(**module.params)
+
+    limits = module.params.get('rate_limit')
+    if limits is None:
+        limits = _cloud_settings(module.params).get('rate_limit')
+    if limits:
+        try:
+            governor = ratelimit.Governor(
+                limits, scope=store.scope(cloud))
+        except (KeyError, TypeError, ValueError) as e:
+            module.fail_json(msg="Invalid rate_limit: %s" % e)
+        clients.wrap_cloud(cloud, governor)
+
+    if module.params.get('api_retries'):
+        retrier = retry.Retrier(attempts=module.params['api_retries'])
+        # Wrapped last so that every attempt waits for the governor.
+        clients.wrap_cloud(cloud, retrier)
+        _report_retries(module, retrier)
+    return cloud
@@ -0,0 +1,112 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Small JSON documents shared between module processes.
+
+Ansible runs every task in a fresh interpreter, and with a high fork count
+many of them run at once on the controller.  State that has to outlive a
+task, or be coordinated between forks, goes into a JSON file next to a lock
+file, and every read-modify-write happens with the lock held.
+"""
+
+import contextlib
+import errno
+import fcntl
+import json
+import os
+import time
+
+
+def cache_dir():
+    """Directory holding the shared state files.
+
+    Defaults to ``~/.cache/shade-ansible`` and can be moved with the
+    ``SHADE_ANSIBLE_CACHE_DIR`` environment variable.
+    """
+    path = os.environ.get('SHADE_ANSIBLE_CACHE_DIR')
+    if not path:
+        path = os.path.join(
+            os.path.expanduser('~'), '.cache', 'shade-ansible')
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    return path
+
+
+def scope(cloud):
+    """A key telling the clouds and projects apart, for shared state.
+
+    Clouds given through auth_url rather than clouds.yaml all carry the
+    default name, so the endpoint and project are what identifies them.
+    """
+    auth = getattr(cloud, 'auth', None) or {}
+
+    def setting(*names):
+        for name in names:
+            value = auth.get(name) or getattr(cloud, name, None)
+            if value:
+                return value
+        return None
+
+    return '%s:%s:%s' % (
+        setting('auth_url'), setting('project_id', 'project_name'),
+        cloud.region)
+
+
+class Store(object):
+    """A JSON document on disk guarded by an exclusive file lock."""
+
+    def __init__(self, name, path=None):
+        self.path = os.path.join(path or cache_dir(), name + '.json')
+        self.lock_path = self.path + '.lock'
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            # A missing or truncated file is just an empty store.
+            return {}
+
+    def _write(self, data):
+        tmp_path = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.rename(tmp_path, self.path)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Yield the document, writing it back when the block exits."""
+        with open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                data = self._read()
+                yield data
+                self._write(data)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def cached(self, key, max_age, fetch):
+        """Return the value stored under key, refreshing it when stale.
+
+        fetch() runs with the lock held, so forks asking for the same
+        missing value wait for a single fetch rather than each making
+        their own.
+        """
+        with self.transaction() as data:
+            entry = data.get(key)
+            if entry is None or time.time() - entry['stamp'] > max_age:
+                entry = dict(stamp=time.time(), value=fetch())
+                data[key] = entry
+        return entry['value']
@@ -0,0 +1,93 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+fakes
+----------------------------------
+
+Stand-ins for the client objects and resources the helpers are handed.
+"""
+
+
+class Resource(object):
+    """A resource, or a client, carrying the attributes it is made with."""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class Building(object):
+    """A resource whose status moves along statuses, one step per get."""
+
+    def __init__(self, resource, *statuses):
+        self.resource = resource
+        self.statuses = list(statuses)
+
+    def get(self):
+        if self.statuses:
+            self.resource.status = self.statuses.pop(0)
+        return self.resource
+
+
+class Counted(object):
+    """A listing that counts how often it is made."""
+
+    def __init__(self, *items):
+        self.items = list(items)
+        self.calls = 0
+
+    def list(self):
+        self.calls += 1
+        return self.items
+
+
+class Manager(object):
+    """Resources of one kind by ID, as a client manager holds them.
+
+    Resources added with statuses move along them one step per get.
+    """
+
+    prefix = 'res'
+
+    def __init__(self, *resources):
+        self.resources = dict((r.id, r) for r in resources)
+        self.building = {}
+        self.created = 0
+        self.deleted = []
+
+    def add(self, statuses=(), **kwargs):
+        kwargs.setdefault('id', '%s%d' % (self.prefix, self.created))
+        resource = Resource(**kwargs)
+        self.created += 1
+        self.resources[resource.id] = resource
+        if statuses:
+            self.building[resource.id] = Building(resource, *statuses)
+        return resource
+
+    def list(self, search_opts=None):
+        name = (search_opts or {}).get('display_name')
+        return [r for r in self.resources.values()
+                if name is None or r.display_name == name]
+
+    def get(self, resource_id):
+        if resource_id in self.building:
+            return self.building[resource_id].get()
+        return self.resources[resource_id]
+
+    def delete(self, resource):
+        resource_id = getattr(resource, 'id', resource)
+        self.deleted.append(resource_id)
+        self.resources.pop(resource_id, None)
+        self.building.pop(resource_id, None)
@@ -0,0 +1,96 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_batch
+----------------------------------
+
+Tests for the concurrent call and shared polling helpers.
+"""
+
+from shade_ansible import batch
+from shade_ansible.tests import base
+
+
+class Listing(object):
+    """Hand out one prepared listing per call, repeating the last."""
+
+    def __init__(self, *listings):
+        self.listings = list(listings)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if len(self.listings) > 1:
+            return self.listings.pop(0)
+        return self.listings[0]
+
+
+class TestBatch(base.TestCase):
+
+    def test_run_parallel_keeps_order_and_errors(self):
+        def halve(n):
+            if n % 2:
+                raise ValueError(n)
+            return n // 2
+
+        results = batch.run_parallel(halve, range(6), workers=3)
+        self.assertEqual([0, 1, 2, 3, 4, 5], [r[0] for r in results])
+        self.assertEqual([0, None, 1, None, 2, None], [r[1] for r in results])
+        self.assertIsInstance(results[1][2], ValueError)
+
+    def test_run_parallel_empty(self):
+        self.assertEqual([], batch.run_parallel(lambda x: x, []))
+
+    def test_poll_uses_one_listing_per_turn(self):
+        listing = Listing(
+            [{'id': 'a', 'status': 'BUILD'}],
+            [{'id': 'a', 'status': 'ACTIVE'}, {'id': 'b', 'status': 'BUILD'}],
+            [{'id': 'a', 'status': 'ACTIVE'}, {'id': 'b', 'status': 'ERROR'},
+             {'id': 'c', 'status': 'ACTIVE'}],
+        )
+        done, errors = batch.poll(
+            listing, ['a', 'b', 'c'], batch.status_check(('ACTIVE',)),
+            timeout=10, interval=0)
+        self.assertEqual(['a', 'c'], sorted(done))
+        self.assertEqual({'b': 'status is ERROR'}, errors)
+        self.assertEqual(3, listing.calls)
+
+    def test_poll_times_out(self):
+        listing = Listing([{'id': 'a', 'status': 'BUILD'}])
+        done, errors = batch.poll(
+            listing, ['a'], batch.status_check(('ACTIVE',)),
+            timeout=0, interval=0)
+        self.assertEqual({}, done)
+        self.assertEqual({'a': 'timed out'}, errors)
+
+    def test_gone_check(self):
+        listing = Listing([{'id': 'a', 'status': 'deleting'}], [])
+        done, errors = batch.poll(
+            listing, ['a'], batch.gone_check(), timeout=10, interval=0)
+        self.assertEqual({'a': None}, done)
+        self.assertEqual({}, errors)
+
+    def test_gone_check_deleted_in_error(self):
+        listing = Listing(
+            [{'id': 'a', 'status': 'ERROR'}, {'id': 'b', 'status': 'ERROR'}],
+            [{'id': 'a', 'status': 'ERROR'}, {'id': 'b', 'status': 'DELETED'}],
+            [{'id': 'b', 'status': 'ERROR'}])
+        check = batch.gone_check(before={'a': 'ERROR', 'b': 'ERROR'})
+        done, errors = batch.poll(
+            listing, ['a', 'b'], check, timeout=10, interval=0)
+        self.assertEqual({'a': None}, done)
+        # b left ERROR and came back to it, so its delete failed
+        self.assertEqual({'b': 'status is ERROR'}, errors)
@@ -0,0 +1,88 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_console
+----------------------------------
+
+Tests for the incremental console log follower.
+"""
+
+from shade_ansible import console
+from shade_ansible.tests import base
+
+
+class Log(object):
+    """A console log that grows by a batch of lines on every fetch."""
+
+    def __init__(self, *batches):
+        self.batches = list(batches)
+        self.lines = []
+        self.lengths = []
+
+    def grow(self):
+        if self.batches:
+            self.lines.extend(self.batches.pop(0))
+
+    def __call__(self, length):
+        self.lengths.append(length)
+        return '\n'.join(self.lines[-length:])
+
+
+def lines(prefix, count):
+    return ['%s %d' % (prefix, i) for i in range(count)]
+
+
+class TestConsole(base.TestCase):
+
+    def test_read_returns_only_new_lines(self):
+        log = Log(lines('boot', 5), lines('init', 3), [])
+        tail = console.ConsoleTail(log, window=10)
+        log.grow()
+        self.assertEqual(lines('boot', 5), tail.read())
+        log.grow()
+        self.assertEqual(lines('init', 3), tail.read())
+        log.grow()
+        self.assertEqual([], tail.read())
+        self.assertEqual([10, 10, 10], log.lengths)
+        self.assertEqual(8, tail.offset)
+
+    def test_window_grows_when_log_outruns_it(self):
+        log = Log(lines('boot', 5), lines('init', 25))
+        tail = console.ConsoleTail(log, window=10)
+        log.grow()
+        tail.read()
+        log.grow()
+        self.assertEqual(lines('init', 25), tail.read())
+        self.assertEqual([10, 10, 20, 40], log.lengths)
+
+    def test_wait_for_line(self):
+        done_line = 'Cloud-init v. 0.7.5 finished at Thu, 01 Jan 2015'
+        slow = Log(lines('boot', 3), lines('init', 3), [done_line])
+        fast = Log(lines('boot', 3) + [done_line])
+        silent = Log(lines('boot', 3))
+
+        def tail(log):
+            def fetch(length):
+                log.grow()
+                return log(length)
+            return console.ConsoleTail(fetch)
+
+        (done, errors) = console.wait_for_line(
+            dict(slow=tail(slow), fast=tail(fast), silent=tail(silent)),
+            console.CLOUD_INIT_DONE, timeout=0.2, interval=0)
+        self.assertEqual(
+            {'slow': done_line, 'fast': done_line}, done)
+        self.assertEqual(['silent'], list(errors))
@@ -0,0 +1,120 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_flavors
+----------------------------------
+
+Tests for the indexed flavor resolver.
+"""
+
+import fixtures
+
+from shade_ansible import flavors
+from shade_ansible import store
+from shade_ansible.tests import base
+
+
+def flavor(id, name, ram, vcpus, disk):
+    return dict(id=id, name=name, ram=ram, vcpus=vcpus, disk=disk)
+
+
+FLAVORS = [
+    flavor('5', '8GB Standard', 8192, 4, 160),
+    flavor('1', '512MB Standard', 512, 1, 20),
+    flavor('3', '2GB Standard', 2048, 2, 80),
+    flavor('p2', '2GB Performance', 2048, 2, 40),
+    flavor('4', '4GB Standard', 4096, 2, 160),
+    flavor('2', '1GB Standard', 1024, 1, 40),
+]
+
+
+class FakeFlavor(object):
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeFlavors(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def list(self):
+        self.calls += 1
+        return [FakeFlavor(**f) for f in FLAVORS]
+
+
+class FakeNova(object):
+
+    def __init__(self):
+        self.flavors = FakeFlavors()
+
+
+class FakeCloud(object):
+
+    name = 'fake'
+    region = 'region'
+
+    def __init__(self, project='p1'):
+        self.auth = dict(auth_url='https://keystone/v2.0', project_id=project)
+        self.nova_client = FakeNova()
+
+
+class TestFlavors(base.TestCase):
+
+    def setUp(self):
+        super(TestFlavors, self).setUp()
+        self.index = flavors.FlavorIndex(FLAVORS)
+
+    def test_smallest_by_ram(self):
+        self.assertEqual('2', self.index.smallest(ram=1000)['id'])
+        self.assertEqual('2', self.index.smallest(ram=1024)['id'])
+
+    def test_smallest_without_constraints(self):
+        self.assertEqual('1', self.index.smallest()['id'])
+
+    def test_multiple_constraints(self):
+        self.assertEqual(
+            '4', self.index.smallest(ram=1024, vcpus=2, disk=100)['id'])
+        self.assertEqual('5', self.index.smallest(vcpus=3)['id'])
+
+    def test_include_and_exclude(self):
+        self.assertEqual(
+            'p2', self.index.smallest(ram=1024, include='Performance')['id'])
+        self.assertEqual(
+            '3', self.index.smallest(ram=2048, exclude='Performance')['id'])
+
+    def test_not_found(self):
+        self.assertRaises(
+            flavors.FlavorNotFound, self.index.smallest, ram=16384)
+
+    def test_index_cached_between_tasks(self):
+        shared = store.Store(
+            'flavors', path=self.useFixture(fixtures.TempDir()).path)
+        cloud = FakeCloud()
+        for i in range(3):
+            index = flavors.flavor_index(cloud, ttl=60, shared=shared)
+        self.assertEqual('3', index.smallest(ram=2048, disk=50)['id'])
+        self.assertEqual(1, cloud.nova_client.flavors.calls)
+
+    def test_index_not_shared_between_projects(self):
+        shared = store.Store(
+            'flavors', path=self.useFixture(fixtures.TempDir()).path)
+        clouds = [FakeCloud(), FakeCloud(project='p2')]
+        for cloud in clouds:
+            flavors.flavor_index(cloud, ttl=60, shared=shared)
+        self.assertEqual(
+            [1, 1], [cloud.nova_client.flavors.calls for cloud in clouds])
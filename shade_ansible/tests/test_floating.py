@@ -0,0 +1,114 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_floating
+----------------------------------
+
+Tests for reconciling the floating IPs of a server.
+"""
+
+from shade_ansible import floating
+from shade_ansible.tests import base
+
+
+class FakeServer(object):
+
+    def __init__(self, fixed, ips):
+        self.id = 's1'
+        self.fixed = fixed
+        self.ips = set(ips)
+
+    @property
+    def addresses(self):
+        return {'private': [{'addr': self.fixed, 'OS-EXT-IPS:type': 'fixed'}]
+                + [{'addr': ip, 'OS-EXT-IPS:type': 'floating'}
+                   for ip in sorted(self.ips)]}
+
+
+class FakeServers(object):
+    """Floating IP changes that show up after a number of gets."""
+
+    def __init__(self, server, lag=1, broken=()):
+        self.server = server
+        self.lag = lag
+        self.broken = broken
+        self.pending = []
+        self.calls = []
+
+    def add_floating_ip(self, server, address):
+        if address in self.broken:
+            raise Exception('no such address')
+        self.calls.append(('add', address))
+        self.pending.append((self.server.ips.add, address))
+
+    def remove_floating_ip(self, server, address):
+        self.calls.append(('remove', address))
+        self.pending.append((self.server.ips.discard, address))
+
+    def get(self, server_id):
+        if self.lag:
+            self.lag -= 1
+        else:
+            for (change, address) in self.pending:
+                change(address)
+            self.pending = []
+        return FakeServer(self.server.fixed, self.server.ips)
+
+
+class FakeNova(object):
+
+    def __init__(self, server, **kwargs):
+        self.servers = FakeServers(server, **kwargs)
+
+
+class TestFloating(base.TestCase):
+
+    def setUp(self):
+        super(TestFloating, self).setUp()
+        self.server = FakeServer('10.0.0.5', ['1.1.1.1', '2.2.2.2'])
+
+    def test_floating_ips_skip_fixed_addresses(self):
+        self.assertEqual(
+            set(['1.1.1.1', '2.2.2.2']), floating.floating_ips(self.server))
+
+    def test_diff(self):
+        self.assertEqual(
+            (set(['3.3.3.3']), set(['1.1.1.1'])),
+            floating.diff(self.server, ['2.2.2.2', '3.3.3.3']))
+
+    def test_sync_applies_the_diff_and_waits(self):
+        nova = FakeNova(self.server)
+        server = floating.sync(
+            nova, self.server, ['2.2.2.2', '3.3.3.3'], timeout=5,
+            interval=0)
+        self.assertEqual(
+            [('add', '3.3.3.3'), ('remove', '1.1.1.1')],
+            sorted(nova.servers.calls))
+        self.assertEqual(
+            set(['2.2.2.2', '3.3.3.3']), floating.floating_ips(server))
+
+    def test_sync_reports_failed_changes(self):
+        nova = FakeNova(self.server, broken=['3.3.3.3'])
+        error = self.assertRaises(
+            floating.FloatingIPError, floating.sync,
+            nova, self.server, ['3.3.3.3'], timeout=5, interval=0)
+        self.assertIn('add 3.3.3.3: no such address', str(error))
+
+    def test_sync_times_out(self):
+        nova = FakeNova(self.server, lag=1000)
+        self.assertRaises(
+            floating.FloatingIPError, floating.sync,
+            nova, self.server, ['3.3.3.3'], timeout=0, interval=0)
@@ -0,0 +1,114 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_golden
+----------------------------------
+
+Tests for the golden volume clone cache.
+"""
+
+import fixtures
+
+from shade_ansible import golden
+from shade_ansible.tests import base
+from shade_ansible.tests import fakes
+
+
+class FakeVolumes(fakes.Manager):
+
+    prefix = 'vol'
+
+    def create(self, size, display_name, volume_type, imageRef, metadata):
+        return self.add(('available',), status='creating', size=size,
+                        display_name=display_name, image=imageRef,
+                        metadata=metadata)
+
+
+class FakeSnapshots(fakes.Manager):
+
+    prefix = 'snap'
+
+    def create(self, volume_id, display_name):
+        return self.add(('available',), status='creating',
+                        volume_id=volume_id, display_name=display_name)
+
+
+class TestGolden(base.TestCase):
+
+    def setUp(self):
+        super(TestGolden, self).setUp()
+        self.cinder = fakes.Resource(
+            volumes=FakeVolumes(), volume_snapshots=FakeSnapshots())
+        self.cache = golden.GoldenCache(
+            self.cinder, timeout=5, interval=0,
+            path=self.useFixture(fixtures.TempDir()).path)
+
+    def test_golden_volume_built_once(self):
+        first = self.cache.source('Ubuntu', 'img1', 'ssd', 10, 2)
+        second = self.cache.source('Ubuntu', 'img1', 'ssd', 20, 2)
+        self.assertEqual(dict(source_volid='vol0'), first)
+        self.assertEqual(first, second)
+        volume = self.cinder.volumes.resources['vol0']
+        self.assertEqual('golden-Ubuntu-ssd', volume.display_name)
+        self.assertEqual(2, volume.size)
+        self.assertEqual('img1', volume.metadata[golden.IMAGE_KEY])
+
+    def test_image_update_rebuilds_golden_volume(self):
+        self.cache.source('Ubuntu', 'img1', 'ssd', 10, 2, golden.SNAPSHOT)
+        source = self.cache.source('Ubuntu', 'img2', 'ssd', 10, 2,
+                                   golden.SNAPSHOT)
+        self.assertEqual(['vol0'], self.cinder.volumes.deleted)
+        self.assertEqual(['snap0'], self.cinder.volume_snapshots.deleted)
+        self.assertEqual(dict(snapshot_id='snap1'), source)
+        snapshot = self.cinder.volume_snapshots.resources['snap1']
+        self.assertEqual('vol1', snapshot.volume_id)
+        self.assertEqual('img2', self.cinder.volumes.resources['vol1'].image)
+
+    def test_golden_volume_at_image_size(self):
+        # The first volume asked for is larger than the image needs
+        self.cache.source('Ubuntu', 'img1', None, 20, 2)
+        self.assertEqual(
+            dict(source_volid='vol0'),
+            self.cache.source('Ubuntu', 'img1', None, 10, 2))
+        self.assertEqual(2, self.cinder.volumes.resources['vol0'].size)
+
+    def test_too_small_for_golden_volume(self):
+        self.assertIsNone(self.cache.source('Ubuntu', 'img1', None, 1, 2))
+
+    def test_failed_golden_volume_built_again(self):
+        self.cache.source('Ubuntu', 'img1', None, 10, 2)
+        self.cinder.volumes.resources['vol0'].status = 'error'
+        self.assertEqual(
+            dict(source_volid='vol1'),
+            self.cache.source('Ubuntu', 'img1', None, 10, 2))
+        self.assertEqual(['vol0'], self.cinder.volumes.deleted)
+
+    def test_lock_per_golden_volume(self):
+        # Another golden volume being built holds up nothing else
+        with self.cache._lock(golden.golden_name('Fedora', None)):
+            self.assertEqual(
+                dict(source_volid='vol0'),
+                self.cache.source('Ubuntu', 'img1', None, 10, 2))
+
+    def test_min_size(self):
+        self.assertEqual(
+            1, golden.min_size(fakes.Resource(size=13 * 2 ** 20)))
+        self.assertEqual(3, golden.min_size(
+            fakes.Resource(size=2 * 2 ** 30 + 1, min_disk=0)))
+        self.assertEqual(
+            20, golden.min_size(
+                fakes.Resource(size=2 ** 30, min_disk=20)))
+        self.assertEqual(1, golden.min_size(fakes.Resource()))
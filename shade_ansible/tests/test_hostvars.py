@@ -0,0 +1,102 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_hostvars
+----------------------------------
+
+Tests for hostvars at a chosen depth and the shared lookups behind them.
+"""
+
+import fixtures
+
+from shade_ansible import hostvars
+from shade_ansible.tests import base
+from shade_ansible.tests import fakes
+
+
+class FakeCloud(object):
+
+    name = 'fake'
+    region = 'region'
+
+    def __init__(self):
+        self.nova_client = fakes.Resource(flavors=fakes.Counted(fakes.Resource(
+            id='2', name='1GB Standard', ram=1024, vcpus=1, disk=40)))
+        self.cinder_client = fakes.Resource(volumes=fakes.Counted(
+            fakes.Resource(id='v1', attachments=[{'server_id': 's1'}]),
+            fakes.Resource(id='v2', attachments=[{'server_id': 's2'}]),
+            fakes.Resource(id='v3', attachments=[])))
+        self.image_calls = 0
+
+    def list_images(self):
+        self.image_calls += 1
+        return {'img': fakes.Resource(
+            id='img', name='trusty', status='active',
+            created_at='2014-10-01T00:00:00')}
+
+    def get_flavor_name(self, flavor_id):
+        raise AssertionError('looked up a flavor')
+
+
+class TestHostvars(base.TestCase):
+
+    def setUp(self):
+        super(TestHostvars, self).setUp()
+        self.useFixture(fixtures.EnvironmentVariable(
+            'SHADE_ANSIBLE_CACHE_DIR',
+            self.useFixture(fixtures.TempDir()).path))
+        self.cloud = FakeCloud()
+
+    def test_id_depth_computes_nothing(self):
+        self.assertIsNone(hostvars.server_hostvars(
+            self.cloud, fakes.Resource(id='s1'), depth='id'))
+
+    def test_reference_cloud_answers_from_one_fetch(self):
+        for i in range(2):
+            reference = hostvars.reference_cloud(self.cloud)
+        self.assertEqual('1GB Standard', reference.get_flavor_name('2'))
+        self.assertEqual('trusty', reference.get_image_name('img'))
+        self.assertEqual(['v2'], [
+            v.id for v in reference.get_volumes(fakes.Resource(id='s2'))])
+        self.assertEqual([], reference.get_volumes(fakes.Resource(id='s3')))
+        # Flavors and images come from the shared caches, volumes are
+        # listed once per reference cloud
+        self.assertEqual(1, self.cloud.nova_client.flavors.calls)
+        self.assertEqual(1, self.cloud.image_calls)
+        self.assertEqual(2, self.cloud.cinder_client.volumes.calls)
+
+    def test_reference_cloud_passes_other_attributes(self):
+        reference = hostvars.reference_cloud(self.cloud)
+        self.assertEqual('region', reference.region)
+
+    def test_batch_hostvars_share_one_reference_cloud(self):
+        self.useFixture(fixtures.MonkeyPatch(
+            'shade_ansible.hostvars.server_hostvars',
+            lambda cloud, server, depth: (cloud, server.id)))
+        found = hostvars.batch_hostvars(self.cloud, dict(
+            (name, fakes.Resource(id=name)) for name in ('s1', 's2', 's3')))
+        self.assertEqual(['s1', 's2', 's3'], sorted(found))
+        self.assertEqual(
+            1, len(set(id(cloud) for cloud, _ in found.values())))
+        self.assertIsInstance(found['s1'][0], hostvars.ReferenceCloud)
+        self.assertEqual(1, self.cloud.cinder_client.volumes.calls)
+
+    def test_batch_hostvars_by_id(self):
+        self.assertEqual(
+            {'web-1': None},
+            hostvars.batch_hostvars(
+                self.cloud, {'web-1': fakes.Resource(id='s1')}, depth='id'))
+        self.assertEqual(0, self.cloud.cinder_client.volumes.calls)
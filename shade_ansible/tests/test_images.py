@@ -0,0 +1,142 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_images
+----------------------------------
+
+Tests for the cached image catalog.
+"""
+
+import fixtures
+
+from shade_ansible import images
+from shade_ansible import store
+from shade_ansible.tests import base
+
+
+def image(id, name, created, status='active'):
+    return dict(id=id, name=name, created=created, status=status)
+
+
+IMAGES = [
+    image('a', 'Ubuntu 14.04 (deprecated)', '2014-12-01T00:00:00'),
+    image('b', 'Ubuntu 14.04', '2014-10-01T00:00:00'),
+    image('c', 'Ubuntu 14.04 LTS', '2014-11-01T00:00:00'),
+    image('d', 'Ubuntu 14.04 LTS', '2014-11-15T00:00:00', status='queued'),
+    image('e', 'CentOS 7', '2014-09-01T00:00:00'),
+]
+
+
+class FakeImage(object):
+
+    def __init__(self, **kwargs):
+        self.created_at = kwargs.pop('created')
+        self.__dict__.update(kwargs)
+
+
+class FakeCloud(object):
+
+    name = 'fake'
+    region = 'region'
+
+    def __init__(self, project='p1'):
+        self.auth = dict(auth_url='https://keystone/v2.0', project_id=project)
+        self.images = list(IMAGES)
+        self.calls = 0
+
+    def list_images(self):
+        self.calls += 1
+        return dict((i['id'], FakeImage(**i)) for i in self.images)
+
+
+class TestImages(base.TestCase):
+
+    def setUp(self):
+        super(TestImages, self).setUp()
+        self.index = images.ImageIndex(IMAGES)
+
+    def test_by_id(self):
+        self.assertEqual('e', self.index.newest('e')['id'])
+
+    def test_exact_name_wins(self):
+        self.assertEqual('b', self.index.newest('Ubuntu 14.04')['id'])
+
+    def test_newest_match_skips_excluded_and_inactive(self):
+        self.assertEqual(
+            'c', self.index.newest('Ubuntu', exclude='(deprecated)')['id'])
+        self.assertEqual('a', self.index.newest('Ubuntu')['id'])
+
+    def test_matching(self):
+        matches = self.index.matching('Ubuntu', '(deprecated)')
+        self.assertEqual(['b', 'c'], [i['id'] for i in matches])
+
+    def test_exact_takes_no_partial_names(self):
+        self.assertEqual('c', self.index.exact('Ubuntu 14.04 LTS')['id'])
+        self.assertEqual('e', self.index.exact('e')['id'])
+        self.assertRaises(images.ImageNotFound, self.index.exact, 'Ubuntu')
+
+    def test_names_include_inactive_images(self):
+        self.assertEqual('Ubuntu 14.04 LTS', self.index.names['d'])
+        self.assertNotIn('d', self.index.by_id)
+
+    def test_not_found(self):
+        self.assertRaises(
+            images.ImageNotFound, self.index.newest, 'Fedora')
+
+    def test_catalog_cached_between_tasks(self):
+        shared = store.Store(
+            'images', path=self.useFixture(fixtures.TempDir()).path)
+        cloud = FakeCloud()
+        for i in range(3):
+            index = images.image_index(cloud, ttl=60, shared=shared)
+        self.assertEqual('e', index.newest('CentOS')['id'])
+        self.assertEqual(1, cloud.calls)
+
+    def test_catalog_not_shared_between_projects(self):
+        shared = store.Store(
+            'images', path=self.useFixture(fixtures.TempDir()).path)
+        clouds = [FakeCloud(), FakeCloud(project='p2')]
+        for cloud in clouds:
+            images.image_index(cloud, ttl=60, shared=shared)
+        self.assertEqual([1, 1], [cloud.calls for cloud in clouds])
+
+    def test_miss_fetches_catalog_again(self):
+        shared = store.Store(
+            'images', path=self.useFixture(fixtures.TempDir()).path)
+        cloud = FakeCloud()
+        images.image_index(cloud, ttl=60, shared=shared)
+        cloud.images.append(image('f', 'Fedora 21', '2014-12-09T00:00:00'))
+        self.assertEqual(
+            'f', images.newest(cloud, 'Fedora', ttl=60, shared=shared)['id'])
+        self.assertEqual(
+            'f', images.exact(cloud, 'Fedora 21', ttl=60, shared=shared)['id'])
+        self.assertEqual(2, cloud.calls)
+        self.assertRaises(
+            images.ImageNotFound, images.exact, cloud, 'Fedora', ttl=60,
+            shared=shared)
+        self.assertEqual(3, cloud.calls)
+
+    def test_forget(self):
+        shared = store.Store(
+            'images', path=self.useFixture(fixtures.TempDir()).path)
+        cloud = FakeCloud()
+        images.image_index(cloud, ttl=60, shared=shared)
+        cloud.images.append(
+            image('g', 'Ubuntu 14.04 LTS', '2014-12-01T00:00:00'))
+        images.forget(cloud, shared=shared)
+        self.assertEqual('g', images.newest(
+            cloud, 'Ubuntu 14.04 LTS', ttl=60, shared=shared)['id'])
+        self.assertEqual(2, cloud.calls)
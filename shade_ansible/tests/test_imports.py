@@ -0,0 +1,85 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_imports
+----------------------------------
+
+Keep the load-time imports of the modules to what every task needs.
+"""
+
+import glob
+import os
+import re
+
+from shade_ansible.tests import base
+
+MODULES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), 'modules')
+
+CLIENT_IMPORT = re.compile(r'^(?:import|from) \w+client\b')
+# Helpers only some code paths of a module need
+PATH_HELPER_IMPORT = re.compile(
+    r'^from shade_ansible import '
+    r'(?:console|floating|golden|pool|probe|provision|updates)$')
+
+
+def load_time_client_imports(lines, pattern=CLIENT_IMPORT):
+    """Client imports at the top level or directly in a top-level try."""
+    found = []
+    in_try = False
+    for line in lines:
+        if line[:1] not in ('', ' ', '\n'):
+            in_try = line.startswith('try:')
+        if line.startswith('    ') and not in_try:
+            continue
+        if pattern.match(line.strip()):
+            found.append(line.strip())
+    return found
+
+
+class TestModuleImports(base.TestCase):
+
+    def test_no_client_libraries_at_load_time(self):
+        for path in glob.glob(os.path.join(MODULES_DIR, 'os_*.py')):
+            with open(path) as f:
+                imports = load_time_client_imports(f)
+            self.assertEqual(
+                [], imports,
+                "%s imports a client library at load time, import it "
+                "inside the function needing it" % os.path.basename(path))
+
+    def test_path_specific_helpers_imported_lazily(self):
+        for path in glob.glob(os.path.join(MODULES_DIR, 'os_*.py')):
+            with open(path) as f:
+                imports = load_time_client_imports(f, PATH_HELPER_IMPORT)
+            self.assertEqual(
+                [], imports,
+                "%s imports a helper at load time that only some tasks "
+                "use, import it inside the function needing it" % (
+                    os.path.basename(path)))
+
+    def test_lazy_imports_allowed(self):
+        self.assertEqual(
+            ['from novaclient import utils', 'import glanceclient'],
+            load_time_client_imports([
+                'from novaclient import utils\n',
+                'try:\n',
+                '    import glanceclient\n',
+                'except ImportError:\n',
+                '    pass\n',
+                'def _delete(cinder):\n',
+                '    from cinderclient import exceptions\n',
+            ]))
@@ -0,0 +1,168 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_pool
+----------------------------------
+
+Tests for the warm standby server pool.
+"""
+
+import copy
+
+import fixtures
+
+from shade_ansible import pool
+from shade_ansible import store
+from shade_ansible.tests import base
+
+
+class FakeServer(object):
+
+    def __init__(self, id, name, status='ACTIVE', metadata=None):
+        self.id = id
+        self.name = name
+        self.status = status
+        self.metadata = dict(metadata or {})
+
+
+class FakeServers(object):
+    """Servers listed as copies, which later changes leave as they are."""
+
+    def __init__(self, servers):
+        self.servers = dict((s.id, s) for s in servers)
+        self.created = []
+        self.broken = set()
+
+    def list(self):
+        return [copy.deepcopy(s) for s in self.servers.values()]
+
+    def get(self, server_id):
+        return copy.deepcopy(self.servers[server_id])
+
+    def update(self, server, name):
+        self.servers[server.id].name = name
+
+    def set_meta(self, server, metadata):
+        if set(metadata) & self.broken:
+            raise Exception('metadata refused')
+        self.servers[server.id].metadata.update(metadata)
+
+    def delete_meta(self, server, keys):
+        for key in keys:
+            self.servers[server.id].metadata.pop(key, None)
+
+    def create(self, name, image, flavor, meta=None, **kwargs):
+        server = FakeServer(
+            'new-%d' % len(self.created), name, 'BUILD', meta)
+        self.created.append(server)
+        self.servers[server.id] = server
+        return server
+
+
+class FakeNova(object):
+
+    def __init__(self, servers):
+        self.servers = FakeServers(servers)
+
+
+def standby(id, status='ACTIVE', image='img', flavor='2'):
+    return FakeServer('s%s' % id, 'web-standby-%s' % id, status,
+                      pool.standby_meta('web', image, flavor))
+
+
+class TestPool(base.TestCase):
+
+    def setUp(self):
+        super(TestPool, self).setUp()
+        self.shared = store.Store(
+            'pool', path=self.useFixture(fixtures.TempDir()).path)
+        self.nova = FakeNova([
+            standby(1), standby(2, status='BUILD'), standby(3, flavor='4'),
+            FakeServer('other', 'db-1'),
+        ])
+
+    def test_standby_servers_match_image_and_flavor(self):
+        servers = self.nova.servers.list()
+        self.assertEqual(
+            ['s1'], [s.id for s in pool.standby_servers(
+                servers, 'web', 'img', '2')])
+        self.assertEqual(
+            ['s1', 's2'], sorted(s.id for s in pool.standby_servers(
+                servers, 'web', 'img', '2', ready=False)))
+
+    def test_claim_renames_and_retags(self):
+        (claimed, errors) = pool.claim(
+            self.nova, self.nova.servers.list(), 'web', 'img', '2',
+            ['web-42', 'web-43'], meta={'group': 'web'}, shared=self.shared)
+        self.assertEqual(['web-42'], list(claimed))
+        self.assertEqual({}, errors)
+        server = claimed['web-42']
+        self.assertEqual(('s1', 'web-42'), (server.id, server.name))
+        self.assertEqual({'group': 'web'}, server.metadata)
+
+    def test_server_claimed_once(self):
+        servers = self.nova.servers.list()
+        (first, _) = pool.claim(
+            self.nova, servers, 'web', 'img', '2', ['a'], shared=self.shared)
+        # A fork working from the same stale listing gets nothing.
+        (second, _) = pool.claim(
+            self.nova, servers, 'web', 'img', '2', ['b'], shared=self.shared)
+        self.assertEqual(['a'], list(first))
+        self.assertEqual({}, second)
+
+    def test_failed_claim_rolled_back_and_released(self):
+        self.nova.servers.broken.add('group')
+        servers = self.nova.servers.list()
+        (claimed, errors) = pool.claim(
+            self.nova, servers, 'web', 'img', '2', ['web-42'],
+            meta={'group': 'web'}, shared=self.shared)
+        self.assertEqual({}, claimed)
+        self.assertIn('Cannot claim standby server s1', errors['web-42'])
+        server = self.nova.servers.get('s1')
+        self.assertEqual('web-standby-1', server.name)
+        self.assertEqual(pool.standby_meta('web', 'img', '2'), server.metadata)
+        # Back in the pool for the next claim
+        (claimed, errors) = pool.claim(
+            self.nova, servers, 'web', 'img', '2', ['web-42'],
+            shared=self.shared)
+        self.assertEqual(['web-42'], list(claimed))
+
+    def test_top_up_counts_building_servers(self):
+        booted = pool.top_up(
+            self.nova, self.nova.servers.list(), 'web', 4, 'img', '2',
+            {'key_name': 'k'})
+        self.assertEqual(2, len(booted))
+        for server in self.nova.servers.created:
+            self.assertEqual(
+                pool.standby_meta('web', 'img', '2'), server.metadata)
+            self.assertTrue(server.name.startswith('web-standby-'))
+
+    def test_top_up_full_pool(self):
+        self.assertEqual([], pool.top_up(
+            self.nova, self.nova.servers.list(), 'web', 2, 'img', '2', {}))
+
+    def test_top_up_after_claim(self):
+        servers = self.nova.servers.list()
+        (claimed, _) = pool.claim(
+            self.nova, servers, 'web', 'img', '2', ['web-42'],
+            shared=self.shared)
+        # The listing still shows the claimed server standing by
+        self.assertEqual(2, len(pool.standby_servers(
+            servers, 'web', 'img', '2', ready=False)))
+        booted = pool.top_up(
+            self.nova, servers, 'web', 2, 'img', '2', {},
+            exclude=[s.id for s in claimed.values()])
+        self.assertEqual(1, len(booted))
@@ -0,0 +1,58 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_probe
+----------------------------------
+
+Tests for the concurrent TCP port probe.
+"""
+
+import socket
+
+from shade_ansible import probe
+from shade_ansible.tests import base
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class TestProbe(base.TestCase):
+
+    def setUp(self):
+        super(TestProbe, self).setUp()
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(5)
+        self.addCleanup(self.server.close)
+        self.port = self.server.getsockname()[1]
+
+    def test_reachable_hosts(self):
+        (ready, errors) = probe.wait_for_ports(
+            {'a': '127.0.0.1', 'b': '127.0.0.1'}, self.port, timeout=5)
+        self.assertEqual(['a', 'b'], sorted(ready))
+        self.assertEqual({}, errors)
+
+    def test_closed_port_times_out(self):
+        (ready, errors) = probe.wait_for_ports(
+            {'a': '127.0.0.1'}, free_port(), timeout=0.3, delay=0.05)
+        self.assertEqual([], ready)
+        self.assertIn('timed out', errors['a'])
+        self.assertIn('ECONNREFUSED', errors['a'])
@@ -0,0 +1,220 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_provision
+----------------------------------
+
+Tests for the pipelined post-boot provisioning.
+"""
+
+from shade_ansible import provision
+from shade_ansible.tests import base
+from shade_ansible.tests import fakes
+
+
+class FakeServers(object):
+
+    def __init__(self, server):
+        self.server = fakes.Building(server, 'BUILD', 'BUILD', 'ACTIVE')
+        self.floating_ips = []
+        self.ports = []
+        self.broken = False
+
+    def get(self, server_id):
+        return self.server.get()
+
+    def add_floating_ip(self, server, address):
+        assert server.status == 'ACTIVE'
+        self.floating_ips.append(address)
+
+    def interface_attach(self, server, port_id, net_id, fixed_ip):
+        assert server.status == 'ACTIVE'
+        if self.broken:
+            raise Exception('no more ports')
+        self.ports.append(port_id)
+
+
+class FakeFloatingIPs(object):
+
+    def __init__(self, empty=()):
+        self.empty = empty
+        self.created = []
+        self.deleted = []
+
+    def create(self, pool):
+        if pool in self.empty:
+            raise Exception('pool %s is empty' % pool)
+        self.created.append(pool)
+        return fakes.Resource(id='fip-%s' % pool, ip='10.1.0.1', pool=pool)
+
+    def delete(self, ip):
+        self.deleted.append(ip.id)
+
+
+class FakeNovaVolumes(object):
+
+    def __init__(self, cinder):
+        self.cinder = cinder
+
+    def create_server_volume(self, server_id, volume_id, device):
+        self.cinder.volumes.resources[volume_id].status = 'in-use'
+        self.cinder.volumes.devices[volume_id] = device
+
+    def delete_server_volume(self, server_id, volume_id):
+        self.cinder.volumes.resources[volume_id].status = 'available'
+        del self.cinder.volumes.devices[volume_id]
+
+
+class FakeCinderVolumes(fakes.Manager):
+
+    def __init__(self):
+        super(FakeCinderVolumes, self).__init__(fakes.Resource(
+            id='old', display_name='data', status='available'))
+        self.devices = {}
+
+    def create(self, size, display_name, imageRef=None):
+        return self.add(('creating', 'available'), id='new',
+                        display_name=display_name, status='creating',
+                        size=size)
+
+
+class FakeNeutron(object):
+
+    def __init__(self):
+        self.deleted = []
+
+    def create_port(self, body):
+        return {'port': {'id': 'port-%s' % body['port']['network_id']}}
+
+    def delete_port(self, port_id):
+        self.deleted.append(port_id)
+
+
+class TestProvision(base.TestCase):
+
+    def setUp(self):
+        super(TestProvision, self).setUp()
+        self.server = fakes.Resource(id='s1', status='BUILD')
+        self.cinder = fakes.Resource(volumes=FakeCinderVolumes())
+        self.nova = fakes.Resource(
+            servers=FakeServers(self.server),
+            floating_ips=FakeFloatingIPs(),
+            volumes=FakeNovaVolumes(self.cinder))
+
+    def test_everything_attached_once_active(self):
+        server = provision.provision(
+            self.nova, self.cinder, FakeNeutron(), self.server,
+            ip_pools=['public', 'private'], floating_ips=['10.9.9.9'],
+            volumes=[{'display_name': 'data', 'device': '/dev/vdb'},
+                     {'display_name': 'logs', 'size': 5}],
+            networks=['net1'], interval=0)
+        self.assertEqual('ACTIVE', server.status)
+        self.assertEqual(
+            ['10.1.0.1', '10.9.9.9'], sorted(self.nova.servers.floating_ips))
+        self.assertEqual(['public'], self.nova.floating_ips.created)
+        self.assertEqual(['port-net1'], self.nova.servers.ports)
+        self.assertEqual(
+            {'old': '/dev/vdb', 'new': None}, self.cinder.volumes.devices)
+
+    def test_failed_boot(self):
+        self.nova.servers.server.statuses = ['ERROR']
+        error = self.assertRaises(
+            provision.ProvisionError, provision.provision,
+            self.nova, self.cinder, None, self.server,
+            floating_ips=['10.9.9.9'], interval=0)
+        self.assertIn('status is ERROR', str(error))
+        self.assertEqual([], self.nova.servers.floating_ips)
+
+    def test_floating_ip_from_next_pool(self):
+        self.nova.floating_ips.empty = ('public',)
+        provision.provision(
+            self.nova, self.cinder, None, self.server,
+            ip_pools=['public', 'private'], interval=0)
+        self.assertEqual(['private'], self.nova.floating_ips.created)
+        self.assertEqual(['10.1.0.1'], self.nova.servers.floating_ips)
+
+    def test_no_pool_has_floating_ip(self):
+        self.nova.floating_ips.empty = ('public', 'private')
+        error = self.assertRaises(
+            provision.ProvisionError, provision.provision,
+            self.nova, self.cinder, None, self.server,
+            ip_pools=['public', 'private'], interval=0)
+        self.assertIn('pool private is empty', str(error))
+
+    def test_failure_deletes_what_was_created(self):
+        neutron = FakeNeutron()
+        self.nova.servers.broken = True
+        self.assertRaises(
+            provision.ProvisionError, provision.provision,
+            self.nova, self.cinder, neutron, self.server,
+            ip_pools=['public'],
+            volumes=[{'display_name': 'data'},
+                     {'display_name': 'logs', 'size': 5}],
+            networks=['net1'], interval=0)
+        self.assertEqual(['fip-public'], self.nova.floating_ips.deleted)
+        self.assertEqual(['port-net1'], neutron.deleted)
+        # The volume that was there before is left alone
+        self.assertEqual(['new'], self.cinder.volumes.deleted)
+
+    def test_block_device_mapping(self):
+        (mapping, names) = provision.block_device_mapping(
+            self.cinder, [
+                {'display_name': 'data', 'device': '/dev/vdb'},
+                {'display_name': 'scratch', 'size': 5, 'device': '/dev/vdc',
+                 'delete_on_termination': True},
+                {'display_name': 'root2', 'size': 10, 'device': '/dev/vdd',
+                 'image': 'img'},
+            ])
+        self.assertEqual([
+            dict(boot_index=-1, destination_type='volume',
+                 delete_on_termination=False, device_name='/dev/vdb',
+                 source_type='volume', uuid='old'),
+            dict(boot_index=-1, destination_type='volume',
+                 delete_on_termination=True, device_name='/dev/vdc',
+                 source_type='blank', volume_size=5),
+            dict(boot_index=-1, destination_type='volume',
+                 delete_on_termination=False, device_name='/dev/vdd',
+                 source_type='image', uuid='img', volume_size=10),
+        ], mapping)
+        self.assertEqual(['scratch', 'root2'], names)
+
+    def test_block_device_mapping_needs_device_for_new_volumes(self):
+        self.assertRaises(
+            provision.ProvisionError, provision.block_device_mapping,
+            self.cinder, [{'display_name': 'scratch', 'size': 5}])
+
+    def test_name_volumes(self):
+        renamed = {}
+
+        class Volumes(object):
+            def get_server_volumes(self, server_id):
+                # The devices asked for were /dev/vdc and /dev/vdd
+                return [fakes.Resource(device='/dev/vdd', volumeId='v3'),
+                        fakes.Resource(device='/dev/vdb', volumeId='old'),
+                        fakes.Resource(device='/dev/vdc', volumeId='v2')]
+
+        class CinderVolumes(object):
+            def update(self, volume_id, display_name):
+                renamed[volume_id] = display_name
+
+        self.nova.volumes = Volumes()
+        self.cinder.volumes = CinderVolumes()
+        mapping = [dict(source_type='blank'),
+                   dict(source_type='volume', uuid='old'),
+                   dict(source_type='image', uuid='img')]
+        provision.name_volumes(
+            self.nova, self.cinder, 's1', mapping, ['scratch', 'root2'])
+        self.assertEqual({'v2': 'scratch', 'v3': 'root2'}, renamed)
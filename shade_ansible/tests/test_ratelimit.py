@@ -0,0 +1,124 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_ratelimit
+----------------------------------
+
+Tests for the API rate governor and the client wrapping it relies on.
+"""
+
+import fixtures
+
+from shade_ansible import clients
+from shade_ansible import ratelimit
+from shade_ansible import store
+from shade_ansible.tests import base
+
+
+class FakeManager(object):
+
+    def list(self):
+        return ['server']
+
+
+class FakeClient(object):
+
+    format = 'xml'
+
+    def __init__(self):
+        self.servers = FakeManager()
+
+
+class FakeCloud(object):
+
+    name = 'fake'
+    region = 'region'
+
+    def __init__(self):
+        self._nova = FakeClient()
+
+    @property
+    def nova_client(self):
+        return self._nova
+
+    def list_servers(self):
+        return self.nova_client.servers.list()
+
+
+class TestRateLimit(base.TestCase):
+
+    def setUp(self):
+        super(TestRateLimit, self).setUp()
+        self.store = store.Store(
+            'ratelimit', path=self.useFixture(fixtures.TempDir()).path)
+
+    def test_parse_limits_number(self):
+        self.assertEqual(
+            {'default': (4.0, 4.0)}, ratelimit.parse_limits('4'))
+
+    def test_parse_limits_dict(self):
+        self.assertEqual(
+            {'compute': (2.0, 2.0), 'volume': (0.5, 3.0)},
+            ratelimit.parse_limits(
+                {'compute': 2, 'volume': {'rate': 0.5, 'burst': 3}}))
+
+    def test_parse_limits_rejects_negative(self):
+        self.assertRaises(ValueError, ratelimit.parse_limits, {'compute': -1})
+
+    def test_bucket_goes_into_debt(self):
+        bucket = ratelimit.TokenBucket(self.store, 'key', 1.0, 2.0)
+        self.assertEqual(0.0, bucket.reserve())
+        self.assertEqual(0.0, bucket.reserve())
+        self.assertAlmostEqual(1.0, bucket.reserve(), places=1)
+        self.assertAlmostEqual(2.0, bucket.reserve(), places=1)
+
+    def test_governor_wraps_cloud_calls(self):
+        governor = ratelimit.Governor(
+            {'compute': {'rate': 1000, 'burst': 2}}, 'fake', self.store)
+        cloud = clients.wrap_cloud(FakeCloud(), governor)
+        self.assertEqual(['server'], cloud.list_servers())
+        self.assertEqual(['server'], cloud.nova_client.servers.list())
+        with self.store.transaction() as data:
+            level, stamp = data['fake:compute']
+        self.assertLess(level, 1)
+
+    def test_governor_ignores_unlimited_service(self):
+        governor = ratelimit.Governor({'volume': 1}, 'fake', self.store)
+        governor.acquire('compute')
+        with self.store.transaction() as data:
+            self.assertEqual({}, data)
+
+    def test_proxy_passes_attribute_writes(self):
+        cloud = clients.wrap_cloud(
+            FakeCloud(), lambda s, n, f, a, k: f(*a, **k))
+        cloud.nova_client.format = 'json'
+        self.assertEqual('json', cloud._nova.format)
+
+    def test_scope_tells_endpoints_and_projects_apart(self):
+        cloud = FakeCloud()
+        cloud.auth = dict(auth_url='https://a/v2.0', project_name='p1')
+        first = store.scope(cloud)
+        cloud.auth = dict(auth_url='https://b/v2.0', project_name='p1')
+        self.assertNotEqual(first, store.scope(cloud))
+        cloud.auth = dict(auth_url='https://a/v2.0', project_name='p2')
+        self.assertNotEqual(first, store.scope(cloud))
+        self.assertEqual('https://a/v2.0:p1:region', first)
+
+    def test_scope_of_clouds_without_auth_dict(self):
+        cloud = FakeCloud()
+        cloud.auth_url = 'https://a/v2.0'
+        cloud.project_name = 'p1'
+        self.assertEqual('https://a/v2.0:p1:region', store.scope(cloud))
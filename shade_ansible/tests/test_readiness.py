@@ -0,0 +1,110 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_readiness
+----------------------------------
+
+Tests for the readiness predictions steering waits.
+"""
+
+import fixtures
+
+from shade_ansible import batch
+from shade_ansible import readiness
+from shade_ansible import store
+from shade_ansible.tests import base
+from shade_ansible.tests import fakes
+
+
+class TestReadiness(base.TestCase):
+
+    def setUp(self):
+        super(TestReadiness, self).setUp()
+        self.shared = store.Store(
+            'readiness', path=self.useFixture(fixtures.TempDir()).path)
+
+    def predictor(self, size=10):
+        return readiness.Predictor(
+            ('fake', 'region', 'volume', 'ssd', readiness.size_bucket(size)),
+            shared=self.shared)
+
+    def test_size_bucket(self):
+        self.assertEqual('1', readiness.size_bucket(1))
+        self.assertEqual('16', readiness.size_bucket(10))
+        self.assertEqual('16', readiness.size_bucket(16))
+        self.assertEqual('1024', readiness.size_bucket(1000))
+        self.assertEqual('unknown', readiness.size_bucket(None))
+
+    def test_moving_average(self):
+        predictor = self.predictor()
+        self.assertIsNone(predictor.expected())
+        predictor.record(10)
+        self.assertEqual(10, predictor.expected())
+        predictor.record(20)
+        self.assertAlmostEqual(13.0, predictor.expected())
+        # Other sizes keep their own history
+        self.assertIsNone(self.predictor(size=500).expected())
+
+    def test_ready_after(self):
+        self.assertEqual(90, readiness.ready_after(fakes.Resource(
+            created_at='2014-10-05T12:00:00.000000',
+            updated_at='2014-10-05T12:01:30.000000')))
+        self.assertEqual(3600, readiness.ready_after(fakes.Resource(
+            created_at='2014-10-05T23:30:00Z',
+            updated_at='2014-10-06T00:30:00Z')))
+        self.assertIsNone(readiness.ready_after(fakes.Resource(
+            created_at='2014-10-05T12:00:00', updated_at=None)))
+        self.assertIsNone(readiness.ready_after(fakes.Resource()))
+
+    def test_record_ready(self):
+        predictor = self.predictor()
+        predictor.record_ready(fakes.Resource(
+            created_at='2014-10-05T12:00:00',
+            updated_at='2014-10-05T12:00:40'), waited=300)
+        self.assertEqual(40, predictor.expected())
+        # Without timestamps the wait is all there is to go by
+        other = self.predictor(size=500)
+        other.record_ready(fakes.Resource(), waited=300)
+        self.assertEqual(300, other.expected())
+
+    def test_schedule_without_history_backs_off(self):
+        interval = self.predictor().schedule()
+        self.assertEqual(
+            [1, 1, 2, 4, 5, 5], [interval(e) for e in (0, 1, 2, 4, 8, 60)])
+
+    def test_schedule_sleeps_until_expected(self):
+        predictor = self.predictor()
+        predictor.record(100)
+        interval = predictor.schedule()
+        self.assertEqual(80, interval(0))
+        self.assertEqual(30, interval(50))
+        self.assertEqual(5, interval(80))
+        self.assertEqual(30, interval(500))
+
+    def test_poll_takes_an_interval_schedule(self):
+        listed = []
+
+        def listing():
+            listed.append(1)
+            status = 'available' if len(listed) > 2 else 'creating'
+            return [{'id': 'v', 'status': status}]
+
+        elapsed = []
+        done, errors = batch.poll(
+            listing, ['v'], batch.status_check(('available',)), timeout=10,
+            interval=lambda e: elapsed.append(e) or 0)
+        self.assertEqual(['v'], list(done))
+        self.assertEqual(2, len(elapsed))
@@ -0,0 +1,95 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_recording
+----------------------------------
+
+Tests for the HTTP record/replay harness.
+"""
+
+import json
+import os
+
+import fixtures
+import requests
+
+from shade_ansible import recording
+from shade_ansible.tests import base
+
+SERVERS_URL = 'http://nova.example.com:8774/v2/servers'
+
+INTERACTIONS = [
+    dict(method='GET', url=SERVERS_URL, status=200, elapsed=0.5,
+         headers={'Content-Type': 'application/json'},
+         body='{"servers": [{"status": "BUILD"}]}'),
+    dict(method='GET', url=SERVERS_URL, status=200, elapsed=0.5,
+         headers={'Content-Type': 'application/json'},
+         body='{"servers": [{"status": "ACTIVE"}]}'),
+]
+
+
+class TestRecording(base.TestCase):
+
+    def setUp(self):
+        super(TestRecording, self).setUp()
+        self.path = self.useFixture(fixtures.TempDir()).path
+        self.fixture = os.path.join(self.path, 'servers.json')
+        with open(self.fixture, 'w') as f:
+            json.dump(INTERACTIONS, f)
+
+    def _status(self):
+        return requests.get(SERVERS_URL).json()['servers'][0]['status']
+
+    def test_replay_in_order_then_repeat_last(self):
+        with recording.Player(self.fixture, latency='none') as player:
+            self.assertEqual('BUILD', self._status())
+            self.assertEqual('ACTIVE', self._status())
+            self.assertEqual('ACTIVE', self._status())
+        self.assertEqual(3, player.stats()['calls'])
+        self.assertEqual(0, player.stats()['api_time'])
+
+    def test_replay_recorded_latency(self):
+        player = recording.Player(self.fixture)
+        self.assertEqual(0.5, player.delay(INTERACTIONS[0]))
+        player = recording.Player(self.fixture, latency='0.1')
+        self.assertEqual(0.1, player.delay(INTERACTIONS[0]))
+
+    def test_replay_unknown_request(self):
+        with recording.Player(self.fixture, latency='none'):
+            self.assertRaises(
+                recording.ReplayError, requests.delete, SERVERS_URL)
+
+    def test_record_round_trip(self):
+        recorded = os.path.join(self.path, 'recorded.json')
+        # The player stands in for the cloud underneath the recorder.
+        with recording.Player(self.fixture, latency='none'):
+            with recording.Recorder(recorded):
+                self._status()
+                self._status()
+        with open(recorded) as f:
+            interactions = json.load(f)
+        self.assertEqual(
+            [i['body'] for i in INTERACTIONS],
+            [i['body'] for i in interactions])
+        self.assertEqual(200, interactions[1]['status'])
+
+    def test_install_from_environ(self):
+        self.assertIsNone(recording.install_from_environ({}))
+        player = recording.install_from_environ(dict(
+            SHADE_ANSIBLE_REPLAY=self.fixture,
+            SHADE_ANSIBLE_REPLAY_LATENCY='none'))
+        self.addCleanup(player.uninstall)
+        self.assertEqual('BUILD', self._status())
@@ -0,0 +1,109 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_retry
+----------------------------------
+
+Tests for the transient-error retry layer.
+"""
+
+import errno
+
+from shade_ansible import retry
+from shade_ansible.tests import base
+
+
+class HTTPError(Exception):
+
+    def __init__(self, code):
+        super(HTTPError, self).__init__(code)
+        self.code = code
+
+
+class Flaky(object):
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+class TestRetry(base.TestCase):
+
+    def setUp(self):
+        super(TestRetry, self).setUp()
+        self.retrier = retry.Retrier(attempts=2, delay=0, max_delay=0)
+
+    def test_call_kind(self):
+        self.assertEqual(retry.READ, retry.call_kind('servers.list'))
+        self.assertEqual(retry.READ, retry.call_kind('client.get'))
+        self.assertEqual(retry.DELETE, retry.call_kind('delete_network'))
+        self.assertEqual(
+            retry.DELETE, retry.call_kind('servers.remove_floating_ip'))
+        self.assertEqual(retry.IDEMPOTENT, retry.call_kind('servers.update'))
+        self.assertEqual(retry.CREATE, retry.call_kind('servers.create'))
+        self.assertEqual(retry.CREATE, retry.call_kind('client.post'))
+
+    def test_read_retried_on_server_error(self):
+        func = Flaky(HTTPError(503), HTTPError(500))
+        self.assertEqual('ok', self.retrier.call(func, kind=retry.READ))
+        self.assertEqual(2, self.retrier.retries)
+
+    def test_create_not_retried_after_timeout(self):
+        func = Flaky(HTTPError(504))
+        self.assertRaises(
+            HTTPError, self.retrier.call, func, kind=retry.CREATE)
+        self.assertEqual(1, func.calls)
+
+    def test_create_retried_when_rejected(self):
+        refused = IOError(errno.ECONNREFUSED, 'refused')
+        func = Flaky(HTTPError(429), refused)
+        self.assertEqual('ok', self.retrier.call(func, kind=retry.CREATE))
+        self.assertEqual(2, self.retrier.retries)
+
+    def test_delete_gone_after_retry_is_done(self):
+        func = Flaky(HTTPError(502), HTTPError(404))
+        self.assertIsNone(self.retrier.call(func, kind=retry.DELETE))
+        self.assertEqual(2, func.calls)
+
+    def test_delete_not_found_at_first_fails(self):
+        # Refused first, so nothing was deleted by this call
+        func = Flaky(HTTPError(503), HTTPError(404))
+        self.assertRaises(
+            HTTPError, self.retrier.call, func, kind=retry.DELETE)
+        func = Flaky(HTTPError(404))
+        self.assertRaises(
+            HTTPError, self.retrier.call, func, kind=retry.DELETE)
+
+    def test_attempts_are_bounded(self):
+        func = Flaky(*[HTTPError(503)] * 3)
+        self.assertRaises(HTTPError, self.retrier.call, func)
+        self.assertEqual(3, func.calls)
+
+    def test_client_errors_not_retried(self):
+        func = Flaky(HTTPError(404))
+        self.assertRaises(HTTPError, self.retrier.call, func)
+        self.assertEqual(0, self.retrier.retries)
+
+    def test_backoff_honours_retry_after(self):
+        error = HTTPError(413)
+        error.retry_after = 7
+        self.assertEqual(7, retry.Retrier().backoff(0, error))
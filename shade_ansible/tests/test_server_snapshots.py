@@ -0,0 +1,173 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_server_snapshots
+----------------------------------
+
+Tests for snapshotting many servers and pruning their old snapshots.
+"""
+
+from shade_ansible import server_snapshots
+from shade_ansible.tests import base
+from shade_ansible.tests import fakes
+
+KEY = server_snapshots.SNAPSHOT_KEY
+
+
+class FakeServers(object):
+
+    def __init__(self, images, *servers):
+        self.images = images
+        self.servers = list(servers)
+        self.broken = set()
+
+    def list(self):
+        return list(self.servers)
+
+    def create_image(self, server, name, properties):
+        if server.id in self.broken:
+            raise Exception('server is busy')
+        return self.images.add(
+            ('saving', 'active'), name=name, properties=properties,
+            status='queued').id
+
+
+class FakeImages(fakes.Manager):
+    """Images that turn active on the second listing showing them."""
+
+    prefix = 'img'
+
+    def __init__(self):
+        super(FakeImages, self).__init__()
+        self.gets = []
+        self.listings = []
+
+    def get(self, image_id):
+        self.gets.append(image_id)
+        return super(FakeImages, self).get(image_id)
+
+    def list(self, filters=None):
+        self.listings.append(filters)
+        wanted = (filters or {}).get('properties', {})
+        return [super(FakeImages, self).get(image.id)
+                for image in list(self.resources.values())
+                if all(image.properties.get(key) == value
+                       for key, value in wanted.items())]
+
+
+class TestServerSnapshots(base.TestCase):
+
+    def setUp(self):
+        super(TestServerSnapshots, self).setUp()
+        self.glance = fakes.Resource(images=FakeImages())
+        self.nova = fakes.Resource(servers=FakeServers(
+            self.glance.images, fakes.Resource(id='s1', name='web-1'),
+            fakes.Resource(id='s2', name='web-2')))
+
+    def snapshot(self, server_id, created, status='active'):
+        return self.glance.images.add(
+            name='snap', properties={KEY: server_id}, status=status,
+            created_at=created)
+
+    def test_image_name(self):
+        self.assertEqual(
+            'web-1-20141005', server_snapshots.image_name(
+                '%(server)s-%(timestamp)s', 'web-1', '20141005'))
+
+    def test_bad_image_name(self):
+        for name_format in ('%(host)s', '%(server)d', '%(server)'):
+            self.assertRaises(
+                server_snapshots.NameFormatError,
+                server_snapshots.image_name, name_format, 'web-1', 'now')
+
+    def test_find_servers(self):
+        (servers, missing) = server_snapshots.find_servers(
+            self.nova, ['web-1', 's2', 'web-3'])
+        self.assertEqual(['s2', 'web-1'], sorted(servers))
+        self.assertEqual('web-2', servers['s2'].name)
+        self.assertEqual(['web-3'], missing)
+
+    def test_create(self):
+        (servers, _) = server_snapshots.find_servers(
+            self.nova, ['web-1', 'web-2'])
+        results = {}
+        names = server_snapshots.create(
+            self.nova, self.glance, servers, 'snap-%(server)s', {'a': 'b'},
+            results, timeout=10, interval=0)
+        self.assertEqual(['web-1', 'web-2'], sorted(names))
+        self.assertEqual(
+            dict(changed=True, id='img0', name='snap-web-1'),
+            results['web-1'])
+        image = self.glance.images.resources['img0']
+        run = image.properties[server_snapshots.RUN_KEY]
+        self.assertEqual(
+            {'a': 'b', KEY: 's1', server_snapshots.RUN_KEY: run},
+            image.properties)
+        self.assertEqual('active', image.status)
+        # One listing of the run's images per turn, and no gets
+        self.assertEqual(
+            [{'properties': {server_snapshots.RUN_KEY: run}}] * 2,
+            self.glance.images.listings)
+        self.assertEqual([], self.glance.images.gets)
+
+    def test_create_failures(self):
+        self.nova.servers.broken.add('s2')
+        (servers, _) = server_snapshots.find_servers(
+            self.nova, ['web-1', 'web-2'])
+        results = {}
+        names = server_snapshots.create(
+            self.nova, self.glance, servers, '%(server)s', None, results,
+            timeout=10, interval=0)
+        self.assertEqual(['web-1'], names)
+        self.assertTrue(results['web-2']['failed'])
+        self.assertIn('server is busy', results['web-2']['msg'])
+
+    def test_create_no_wait(self):
+        (servers, _) = server_snapshots.find_servers(self.nova, ['web-1'])
+        results = {}
+        names = server_snapshots.create(
+            self.nova, self.glance, servers, '%(server)s', None, results,
+            timeout=10, wait=False)
+        self.assertEqual(['web-1'], names)
+        self.assertEqual([], self.glance.images.listings)
+
+    def test_prune(self):
+        for created in ('2014-10-01', '2014-10-03', '2014-10-02'):
+            self.snapshot('s1', created)
+        self.snapshot('s1', '2014-10-04', status='saving')
+        self.snapshot('s2', '2014-10-01')
+        self.glance.images.add(name='other', properties={}, status='active')
+        (servers, _) = server_snapshots.find_servers(
+            self.nova, ['web-1', 'web-2'])
+        results = {}
+        server_snapshots.prune(
+            self.glance, servers, ['web-1', 'web-2'], 1, results)
+        self.assertEqual(
+            {'web-1': dict(changed=True, pruned=['img0', 'img2'])},
+            dict((name, dict(r, pruned=sorted(r['pruned'])))
+                 for name, r in results.items()))
+        self.assertEqual(
+            [{'properties': {KEY: 's1'}}, {'properties': {KEY: 's2'}}],
+            sorted(self.glance.images.listings,
+                   key=lambda f: f['properties'][KEY]))
+
+    def test_prune_all(self):
+        self.snapshot('s1', '2014-10-01')
+        (servers, _) = server_snapshots.find_servers(self.nova, ['web-1'])
+        results = {'web-1': dict(changed=True, id='new')}
+        server_snapshots.prune(self.glance, servers, ['web-1'], 0, results)
+        self.assertEqual(['img0'], self.glance.images.deleted)
+        self.assertEqual(['img0'], results['web-1']['pruned'])
@@ -0,0 +1,87 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_snapshot
+----------------------------------
+
+Tests for the check-mode resource snapshot.
+"""
+
+import fixtures
+
+from shade_ansible import snapshot
+from shade_ansible import store
+from shade_ansible.tests import base
+
+
+class FakeNeutron(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def list_routers(self):
+        self.calls += 1
+        return {'routers': [
+            {'id': 'r1', 'name': 'router1', 'external_gateway_info': None},
+            {'id': 'r2', 'name': 'router2',
+             'external_gateway_info': {'network_id': 'n1'}},
+        ]}
+
+
+class FakeCloud(object):
+
+    name = 'fake'
+    region = 'region'
+
+    def __init__(self, project='p1'):
+        self.auth = dict(auth_url='https://keystone/v2.0', project_id=project)
+        self.neutron_client = FakeNeutron()
+
+
+class TestSnapshot(base.TestCase):
+
+    def setUp(self):
+        super(TestSnapshot, self).setUp()
+        self.store = store.Store(
+            'snapshot', path=self.useFixture(fixtures.TempDir()).path)
+        self.cloud = FakeCloud()
+
+    def test_find(self):
+        resources = snapshot.Snapshot(self.cloud, ttl=60, shared=self.store)
+        self.assertEqual('r2', resources.find('routers', name='router2')['id'])
+        self.assertIsNone(resources.find('routers', name='router3'))
+
+    def test_listing_shared_between_snapshots(self):
+        for i in range(3):
+            resources = snapshot.Snapshot(
+                self.cloud, ttl=60, shared=self.store)
+            resources.find('routers', name='router1')
+        self.assertEqual(1, self.cloud.neutron_client.calls)
+
+    def test_stale_listing_refetched(self):
+        for i in range(2):
+            resources = snapshot.Snapshot(
+                self.cloud, ttl=-1, shared=self.store)
+            resources.list('routers')
+        self.assertEqual(2, self.cloud.neutron_client.calls)
+
+    def test_listing_not_shared_between_projects(self):
+        other = FakeCloud(project='p2')
+        for cloud in (self.cloud, other):
+            snapshot.Snapshot(cloud, ttl=60, shared=self.store).list(
+                'routers')
+        self.assertEqual(1, self.cloud.neutron_client.calls)
+        self.assertEqual(1, other.neutron_client.calls)
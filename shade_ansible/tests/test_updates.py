@@ -0,0 +1,253 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_updates
+----------------------------------
+
+Tests for the in-place updates of existing servers.
+"""
+
+from shade_ansible.tests import base
+from shade_ansible import updates
+
+
+class FakeServer(object):
+
+    def __init__(self, server_id, name, image='img1', flavor='1',
+                 metadata=None):
+        self.id = server_id
+        self.name = name
+        self.status = 'ACTIVE'
+        self.image = {'id': image} if image else ''
+        self.flavor = {'id': flavor}
+        self.metadata = metadata or {}
+
+
+class FakeServers(object):
+    """Servers whose changes show up after one listing."""
+
+    def __init__(self, *servers):
+        self.servers = dict((server.id, server) for server in servers)
+        self.pending = []
+        self.calls = []
+        self.broken = set()
+
+    def _call(self, action, server, change=None):
+        if server.id in self.broken:
+            raise Exception('no can do')
+        self.calls.append((action, server.id))
+        if change:
+            self.pending.append(change)
+
+    def _apply(self):
+        for change in self.pending:
+            change()
+        self.pending = []
+
+    def get(self, server_id):
+        self._apply()
+        return self.servers[server_id]
+
+    def list(self):
+        self._apply()
+        return list(self.servers.values())
+
+    def rebuild(self, server, image):
+        server = self.servers[server.id]
+
+        def change():
+            server.image = {'id': image}
+            server.status = 'ACTIVE'
+        self._call('rebuild', server, change)
+        server.status = 'REBUILD'
+
+    def resize(self, server, flavor):
+        server = self.servers[server.id]
+
+        def change():
+            server.flavor = {'id': flavor}
+            server.status = 'VERIFY_RESIZE'
+        self._call('resize', server, change)
+        server.status = 'RESIZE'
+
+    def confirm_resize(self, server):
+        server = self.servers[server.id]
+
+        def change():
+            server.status = 'ACTIVE'
+        self._call('confirm_resize', server, change)
+
+    def set_meta(self, server, metadata):
+        self._call('set_meta', server)
+        self.servers[server.id].metadata.update(metadata)
+
+    def delete_meta(self, server, keys):
+        self._call('delete_meta', server)
+        for key in keys:
+            del self.servers[server.id].metadata[key]
+
+
+class FakeNova(object):
+
+    def __init__(self, *servers):
+        self.servers = FakeServers(*servers)
+
+
+class TestRebuild(base.TestCase):
+
+    def test_image_id(self):
+        self.assertEqual('img1', updates.image_id({'id': 'img1'}))
+        self.assertIsNone(updates.image_id(''))
+
+    def test_rebuilds_drifted_servers(self):
+        nova = FakeNova(FakeServer('s1', 'web-1'),
+                        FakeServer('s2', 'web-2', image='img2'))
+        servers = dict((s.name, s) for s in nova.servers.list())
+        (done, errors, notes) = updates.rebuild(
+            nova, servers, 'img2', timeout=10, interval=0)
+        self.assertEqual([('rebuild', 's1')], nova.servers.calls)
+        self.assertEqual(['web-1'], list(done))
+        self.assertEqual({'id': 'img2'}, done['web-1'].image)
+        self.assertEqual('ACTIVE', done['web-1'].status)
+        self.assertEqual(({}, {}), (errors, notes))
+
+    def test_volume_backed_servers_reported(self):
+        nova = FakeNova(FakeServer('s1', 'web-1', image=''))
+        servers = {'web-1': nova.servers.get('s1')}
+        (done, errors, notes) = updates.rebuild(
+            nova, servers, 'img2', timeout=10, interval=0)
+        self.assertEqual([], nova.servers.calls)
+        self.assertEqual(({}, {}), (done, errors))
+        self.assertEqual(
+            {'web-1': {'not_rebuilt': updates.VOLUME_BACKED}}, notes)
+
+    def test_failed_rebuild(self):
+        nova = FakeNova(FakeServer('s1', 'web-1'))
+        nova.servers.broken.add('s1')
+        servers = {'web-1': nova.servers.get('s1')}
+        (done, errors, notes) = updates.rebuild(
+            nova, servers, 'img2', timeout=10, interval=0)
+        self.assertEqual({}, done)
+        self.assertIn('Error in rebuilding instance', errors['web-1'])
+
+    def test_no_wait(self):
+        nova = FakeNova(FakeServer('s1', 'web-1'))
+        servers = {'web-1': nova.servers.get('s1')}
+        (done, errors, notes) = updates.rebuild(
+            nova, servers, 'img2', timeout=10, wait=False, interval=0)
+        self.assertEqual(['web-1'], list(done))
+        self.assertEqual({}, errors)
+
+
+class TestResize(base.TestCase):
+
+    def test_resizes_and_confirms_drifted_servers(self):
+        nova = FakeNova(FakeServer('s1', 'web-1'),
+                        FakeServer('s2', 'web-2', flavor=2))
+        servers = dict((s.name, s) for s in nova.servers.list())
+        (done, errors, notes) = updates.resize(
+            nova, servers, 2, timeout=10, interval=0)
+        self.assertEqual(
+            [('resize', 's1'), ('confirm_resize', 's1')], nova.servers.calls)
+        self.assertEqual(['web-1'], list(done))
+        self.assertEqual({'id': '2'}, done['web-1'].flavor)
+        self.assertEqual('ACTIVE', done['web-1'].status)
+        self.assertEqual(({}, {}), (errors, notes))
+
+    def test_nothing_drifted(self):
+        nova = FakeNova(FakeServer('s1', 'web-1'))
+        servers = {'web-1': nova.servers.get('s1')}
+        self.assertEqual(
+            ({}, {}, {}),
+            updates.resize(nova, servers, '1', timeout=10, interval=0))
+        self.assertEqual([], nova.servers.calls)
+
+    def test_failed_resize_leaves_others_going(self):
+        nova = FakeNova(FakeServer('s1', 'web-1'),
+                        FakeServer('s2', 'web-2'))
+        nova.servers.broken.add('s2')
+        servers = dict((s.name, s) for s in nova.servers.list())
+        (done, errors, notes) = updates.resize(
+            nova, servers, '2', timeout=10, interval=0)
+        self.assertEqual(['web-1'], list(done))
+        self.assertEqual(['web-2'], list(errors))
+        self.assertIn('Error in resizing instance', errors['web-2'])
+
+    def test_resize_that_errors(self):
+        nova = FakeNova(FakeServer('s1', 'web-1'))
+        servers = {'web-1': nova.servers.get('s1')}
+        nova.servers.resize = lambda server, flavor: setattr(
+            server, 'status', 'ERROR')
+        (done, errors, notes) = updates.resize(
+            nova, servers, '2', timeout=10, interval=0)
+        self.assertEqual({}, done)
+        self.assertEqual(
+            {'web-1': 'Error in resizing instance: status is ERROR'}, errors)
+
+
+class TestMetadata(base.TestCase):
+
+    def test_wanted_metadata(self):
+        self.assertEqual(
+            {'a': '1', 'b': u'caf\xe9', 'c': 'True'},
+            updates.wanted_metadata({'a': 1, 'b': u'caf\xe9', 'c': True}))
+
+    def test_metadata_diff(self):
+        current = {'a': '1', 'b': '2', 'c': '3'}
+        wanted = {'a': '1', 'b': '5', 'd': '4'}
+        self.assertEqual(
+            ({'b': '5', 'd': '4'}, set()),
+            updates.metadata_diff(current, wanted))
+        self.assertEqual(
+            ({'b': '5', 'd': '4'}, set(['c'])),
+            updates.metadata_diff(current, wanted, purge=True))
+
+    def test_metadata_diff_in_line(self):
+        self.assertEqual(
+            ({}, set()), updates.metadata_diff({'a': '1'}, {'a': '1'}, True))
+
+    def test_update_metadata(self):
+        nova = FakeNova(
+            FakeServer('s1', 'web-1', metadata={'role': 'web', 'x': '1'}),
+            FakeServer('s2', 'web-2', metadata={'role': 'db'}),
+            FakeServer('s3', 'web-3', metadata={'role': 'web'}))
+        servers = dict((s.name, s) for s in nova.servers.list())
+        (done, errors, notes) = updates.update_metadata(
+            nova, servers, {'role': 'web'})
+        self.assertEqual([('set_meta', 's2')], nova.servers.calls)
+        self.assertEqual(['web-2'], list(done))
+        self.assertEqual({'role': 'web'}, done['web-2'].metadata)
+        self.assertEqual({'role': 'web', 'x': '1'}, servers['web-1'].metadata)
+
+    def test_update_metadata_purge(self):
+        nova = FakeNova(
+            FakeServer('s1', 'web-1', metadata={'role': 'web', 'x': '1'}))
+        servers = {'web-1': nova.servers.get('s1')}
+        (done, errors, notes) = updates.update_metadata(
+            nova, servers, {'role': 'web', 'count': 2}, purge=True)
+        self.assertEqual(
+            [('set_meta', 's1'), ('delete_meta', 's1')], nova.servers.calls)
+        self.assertEqual(
+            {'role': 'web', 'count': '2'}, done['web-1'].metadata)
+
+    def test_failed_update(self):
+        nova = FakeNova(FakeServer('s1', 'web-1'))
+        nova.servers.broken.add('s1')
+        servers = {'web-1': nova.servers.get('s1')}
+        (done, errors, notes) = updates.update_metadata(
+            nova, servers, {'role': 'web'})
+        self.assertEqual({}, done)
+        self.assertIn('Error in updating the metadata of', errors['web-1'])
@@ -0,0 +1,260 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+test_volumes
+----------------------------------
+
+Tests for finding and creating many volumes at once.
+"""
+
+from shade_ansible.tests import base
+from shade_ansible import volumes
+
+
+class Volume(object):
+
+    def __init__(self, volume_id, display_name, status='available',
+                 metadata=None, attachments=()):
+        self.id = volume_id
+        self.display_name = display_name
+        self.status = status
+        self.metadata = metadata or {}
+        self.attachments = list(attachments)
+        self._info = dict(id=volume_id, display_name=display_name)
+
+
+class FakeVolumes(object):
+    """Volumes whose display_name filter matches on substrings."""
+
+    def __init__(self, *existing):
+        self.volumes = dict((v.id, v) for v in existing)
+        self.searches = []
+        self.created = []
+
+    def list(self, search_opts=None):
+        name = (search_opts or {}).get('display_name')
+        self.searches.append(name)
+        return [v for v in self.volumes.values()
+                if name is None or name in v.display_name]
+
+    def delete(self, volume):
+        if volume.status == 'in-use':
+            raise Exception('volume is attached')
+        del self.volumes[volume.id]
+
+    def create(self, size, display_name, **kwargs):
+        if display_name == 'broken':
+            raise Exception('over quota')
+        volume = Volume('new-%s' % display_name, display_name, 'creating')
+        self.volumes[volume.id] = volume
+        self.created.append((display_name, size))
+        return volume
+
+
+class FakeCinder(object):
+
+    def __init__(self, *existing):
+        self.volumes = FakeVolumes(*existing)
+
+
+class FakeNovaVolumes(object):
+
+    def __init__(self, cinder):
+        self.cinder = cinder
+        self.detached = []
+
+    def delete_server_volume(self, server_id, volume_id):
+        self.detached.append((server_id, volume_id))
+        volume = self.cinder.volumes.volumes[volume_id]
+        volume.status = 'available'
+        volume.attachments = []
+
+
+class FakeNova(object):
+
+    def __init__(self, cinder):
+        self.volumes = FakeNovaVolumes(cinder)
+
+
+class TestVolumes(base.TestCase):
+
+    def test_find_filters_server_side_and_matches_exactly(self):
+        cinder = FakeCinder(Volume('v1', 'data-old'), Volume('v2', 'data'))
+        self.assertEqual('v2', volumes.find(cinder, 'data').id)
+        self.assertIsNone(volumes.find(cinder, 'dat'))
+        self.assertEqual(['data', 'dat'], cinder.volumes.searches)
+
+    def test_spec(self):
+        defaults = dict(size=10, volume_type='ssd', display_name=None,
+                        image_id=None, other='ignored')
+        self.assertEqual(
+            dict(size=20, volume_type='ssd', display_name='logs',
+                 display_description=None, image_id=None, image_name=None,
+                 snapshot_id=None),
+            volumes.spec(defaults, dict(display_name='logs', size=20)))
+
+    def test_ensure(self):
+        cinder = FakeCinder(Volume('v1', 'data'))
+        specs = [volumes.spec(dict(size=10), dict(display_name=name))
+                 for name in ('data', 'logs', 'broken')]
+        specs.append(volumes.spec({}, dict(display_name='nosize')))
+        (results, created) = volumes.ensure(
+            cinder, specs, lambda params: dict(
+                size=params['size'], display_name=params['display_name']))
+        self.assertEqual([('logs', 10)], cinder.volumes.created)
+        self.assertEqual(
+            {'new-logs': ('logs', dict(size=10, display_name='logs'))},
+            created)
+        self.assertEqual(
+            dict(changed=False, id='v1', info=dict(
+                id='v1', display_name='data')),
+            results['data'])
+        self.assertTrue(results['logs']['changed'])
+        self.assertIn('over quota', results['broken']['msg'])
+        self.assertIn('size is required', results['nosize']['msg'])
+
+    def test_select(self):
+        listed = [
+            Volume('v1', 'ci-1-data', metadata={'build': '42'}),
+            Volume('v2', 'ci-1-logs', metadata={'build': '43'}),
+            Volume('v3', 'prod-data', metadata={'build': '42'}),
+            dict(id='v4', display_name=None, metadata=None),
+        ]
+
+        def ids(**kwargs):
+            return [volumes._get(v, 'id')
+                    for v in volumes.select(listed, **kwargs)]
+
+        self.assertEqual(['v1', 'v2'], ids(prefix='ci-1-'))
+        # Cinder hands metadata values back as strings
+        self.assertEqual(['v1', 'v3'], ids(metadata={'build': 42}))
+        self.assertEqual(['v1'], ids(prefix='ci-', metadata={'build': 42}))
+        self.assertEqual(
+            ['v2', 'v3'], ids(names=set(['ci-1-logs', 'prod-data', 'x'])))
+
+    def test_missing(self):
+        listed = [Volume('v1', 'data'), dict(id='v2', display_name='logs')]
+        self.assertEqual(
+            ['scratch', 'tmp'],
+            volumes.missing(['scratch', 'data', 'tmp', 'logs'], listed))
+
+    def test_delete_keyed_by_id(self):
+        # Two volumes of the same name, which cinder allows
+        cinder = FakeCinder(Volume('v1', 'data'), Volume('v2', 'data'),
+                            Volume('v3', 'logs'))
+        results = volumes.delete(
+            cinder, None, list(cinder.volumes.volumes.values()), 10,
+            interval=0)
+        self.assertEqual(['v1', 'v2', 'v3'], sorted(results))
+        self.assertEqual(
+            dict(changed=True, display_name='data', result='Volume Deleted'),
+            results['v2'])
+        self.assertEqual({}, cinder.volumes.volumes)
+
+    def test_delete_detaches_first(self):
+        cinder = FakeCinder(
+            Volume('v1', 'data', 'in-use', attachments=[{'server_id': 's1'}]),
+            Volume('v2', 'logs', 'in-use', attachments=[{'server_id': 's1'}]))
+        nova = FakeNova(cinder)
+        doomed = list(cinder.volumes.volumes.values())
+        results = volumes.delete(
+            cinder, nova, doomed, 10, detach=True, interval=0)
+        self.assertEqual(
+            [('s1', 'v1'), ('s1', 'v2')], sorted(nova.volumes.detached))
+        self.assertTrue(all(r['changed'] for r in results.values()))
+
+    def test_attached_volume_not_detached(self):
+        cinder = FakeCinder(
+            Volume('v1', 'data', 'in-use', attachments=[{'server_id': 's1'}]),
+            Volume('v2', 'logs'))
+        results = volumes.delete(
+            cinder, None, list(cinder.volumes.volumes.values()), 10,
+            interval=0)
+        self.assertTrue(results['v1']['failed'])
+        self.assertIn('volume is attached', results['v1']['msg'])
+        self.assertTrue(results['v2']['changed'])
+
+
+class TestAttachments(base.TestCase):
+
+    def test_wanted_attachments(self):
+        listings = []
+
+        def listing():
+            listings.append(1)
+            return [('v1', 'data'), ('v2', 'logs')]
+
+        self.assertEqual(
+            {'v1': '/dev/vdb', 'v2': None, 'v9': '/dev/vdc'},
+            volumes.wanted_attachments(
+                [dict(volume_name='data', device='/dev/vdb'),
+                 dict(volume_name='logs'),
+                 dict(volume_id='v9', device='/dev/vdc')], listing))
+        self.assertEqual(1, len(listings))
+
+    def test_wanted_attachments_by_id_need_no_listing(self):
+        def listing():
+            raise AssertionError('listed')
+
+        self.assertEqual(
+            {'v9': None},
+            volumes.wanted_attachments([dict(volume_id='v9')], listing))
+
+    def test_wanted_attachments_unknown_name(self):
+        self.assertRaises(
+            volumes.VolumeNotFound, volumes.wanted_attachments,
+            [dict(volume_name='nope')], lambda: [('v1', 'data')])
+
+    def test_attachment_changes(self):
+        wanted = {'v1': '/dev/vdb', 'v2': None, 'v3': '/dev/vdd'}
+        attached = {'v1': '/dev/vdb', 'v3': '/dev/vdc', 'v4': '/dev/vde'}
+        # v2 is missing and v3 is on the wrong device, so it moves
+        self.assertEqual(
+            (['v3'], ['v2', 'v3']),
+            volumes.attachment_changes(wanted, attached))
+        self.assertEqual(
+            (['v3', 'v4'], ['v2', 'v3']),
+            volumes.attachment_changes(wanted, attached, exclusive=True))
+
+    def test_attachment_changes_absent(self):
+        self.assertEqual(
+            (['v1'], []),
+            volumes.attachment_changes(
+                {'v1': None, 'v2': None}, {'v1': '/dev/vdb'}, 'absent'))
+
+    def test_attachment_changes_in_line(self):
+        self.assertEqual(
+            ([], []),
+            volumes.attachment_changes(
+                {'v1': None}, {'v1': '/dev/vdb'}, exclusive=True))
+
+    def test_root_volume(self):
+        attached = {'v1': '/dev/vdb', 'v2': '/dev/vda'}
+        self.assertEqual(
+            'v2', volumes.root_volume(dict(image=''), attached))
+        self.assertIsNone(
+            volumes.root_volume(dict(image={'id': 'img'}), attached))
+        server = {'image': '', volumes.ROOT_DEVICE_ATTR: '/dev/vdb'}
+        self.assertEqual('v1', volumes.root_volume(server, attached))
+        self.assertIsNone(volumes.root_volume(dict(image=''), {}))
+
+    def test_exclusive_leaves_root_volume(self):
+        self.assertEqual(
+            (['v2'], []),
+            volumes.attachment_changes(
+                {'v1': None}, {'v1': '/dev/vdb', 'v2': '/dev/vdc',
+                               'root': '/dev/vda'},
+                exclusive=True, root='root'))
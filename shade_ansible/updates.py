@@ -0,0 +1,205 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""In-place updates of existing servers, several at a time.
+
+Each update picks the servers that drifted from what the task wants,
+starts the change on all of them at once and waits for them together,
+with one listing per turn.  Every update returns a (done, errors, notes)
+triple of dicts keyed by server name: the updated servers, the reason
+each failed update failed, and extra result fields for the servers that
+were left alone for a reason the task should report.
+"""
+
+from shade_ansible import batch
+
+VOLUME_BACKED = 'Cannot rebuild an instance booted from a volume'
+
+try:
+    _STRING_TYPES = (basestring,)
+except NameError:
+    _STRING_TYPES = (str, bytes)
+
+
+def _start(servers, names, action, what, workers):
+    """Run action on each of the named servers concurrently.
+
+    :returns: A (started, errors) pair of dicts, the first mapping the IDs
+              of the servers action was run on to their names and the
+              second holding an error message for each server it failed on.
+    """
+    started = {}
+    errors = {}
+    for name, _, error in batch.run_parallel(
+            lambda name: action(servers[name]), names, workers):
+        if error:
+            errors[name] = "Error in %s instance: %s" % (what, error)
+        else:
+            started[servers[name].id] = name
+    return (started, errors)
+
+
+def _wait(nova, started, check, what, timeout, interval):
+    """Wait for the started servers, returning (done, errors) by name."""
+    def list_servers():
+        if len(started) == 1:
+            return [nova.servers.get(server_id) for server_id in started]
+        return nova.servers.list()
+
+    done, failed = batch.poll(list_servers, started, check, timeout, interval)
+    return (dict((started[server_id], server)
+                 for server_id, server in done.items()),
+            dict((started[server_id],
+                  "Error in %s instance: %s" % (what, error))
+                 for server_id, error in failed.items()))
+
+
+def _refresh(nova, started):
+    return dict((name, nova.servers.get(server_id))
+                for server_id, name in started.items())
+
+
+def image_id(image):
+    """The ID of the image of a server, given its image attribute.
+
+    Servers booted from a volume have '' for an image, and None is
+    returned for them.
+    """
+    if not image:
+        return None
+    return image['id']
+
+
+def rebuild(nova, servers, image, timeout, wait=True,
+            interval=batch.DEFAULT_INTERVAL, workers=batch.DEFAULT_WORKERS):
+    """Rebuild the servers running another image than image.
+
+    Servers booted from a volume have no image to compare and cannot be
+    rebuilt, and get a not_rebuilt note instead.
+
+    :param servers: A dict of servers keyed by name.
+    :param image: The ID of the image the servers should run.
+    """
+    def drifted(server):
+        current = image_id(server.image)
+        return current is not None and current != image
+
+    notes = dict((name, dict(not_rebuilt=VOLUME_BACKED))
+                 for name in servers if image_id(servers[name].image) is None)
+    (started, errors) = _start(
+        servers, [name for name in sorted(servers) if drifted(servers[name])],
+        lambda server: nova.servers.rebuild(server, image), 'rebuilding',
+        workers)
+    if not started or not wait:
+        return (_refresh(nova, started), errors, notes)
+
+    active = batch.status_check(('ACTIVE',))
+
+    def check(server):
+        if server is not None and drifted(server):
+            return None
+        return active(server)
+
+    (done, failed) = _wait(
+        nova, started, check, 'rebuilding', timeout, interval)
+    errors.update(failed)
+    return (done, errors, notes)
+
+
+def resize(nova, servers, flavor, timeout, wait=True,
+           interval=batch.DEFAULT_INTERVAL, workers=batch.DEFAULT_WORKERS):
+    """Resize the servers of another flavor than flavor.
+
+    Each resize is confirmed as soon as it reaches VERIFY_RESIZE.
+
+    :param servers: A dict of servers keyed by name.
+    :param flavor: The ID of the flavor the servers should have.
+    """
+    flavor = str(flavor)
+    drifted = [name for name in sorted(servers)
+               if str(servers[name].flavor['id']) != flavor]
+    (started, errors) = _start(
+        servers, drifted, lambda server: nova.servers.resize(server, flavor),
+        'resizing', workers)
+    if not started:
+        return ({}, errors, {})
+
+    (verify, failed) = _wait(
+        nova, started, batch.status_check(('VERIFY_RESIZE',)), 'resizing',
+        timeout, interval)
+    errors.update(failed)
+    (confirmed, failed) = _start(
+        verify, sorted(verify), nova.servers.confirm_resize,
+        'confirming the resize of', workers)
+    errors.update(failed)
+    if not confirmed or not wait:
+        return (_refresh(nova, confirmed), errors, {})
+
+    (done, failed) = _wait(
+        nova, confirmed, batch.status_check(('ACTIVE',)), 'resizing',
+        timeout, interval)
+    errors.update(failed)
+    return (done, errors, {})
+
+
+def wanted_metadata(meta):
+    """meta with the values nova would store for it.
+
+    Nova keeps strings, so other values are compared as their str(), while
+    strings, unicode ones included, are kept as they are.
+    """
+    return dict((key, value if isinstance(value, _STRING_TYPES)
+                 else str(value))
+                for key, value in meta.items())
+
+
+def metadata_diff(current, wanted, purge=False):
+    """The keys to set and the keys to delete to turn current into wanted.
+
+    :param purge: Whether keys of current that wanted does not list go.
+    :returns: A (to_set, to_delete) pair of a dict and a set.
+    """
+    to_set = dict((key, value) for key, value in wanted.items()
+                  if current.get(key) != value)
+    if not purge:
+        return (to_set, set())
+    return (to_set, set(current) - set(wanted))
+
+
+def update_metadata(nova, servers, meta, purge=False,
+                    workers=batch.DEFAULT_WORKERS):
+    """Set the keys of meta on the servers whose metadata differs.
+
+    Changed keys are set in one call, and with purge the keys meta does
+    not list are deleted in another.
+
+    :param servers: A dict of servers keyed by name.
+    """
+    wanted = wanted_metadata(meta)
+
+    def update(server):
+        (to_set, to_delete) = metadata_diff(server.metadata, wanted, purge)
+        if to_set:
+            nova.servers.set_meta(server, to_set)
+        if to_delete:
+            nova.servers.delete_meta(server, sorted(to_delete))
+        server.metadata = dict(
+            (key, value) for key, value in server.metadata.items()
+            if key not in to_delete)
+        server.metadata.update(to_set)
+
+    drifted = [name for name in sorted(servers)
+               if any(metadata_diff(servers[name].metadata, wanted, purge))]
+    (started, errors) = _start(
+        servers, drifted, update, 'updating the metadata of', workers)
+    return (dict((name, servers[name]) for name in started.values()),
+            errors, {})
@@ -0,0 +1,241 @@
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Find, create and delete many cinder volumes in one module run.
+
+Lookups pass a display_name filter to cinder rather than listing every
+volume of the project, and the volumes of a batch are looked up, created
+or deleted concurrently.
+"""
+
+from shade_ansible import batch
+from shade_ansible import updates
+
+SPEC_KEYS = ('size', 'volume_type', 'display_description', 'image_id',
+             'image_name', 'snapshot_id')
+
+# Only shown to admins by default
+ROOT_DEVICE_ATTR = 'OS-EXT-SRV-ATTR:root_device_name'
+
+
+class VolumeNotFound(Exception):
+    pass
+
+
+def find(cinder, display_name):
+    """The volume called display_name, or None."""
+    # Let cinder do the filtering; the exact match guards against clouds
+    # ignoring the filter or matching on substrings.
+    for v in cinder.volumes.list(search_opts={'display_name': display_name}):
+        if v.display_name == display_name:
+            return v
+    return None
+
+
+def spec(defaults, volume=None):
+    """A volume spec: the SPEC_KEYS and display_name of defaults,
+    overridden by those volume gives.
+    """
+    params = dict((key, defaults.get(key)) for key in SPEC_KEYS)
+    params['display_name'] = defaults.get('display_name')
+    params.update(volume or {})
+    return params
+
+
+def ensure(cinder, specs, volume_args, workers=batch.DEFAULT_WORKERS):
+    """Create the volumes of specs that do not exist yet, concurrently.
+
+    :param volume_args: Callable turning a spec into the arguments of
+                        cinder.volumes.create.
+    :returns: A (results, created) pair of dicts, results holding the
+              result of each volume by name and created the name and
+              creation arguments of each new volume by ID.
+    """
+    results = {}
+    created = {}
+
+    def present(params):
+        v = find(cinder, params['display_name'])
+        if v:
+            return (False, v, None)
+        if not params['size']:
+            raise Exception('size is required to create a volume')
+        args = volume_args(params)
+        return (True, cinder.volumes.create(**args), args)
+
+    for params, outcome, error in batch.run_parallel(
+            present, specs, workers):
+        name = params['display_name']
+        if error:
+            results[name] = dict(
+                failed=True, msg='Error creating volume:%s' % str(error))
+            continue
+        (changed, v, args) = outcome
+        results[name] = dict(changed=changed, id=v.id, info=v._info)
+        if changed:
+            created[v.id] = (name, args)
+    return (results, created)
+
+
+def _get(volume, key):
+    if isinstance(volume, dict):
+        return volume.get(key)
+    return getattr(volume, key, None)
+
+
+def select(listed, names=None, prefix=None, metadata=None):
+    """The volumes of listed that pass every filter given.
+
+    :param names: Display names to pick the volumes by.
+    :param prefix: Text display names must start with.
+    :param metadata: Items the metadata must hold.  Cinder keeps strings,
+                     so the values are compared as such.
+    """
+    wanted = updates.wanted_metadata(metadata or {})
+    selected = []
+    for volume in listed:
+        name = _get(volume, 'display_name') or ''
+        current = _get(volume, 'metadata') or {}
+        if names is not None and name not in names:
+            continue
+        if prefix and not name.startswith(prefix):
+            continue
+        if any(current.get(key) != value for key, value in wanted.items()):
+            continue
+        selected.append(volume)
+    return selected
+
+
+def missing(names, listed):
+    """The names no volume of listed carries, in order."""
+    found = set(_get(volume, 'display_name') for volume in listed)
+    return [name for name in names if name not in found]
+
+
+def delete(cinder, nova, doomed, timeout, detach=False, wait=True,
+           interval=batch.DEFAULT_INTERVAL, workers=batch.DEFAULT_WORKERS):
+    """Delete volumes concurrently, detaching them first if detach.
+
+    :param doomed: The volumes to delete.
+    :returns: A dict of the result of each volume by ID.
+    """
+    volumes = dict((v.id, v) for v in doomed)
+    results = {}
+
+    def fail(volume_id, msg):
+        volume = volumes.pop(volume_id)
+        results[volume_id] = dict(
+            failed=True, display_name=volume.display_name, msg=msg)
+
+    attached = [v for v in volumes.values() if v.attachments]
+    if attached and detach:
+        def detach_volume(volume):
+            for attachment in volume.attachments:
+                nova.volumes.delete_server_volume(
+                    attachment['server_id'], volume.id)
+
+        for volume, _, error in batch.run_parallel(
+                detach_volume, attached, workers):
+            if error:
+                fail(volume.id, 'Cannot detach volume:%s' % str(error))
+        detaching = [v.id for v in attached if v.id in volumes]
+        if detaching:
+            done, errors = batch.poll(
+                cinder.volumes.list, detaching,
+                batch.status_check(('available',), ('error',)), timeout,
+                interval)
+            for volume_id, error in errors.items():
+                fail(volume_id, 'Cannot detach volume:%s' % error)
+
+    deleted = {}
+    for volume, _, error in batch.run_parallel(
+            cinder.volumes.delete, list(volumes.values()), workers):
+        if error:
+            fail(volume.id, 'Cannot delete volume:%s' % str(error))
+        else:
+            deleted[volume.id] = volume
+            results[volume.id] = dict(
+                changed=True, display_name=volume.display_name,
+                result='Volume Deleted')
+
+    if deleted and wait:
+        done, errors = batch.poll(
+            cinder.volumes.list, deleted, batch.gone_check(), timeout,
+            interval)
+        for volume_id, error in errors.items():
+            results[volume_id] = dict(
+                failed=True, display_name=deleted[volume_id].display_name,
+                msg='Cannot delete volume:%s' % error)
+    return results
+
+
+def wanted_attachments(specs, listing):
+    """The IDs of the volumes specs lists, mapped to their devices.
+
+    :param specs: Dicts with a volume_id or a volume_name, and a device
+                  or not.
+    :param listing: Callable returning (id, display_name) pairs, only
+                    called when a volume is listed by name.
+    :raises: VolumeNotFound for a name no volume carries.
+    """
+    by_name = {}
+    if any(spec.get('volume_name') for spec in specs):
+        by_name = dict((name, volume_id) for volume_id, name in listing())
+    wanted = {}
+    for spec in specs:
+        volume_id = spec.get('volume_id') or by_name.get(
+            spec.get('volume_name'))
+        if not volume_id:
+            raise VolumeNotFound(
+                'Cannot find volume %s' % spec.get('volume_name'))
+        wanted[volume_id] = spec.get('device')
+    return wanted
+
+
+def root_volume(server, attached):
+    """The ID of the volume a server booted from, or None.
+
+    Servers booted from a volume have no image.  Their root device is
+    the one nova reports, or else the first one attached, such as
+    /dev/vda.
+
+    :param server: A server, or a dict of one.
+    :param attached: Devices of the volumes attached, by volume ID.
+    """
+    if _get(server, 'image') or not attached:
+        return None
+    device = _get(server, ROOT_DEVICE_ATTR) or min(
+        attached.values(), key=lambda d: (len(d or ''), d))
+    for volume_id, attached_device in attached.items():
+        if attached_device == device:
+            return volume_id
+    return None
+
+
+def attachment_changes(wanted, attached, state='present', exclusive=False,
+                       root=None):
+    """The volumes to detach and to attach, in that order.
+
+    :param wanted: Devices by volume ID, as from wanted_attachments().
+    :param attached: Devices of the volumes attached now, by volume ID.
+    :param exclusive: Whether volumes wanted does not list are detached.
+    :param root: The ID of the root volume, as from root_volume(), which
+                 nova cannot detach and exclusive leaves alone.
+    """
+    if state == 'absent':
+        return (sorted(v for v in wanted if v in attached), [])
+    # Volumes on the wrong device are moved: detached, then attached
+    to_detach = [v for v, device in attached.items()
+                 if (v in wanted and wanted[v] and wanted[v] != device) or
+                 (v not in wanted and exclusive and v != root)]
+    to_attach = [v for v in wanted if v not in attached or v in to_detach]
+    return (sorted(to_detach), sorted(to_attach))
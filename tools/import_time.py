@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2014 Hewlett-Packard Development Company, L.P.
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure the cold-start import cost of each module.
+
+Ansible runs every task in a fresh interpreter, so whatever a module
+imports at load time is paid on every task.  This runs the top-level
+imports of each module in a new interpreter a few times and reports the
+fastest run.  Given a baseline written by an earlier run it exits non-zero
+when a module got slower by more than the tolerance::
+
+    python tools/import_time.py --write-baseline import_time.json
+    python tools/import_time.py --baseline import_time.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import subprocess
+import sys
+
+MODULES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'shade_ansible', 'modules')
+
+IMPORT_RE = re.compile(r'^(?:import \S|from \S+ import )')
+SKIP_RE = re.compile(r'ansible\.module_utils')
+
+TIMER = '''
+import time
+_start = time.time()
+%s
+import sys
+sys.stdout.write('%%f' %% (time.time() - _start))
+'''
+
+
+def module_imports(path):
+    """Imports at the top level, or directly inside a top-level try.
+
+    Imports indented deeper, or inside functions, only run when the code
+    path needing them does and are not part of the start-up cost.
+    """
+    imports = []
+    in_try = False
+    with open(path) as f:
+        for line in f:
+            if line[:1] not in ('', ' ', '\n'):
+                in_try = line.startswith('try:')
+            if line.startswith('    ') and not in_try:
+                continue
+            if line.startswith('     '):
+                continue
+            if IMPORT_RE.match(line.strip()) and not SKIP_RE.search(line):
+                imports.append(line.strip())
+    return imports
+
+
+def time_imports(imports, repeat):
+    source = TIMER % '\n'.join(imports)
+    runs = []
+    for i in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', source])
+        runs.append(float(output))
+    return min(runs)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modules', nargs='*',
+                        help='Module names, all of them by default')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Interpreter starts per module')
+    parser.add_argument('--baseline', help='JSON file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed slowdown against the baseline')
+    parser.add_argument('--write-baseline', help='JSON file to write')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    names = args.modules or sorted(
+        os.path.basename(path)[:-3]
+        for path in glob.glob(os.path.join(MODULES_DIR, 'os_*.py')))
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    for name in names:
+        imports = module_imports(os.path.join(MODULES_DIR, name + '.py'))
+        try:
+            elapsed = time_imports(imports, args.repeat)
+        except subprocess.CalledProcessError:
+            print('%-28s import failed' % name)
+            regressions.append(name)
+            continue
+        results[name] = elapsed
+        line = '%-28s %8.1f ms' % (name, elapsed * 1000)
+        if name in baseline:
+            line += '  (baseline %.1f ms)' % (baseline[name] * 1000)
+            if elapsed > baseline[name] * (1 + args.tolerance):
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line)
+
+    if args.write_baseline:
+        with open(args.write_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())